@@ -0,0 +1,175 @@
+import json
+import re
+from datetime import datetime, timezone
+
+# Characters read from disk per refill; a message larger than this simply
+# triggers more refills, so this only bounds the working buffer for normal exports
+CHUNK_SIZE = 1 << 20
+_WHITESPACE = " \t\n\r"
+_FRACTION = re.compile(r"\.(\d+)")
+
+
+# Incremental reader for DiscordChatExporter JSON files.
+#
+# The top-level members before "messages" (guild, channel, dateRange, ...) are
+# parsed eagerly into `header`; messages are then decoded one at a time by
+# `messages()` and the members after the array (messageCount) end up in
+# `trailer`. Only the current message and one read chunk are held in memory.
+class ExportReader:
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.header = {}
+        self.trailer = {}
+        self.has_messages = False
+        self._file = open(path, "r", encoding="utf-8")
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._in_messages = False
+        self._done = False
+
+        self._expect("{")
+        self.has_messages = self._read_members(self.header, stop_key="messages")
+        if self.has_messages:
+            self._expect("[")
+            self._in_messages = True
+        else:
+            self._done = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    # Yield each message of the "messages" array in file order
+    def messages(self):
+        if not self._in_messages:
+            return
+        if self._skip_ws() == "]":
+            self._pos += 1
+        else:
+            while True:
+                yield self._decode()
+                c = self._skip_ws()
+                self._pos += 1
+                if c == "]":
+                    break
+                if c != ",":
+                    raise ValueError(f"{self.path}: expected ',' or ']' in messages, got {c!r}")
+        self._in_messages = False
+        self._read_members(self.trailer)
+        self._done = True
+
+    # Skip any unread messages and return the members that follow the array
+    def finish(self):
+        for _ in self.messages():
+            pass
+        return self.trailer
+
+    # ----------------------------
+    # Low-level parsing helpers
+    # ----------------------------
+    def _fill(self):
+        if self._pos:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        chunk = self._file.read(self._chunk_size)
+        if chunk:
+            self._buf += chunk
+        else:
+            self._eof = True
+
+    def _skip_ws(self):
+        while True:
+            buf, pos = self._buf, self._pos
+            n = len(buf)
+            while pos < n and buf[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < n:
+                return buf[pos]
+            if self._eof:
+                return ""
+            self._fill()
+
+    def _expect(self, char):
+        c = self._skip_ws()
+        if c != char:
+            raise ValueError(f"{self.path}: expected {char!r}, got {c!r}")
+        self._pos += 1
+
+    def _decode(self):
+        self._skip_ws()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                self._fill()
+                continue
+            # A number or literal ending exactly at the buffer edge may continue in the next chunk
+            if end == len(self._buf) and not self._eof:
+                self._fill()
+                continue
+            self._pos = end
+            return value
+
+    # Read "key": value members into target until the closing brace, or until
+    # stop_key is reached (its value is left unread). Returns True on stop_key.
+    def _read_members(self, target, stop_key=None):
+        while True:
+            c = self._skip_ws()
+            if c == "}":
+                self._pos += 1
+                return False
+            if c == ",":
+                self._pos += 1
+                continue
+            if c != '"':
+                raise ValueError(f"{self.path}: expected object key, got {c!r}")
+            key = self._decode()
+            self._expect(":")
+            if key == stop_key:
+                return True
+            target[key] = self._decode()
+
+
+# Convenience generator over the messages of a single export
+def iter_messages(path, chunk_size=CHUNK_SIZE):
+    with ExportReader(path, chunk_size) as reader:
+        yield from reader.messages()
+
+
+# Parse an export timestamp into an aware UTC datetime. Exports use ragged
+# fractional seconds (".31", ".3900215"), which are padded/truncated to
+# microseconds; naive timestamps are taken as UTC. Returns None if unparseable.
+def parse_timestamp(timestamp):
+    if not timestamp:
+        return None
+    timestamp = _FRACTION.sub(lambda m: "." + m.group(1)[:6].ljust(6, "0"), timestamp, count=1)
+    try:
+        parsed = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+# Milliseconds since the Unix epoch, or None if the timestamp is unparseable
+def timestamp_to_ms(timestamp):
+    parsed = parse_timestamp(timestamp)
+    if parsed is None:
+        return None
+    delta = parsed - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000 + delta.microseconds // 1000
@@ -1,11 +1,21 @@
+import argparse
 import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 
+from export_reader import ExportReader
+
 # Define date range
 start_date = datetime.strptime("2023-03-15", "%Y-%m-%d")
 end_date = datetime.strptime("2023-10-28", "%Y-%m-%d")
 
+# Stream messages instead of loading whole exports, so memory stays bounded for multi-GB channels
+STREAMING = True
+# Indentation of the output JSON; None writes compact output
+OUTPUT_INDENT = 4
+
 
 # Normalize timestamp
 def normalize_timestamp(timestamp):
@@ -22,31 +32,164 @@ def normalize_timestamp(timestamp):
     # Filter messages in JSON file
 
 
-def filter_messages(file_path, output_path):
+def in_date_range(message):
+    return "timestamp" in message and (timestamp := normalize_timestamp(message["timestamp"].split('+')[0])) and (
+            start_date <= timestamp <= end_date)
+
+
+def filter_messages(file_path, output_path, streaming=STREAMING, indent=OUTPUT_INDENT):
+    if streaming:
+        return filter_messages_streaming(file_path, output_path, indent)
+
     with open(file_path, 'r') as file:
         data = json.load(file)
 
+    total, kept = 0, None
     if "messages" in data:
-        filtered_messages = [
-            message for message in data["messages"]
-            if "timestamp" in message and (timestamp := normalize_timestamp(message["timestamp"].split('+')[0])) and (
-                        start_date <= timestamp <= end_date)
-        ]
+        filtered_messages = [message for message in data["messages"] if in_date_range(message)]
+        total, kept = len(data["messages"]), len(filtered_messages)
         data["messages"] = filtered_messages
+        data["messageCount"] = kept
 
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     with open(output_path, 'w') as file:
-        json.dump(data, file, indent=4)
+        if indent is None:
+            json.dump(data, file, separators=(",", ":"))
+        else:
+            json.dump(data, file, indent=indent)
+    return total, kept
+
+
+# Serialize a value nested `level` deep, matching json.dump's layout for the same indent
+def _dumps(value, indent, level):
+    if indent is None:
+        return json.dumps(value, separators=(",", ":"))
+    return json.dumps(value, indent=indent).replace("\n", "\n" + " " * (indent * level))
+
+
+# Same output as filter_messages, but messages are parsed and written one at a time.
+# Returns (messages read, messages kept); kept is None if the export has no messages array.
+def filter_messages_streaming(file_path, output_path, indent=OUTPUT_INDENT):
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    newline = "" if indent is None else "\n"
+    pad = "" if indent is None else " " * indent
+    colon = ":" if indent is None else ": "
+    total = kept = 0
+
+    with ExportReader(file_path) as reader, open(output_path, 'w') as out:
+        header = dict(reader.header)
+        message_count = header.pop("messageCount", None)
+        out.write("{")
+        separator = ""
+        for key, value in header.items():
+            out.write(f"{separator}{newline}{pad}{json.dumps(key)}{colon}{_dumps(value, indent, 1)}")
+            separator = ","
+
+        if reader.has_messages:
+            out.write(f"{separator}{newline}{pad}\"messages\"{colon}[")
+            for message in reader.messages():
+                total += 1
+                if in_date_range(message):
+                    out.write(f"{',' if kept else ''}{newline}{pad * 2}{_dumps(message, indent, 2)}")
+                    kept += 1
+            out.write(f"{newline}{pad}]" if kept else "]")
+            separator = ","
+
+            # messageCount follows the messages array in exports; rewrite it to match the kept messages
+            trailer = dict(reader.trailer)
+            trailer["messageCount"] = kept
+        else:
+            trailer = {} if message_count is None else {"messageCount": message_count}
+
+        for key, value in trailer.items():
+            out.write(f"{separator}{newline}{pad}{json.dumps(key)}{colon}{_dumps(value, indent, 1)}")
+            separator = ","
+        out.write(f"{newline}}}" if separator else "}")
+    return total, (kept if reader.has_messages else None)
+
+
+# Filter one export and route it to the empty directory when no messages survive,
+# so move_empty.py does not have to parse every output a second time
+def process_file(input_file_path, output_directory, empty_directory, streaming=STREAMING, indent=OUTPUT_INDENT):
+    start = time.perf_counter()
+    output_file_name = os.path.basename(input_file_path).replace(".json", "_filtered.json")
+    output_file_path = os.path.join(output_directory, output_file_name)
+    total, kept = filter_messages(input_file_path, output_file_path, streaming, indent)
+
+    if kept == 0 and empty_directory:
+        os.makedirs(empty_directory, exist_ok=True)
+        empty_file_path = os.path.join(empty_directory, output_file_name)
+        os.replace(output_file_path, empty_file_path)
+        output_file_path = empty_file_path
+
+    return {
+        "input": input_file_path,
+        "output": output_file_path,
+        "bytes": os.path.getsize(input_file_path),
+        "messages": total,
+        "kept": kept or 0,
+        "empty": kept == 0,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def print_summary(results, wall_seconds, workers):
+    print(f"\n{'file':<60} {'MB':>9} {'msgs':>9} {'kept':>9} {'sec':>8} {'MB/s':>8} {'msgs/s':>10}")
+    for r in sorted(results, key=lambda r: r["seconds"], reverse=True):
+        mb = r["bytes"] / 1e6
+        seconds = max(r["seconds"], 1e-9)
+        name = os.path.basename(r["input"])
+        name = name if len(name) <= 60 else name[:57] + "..."
+        print(f"{name:<60} {mb:>9.2f} {r['messages']:>9} {r['kept']:>9} {r['seconds']:>8.2f} "
+              f"{mb / seconds:>8.2f} {r['messages'] / seconds:>10.0f}")
+
+    total_mb = sum(r["bytes"] for r in results) / 1e6
+    total_messages = sum(r["messages"] for r in results)
+    cpu_seconds = sum(r["seconds"] for r in results)
+    wall_seconds = max(wall_seconds, 1e-9)
+    print(f"\n{len(results)} files ({sum(r['empty'] for r in results)} empty), {total_mb:.2f} MB, "
+          f"{total_messages} messages in {wall_seconds:.2f}s with {workers} worker(s): "
+          f"{total_mb / wall_seconds:.2f} MB/s, {total_messages / wall_seconds:.0f} msgs/s "
+          f"(parallel speedup {cpu_seconds / wall_seconds:.1f}x)")
 
 
 # Process all JSON files in the directory
-input_directory = "discordout-2025-01"
-output_directory = "filtered"
-
-for file_name in os.listdir(input_directory):
-    if file_name.endswith(".json"):
-        input_file_path = os.path.join(input_directory, file_name)
-        output_file_name = file_name.replace(".json", "_filtered.json")
-        output_file_path = os.path.join(output_directory, output_file_name)
-        filter_messages(input_file_path, output_file_path)
-        print(f"Filtered data has been saved to {output_file_path}")
+def main():
+    parser = argparse.ArgumentParser(description="Filter Discord exports to the study date range.")
+    parser.add_argument("--input-dir", default="discordout-2025-01")
+    parser.add_argument("--output-dir", default="filtered")
+    parser.add_argument("--empty-dir", default="empty_files",
+                        help="where exports with no messages in range are written ('' keeps them in --output-dir)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--compact", action="store_true", help="write compact JSON without indentation")
+    args = parser.parse_args()
+
+    input_directory = args.input_dir
+    output_directory = args.output_dir
+    indent = None if args.compact else OUTPUT_INDENT
+    workers = max(1, args.workers or 1)
+
+    # Largest exports first so a huge channel does not end up last on a single worker
+    input_file_paths = sorted(
+        (os.path.join(input_directory, file_name) for file_name in os.listdir(input_directory)
+         if file_name.endswith(".json")),
+        key=os.path.getsize, reverse=True)
+
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(process_file, path, output_directory, args.empty_dir, STREAMING, indent)
+                   for path in input_file_paths]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if result["empty"]:
+                print(f"No messages in range, saved to {result['output']}")
+            else:
+                print(f"Filtered data has been saved to {result['output']}")
+
+    print_summary(results, time.perf_counter() - start, workers)
+
+
+if __name__ == "__main__":
+    main()
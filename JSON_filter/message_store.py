@@ -0,0 +1,206 @@
+import argparse
+import glob
+import json
+import os
+import time
+from array import array
+
+import numpy as np
+
+from export_reader import ExportReader, timestamp_to_ms
+
+# ----------------------------
+# Columnar, memory-mappable message store
+# ----------------------------
+# A store is a directory holding one .npy file per column plus a contiguous
+# UTF-8 content buffer. Authors, channels and message types are interned into
+# small tables in meta.json, so per-message columns are plain integers:
+#
+#   id.npy               uint64  Discord message id
+#   timestamp.npy        int64   milliseconds since the Unix epoch (UTC), -1 if unparseable
+#   author.npy           int32   row in meta["authors"]
+#   channel.npy          int32   row in meta["channels"]
+#   type.npy             uint8   index into meta["types"]
+#   reply_to.npy         uint64  referenced message id, 0 if not a reply
+#   content_offsets.npy  int64   message i's content is content.bin[offsets[i]:offsets[i + 1]]
+#   content.bin                  UTF-8 message contents, back to back
+STORE_VERSION = 1
+COLUMNS = {
+    "id": "uint64",
+    "timestamp": "int64",
+    "author": "int32",
+    "channel": "int32",
+    "type": "uint8",
+    "reply_to": "uint64",
+}
+_ARRAY_CODES = {"uint64": "Q", "int64": "q", "int32": "i", "uint8": "B"}
+
+
+# Convert filtered exports into a store at store_dir. Messages are streamed, so
+# only the fixed-width columns (a few dozen bytes per message) are kept in memory.
+def build_store(input_paths, store_dir):
+    os.makedirs(store_dir, exist_ok=True)
+    columns = {name: array(_ARRAY_CODES[dtype]) for name, dtype in COLUMNS.items()}
+    offsets = array("q", [0])
+    authors, author_index = [], {}
+    channels, channel_index = [], {}
+    types, type_index = [], {}
+
+    with open(os.path.join(store_dir, "content.bin"), "wb") as content_file:
+        for path in input_paths:
+            with ExportReader(path) as reader:
+                guild = reader.header.get("guild") or {}
+                channel = reader.header.get("channel") or {}
+                channel_key = channel.get("id") or path
+                if channel_key not in channel_index:
+                    channel_index[channel_key] = len(channels)
+                    channels.append({
+                        "id": channel.get("id"),
+                        "name": channel.get("name", "Unknown"),
+                        "category": channel.get("category"),
+                        "guild": guild.get("name"),
+                        "source": os.path.basename(path),
+                        # Lets readers check the store against the export it came from
+                        "source_size": os.path.getsize(path),
+                        "source_mtime": os.path.getmtime(path),
+                    })
+                channel_row = channel_index[channel_key]
+
+                for message in reader.messages():
+                    author = message.get("author") or {}
+                    author_key = author.get("id") or author.get("name")
+                    if author_key not in author_index:
+                        author_index[author_key] = len(authors)
+                        authors.append({
+                            "id": author.get("id"),
+                            "name": author.get("name", "Unknown"),
+                            "nickname": author.get("nickname"),
+                            "discriminator": author.get("discriminator"),
+                            "isBot": author.get("isBot", False),
+                            "roles": [role.get("name") for role in author.get("roles", [])],
+                        })
+
+                    message_type = message.get("type", "Default")
+                    if message_type not in type_index:
+                        type_index[message_type] = len(types)
+                        types.append(message_type)
+
+                    timestamp = timestamp_to_ms(message.get("timestamp"))
+                    reference = (message.get("reference") or {}).get("messageId")
+                    content = (message.get("content") or "").encode("utf-8")
+                    content_file.write(content)
+                    offsets.append(offsets[-1] + len(content))
+
+                    columns["id"].append(int(message.get("id") or 0))
+                    columns["timestamp"].append(-1 if timestamp is None else timestamp)
+                    columns["author"].append(author_index[author_key])
+                    columns["channel"].append(channel_row)
+                    columns["type"].append(type_index[message_type])
+                    columns["reply_to"].append(int(reference) if reference else 0)
+
+    for name, dtype in COLUMNS.items():
+        np.save(os.path.join(store_dir, f"{name}.npy"), np.frombuffer(columns[name], dtype=dtype))
+    np.save(os.path.join(store_dir, "content_offsets.npy"), np.frombuffer(offsets, dtype="int64"))
+
+    meta = {
+        "version": STORE_VERSION,
+        "count": len(columns["id"]),
+        "types": types,
+        "channels": channels,
+        "authors": authors,
+    }
+    with open(os.path.join(store_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    return meta["count"]
+
+
+# Read-only view of a store. Columns are memory-mapped numpy arrays, so opening
+# a store is cheap and selections are vectorized; iteration yields plain tuples
+# instead of per-message dicts.
+class MessageStore:
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != STORE_VERSION:
+            raise ValueError(f"{store_dir}: unsupported store version {meta.get('version')}")
+        self.types = meta["types"]
+        self.channels = meta["channels"]
+        self.authors = meta["authors"]
+        self.count = meta["count"]
+
+        for name in COLUMNS:
+            setattr(self, name, np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode="r"))
+        self.content_offsets = np.load(os.path.join(store_dir, "content_offsets.npy"), mmap_mode="r")
+        content_path = os.path.join(store_dir, "content.bin")
+        if os.path.getsize(content_path):
+            self.content_buffer = np.memmap(content_path, dtype="uint8", mode="r")
+        else:
+            self.content_buffer = np.zeros(0, dtype="uint8")
+
+        self.author_names = [a["name"] for a in self.authors]
+        self.author_display_names = [a["nickname"] or a["name"] for a in self.authors]
+        self.channel_names = [c["name"] for c in self.channels]
+
+    def __len__(self):
+        return self.count
+
+    def type_code(self, name):
+        return self.types.index(name) if name in self.types else None
+
+    def content(self, i):
+        start, end = self.content_offsets[i], self.content_offsets[i + 1]
+        return self.content_buffer[start:end].tobytes().decode("utf-8")
+
+    def content_lengths(self):
+        return np.diff(self.content_offsets)
+
+    # Indices of messages matching every given filter; types/channels are names,
+    # start/end are epoch milliseconds (inclusive)
+    def select(self, types=None, channels=None, start=None, end=None, non_empty=False):
+        mask = np.ones(self.count, dtype=bool)
+        if types is not None:
+            codes = [self.type_code(t) for t in types if t in self.types]
+            mask &= np.isin(self.type, codes)
+        if channels is not None:
+            rows = [i for i, name in enumerate(self.channel_names) if name in channels]
+            mask &= np.isin(self.channel, rows)
+        if start is not None:
+            mask &= self.timestamp >= start
+        if end is not None:
+            mask &= self.timestamp <= end
+        if non_empty:
+            mask &= self.content_lengths() > 0
+        return np.flatnonzero(mask)
+
+    # Message indices in global timestamp order (stable within equal timestamps)
+    def time_order(self, indices=None):
+        if indices is None:
+            return np.argsort(self.timestamp, kind="stable")
+        indices = np.asarray(indices)
+        return indices[np.argsort(self.timestamp[indices], kind="stable")]
+
+    # Yield (index, id, timestamp_ms, author name, channel name, content) tuples
+    def iter_messages(self, indices=None):
+        if indices is None:
+            indices = range(self.count)
+        ids, timestamps = self.id, self.timestamp
+        authors, channels = self.author, self.channel
+        offsets, buffer = self.content_offsets, self.content_buffer
+        for i in indices:
+            content = buffer[offsets[i]:offsets[i + 1]].tobytes().decode("utf-8")
+            yield (int(i), int(ids[i]), int(timestamps[i]), self.author_names[authors[i]],
+                   self.channel_names[channels[i]], content)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert filtered Discord exports into a columnar message store.")
+    parser.add_argument("input_dir", nargs="?", default="filtered")
+    parser.add_argument("store_dir", nargs="?", default="message_store")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    input_paths = sorted(glob.glob(os.path.join(args.input_dir, "*.json")))
+    count = build_store(input_paths, args.store_dir)
+    print(f"Stored {count} messages from {len(input_paths)} files in {args.store_dir} "
+          f"({time.perf_counter() - start:.2f}s)")
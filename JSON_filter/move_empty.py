@@ -1,20 +1,28 @@
 import os
-import json
 import shutil
 
+from export_reader import ExportReader
+
+# filter.py already routes empty exports while filtering; this is only
+# needed for filtered/ directories produced by older runs
 filtered_directory = "filtered"
 empty_directory = "empty_files"
 
-os.makedirs(empty_directory, exist_ok=True)
 
-for file_name in os.listdir(filtered_directory):
-    if file_name.endswith(".json"):
-        file_path = os.path.join(filtered_directory, file_name)
+# Only the header and at most the first message are parsed
+def has_no_messages(file_path):
+    with ExportReader(file_path) as reader:
+        return reader.has_messages and next(reader.messages(), None) is None
+
+
+if __name__ == "__main__":
+    os.makedirs(empty_directory, exist_ok=True)
 
-        with open(file_path, 'r') as file:
-            data = json.load(file)
+    for file_name in os.listdir(filtered_directory):
+        if file_name.endswith(".json"):
+            file_path = os.path.join(filtered_directory, file_name)
 
-        if "messages" in data and not data["messages"]:
-            new_path = os.path.join(empty_directory, file_name)
-            shutil.move(file_path, new_path)
-            print(f"Moved empty file: {file_name} to {empty_directory}")
+            if has_no_messages(file_path):
+                new_path = os.path.join(empty_directory, file_name)
+                shutil.move(file_path, new_path)
+                print(f"Moved empty file: {file_name} to {empty_directory}")
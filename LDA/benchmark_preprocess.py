@@ -0,0 +1,40 @@
+import argparse
+import time
+
+import spacy
+from nltk.corpus import stopwords
+
+from lda import SPACY_MODEL, extract_messages, json_file
+from preprocess import preprocess_text, preprocess_texts
+
+# Compares the original per-token lemmatization against the batched, cached
+# pipeline on one channel and checks that both produce identical token lists.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark LDA preprocessing.")
+    parser.add_argument("json_file", nargs="?", default=json_file)
+    parser.add_argument("--limit", type=int, default=None, help="only use the first N messages")
+    parser.add_argument("--n-process", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    nlp = spacy.load(SPACY_MODEL)
+    stop_words = set(stopwords.words('english'))
+    texts = [msg["content"] for msg in extract_messages(args.json_file)][:args.limit]
+    print(f"Benchmarking on {len(texts)} messages")
+
+    start = time.perf_counter()
+    reference = [preprocess_text(text, nlp, stop_words) for text in texts]
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = preprocess_texts(texts, nlp, stop_words, batch_size=args.batch_size, n_process=args.n_process)
+    batched_seconds = time.perf_counter() - start
+
+    mismatches = [i for i, (a, b) in enumerate(zip(reference, batched)) if a != b]
+    print(f"per-token: {legacy_seconds:.2f}s ({len(texts) / legacy_seconds:.0f} msgs/s)")
+    print(f"batched:   {batched_seconds:.2f}s ({len(texts) / batched_seconds:.0f} msgs/s), "
+          f"speedup {legacy_seconds / batched_seconds:.1f}x")
+    if mismatches or len(reference) != len(batched):
+        i = mismatches[0] if mismatches else min(len(reference), len(batched))
+        raise SystemExit(f"Token lists differ ({len(mismatches)} messages), first at message {i}")
+    print("Token lists are identical.")
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import shutil
+from importlib import metadata
+
+from gensim.corpora import MmCorpus
+from gensim.corpora.dictionary import Dictionary
+
+CACHE_DIR = "lda_cache"
+# Bump when preprocess.py changes what tokens it produces or extracted messages gain fields
+PREPROCESS_VERSION = 2
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _package_version(name):
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+# Key covering everything that changes the token streams: the input bytes, the
+# stopword and custom_remove sets, and the spaCy model (name and installed version)
+def cache_key(json_file, stop_words, custom_remove, spacy_model):
+    settings = {
+        "input_sha256": file_sha256(json_file),
+        "stop_words": sorted(stop_words),
+        "custom_remove": sorted(custom_remove),
+        "spacy_model": spacy_model,
+        "spacy_model_version": _package_version(spacy_model),
+        "spacy_version": _package_version("spacy"),
+        "preprocess_version": PREPROCESS_VERSION,
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+
+
+# On-disk cache of one preprocessed corpus:
+#   messages.jsonl   extracted messages with metadata, one per line
+#   tokens.jsonl     lemmatized token list per message, same order
+#   dictionary.dict  gensim Dictionary
+#   corpus.mm        bag-of-words corpus in Matrix Market format (+ .index)
+class CorpusCache:
+    def __init__(self, key, cache_dir=CACHE_DIR):
+        self.key = key
+        self.path = os.path.join(cache_dir, key)
+
+    def _file(self, name, root=None):
+        return os.path.join(root or self.path, name)
+
+    def exists(self):
+        return os.path.isfile(self._file("corpus.mm.index"))
+
+    # Write everything into a temporary directory first so an interrupted run never leaves a half cache
+    def save(self, messages, processed_texts, dictionary):
+        tmp_path = self.path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        with open(self._file("messages.jsonl", tmp_path), "w", encoding="utf-8") as f:
+            for message in messages:
+                f.write(json.dumps(message) + "\n")
+        with open(self._file("tokens.jsonl", tmp_path), "w", encoding="utf-8") as f:
+            for tokens in processed_texts:
+                f.write(json.dumps(tokens) + "\n")
+        dictionary.save(self._file("dictionary.dict", tmp_path))
+        MmCorpus.serialize(self._file("corpus.mm", tmp_path),
+                           (dictionary.doc2bow(tokens) for tokens in processed_texts),
+                           id2word=dictionary)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(tmp_path, self.path)
+
+    def load_messages(self):
+        with open(self._file("messages.jsonl"), encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    # Token lists are streamed line by line rather than loaded as one list
+    def iter_tokens(self):
+        with open(self._file("tokens.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def load_dictionary(self):
+        return Dictionary.load(self._file("dictionary.dict"))
+
+    # Streams documents from disk on every iteration; supports corpus[i] via the index file
+    def load_corpus(self):
+        return MmCorpus(self._file("corpus.mm"))
@@ -1,100 +1,263 @@
+import argparse
 import json
-import re
-import spacy
-import pyLDAvis
-import pyLDAvis.gensim_models as gensimvis
-from gensim.utils import simple_preprocess
-from gensim.corpora.dictionary import Dictionary
-from gensim.models.ldamodel import LdaModel
-from nltk.corpus import stopwords
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+import numpy as np
 from tqdm import tqdm
 from collections import defaultdict
 
-# Load spaCy model for lemmatization
-nlp = spacy.load("en_core_web_sm")
-stop_words = set(stopwords.words('english'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "JSON_filter"))
+
+# spaCy, gensim, NLTK, pandas and pyLDAvis are imported where they are used,
+# so importing this module (e.g. for extract_messages) stays cheap
 
 # Path to your JSON file
 json_file = "/Users/nikhil/PycharmProjects/vesuvius_discord_study/JSON_filter/filtered/Vesuvius Challenge - Text Channels - general [1079907750265499772]_filtered.json"
 
-# Load JSON and extract messages with metadata
-sample_messages = []
-with open(json_file, "r", encoding="utf-8") as f:
-    data = json.load(f)
-
-messages = data.get("messages", [])
-for message in tqdm(messages, desc="Extracting messages"):
-    if message.get("type") == "Default":
-        content = message.get("content", "")
-        if content:
-            sample_messages.append({
-                "content": content,
-                "author": message.get("author", {}).get("name") or message.get("author", {}).get("username"),
-                "timestamp": message.get("timestamp")
-            })
-
-print(f"Collected {len(sample_messages)} messages with type 'Default'.")
-
-# Preprocessing function
-def preprocess_text(text):
-    text = re.sub(r"http\S+|www\S+|@\S+", "", text)
-    text = re.sub(r"[^a-zA-Z\s]", "", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    words = simple_preprocess(text, deacc=True)
-    words = [word for word in words if word not in stop_words]
-    custom_remove = {"scroll", "scrolls", "papyrus", "image", "ink"}
-    words = [word for word in words if word not in custom_remove]
-    words = [nlp(word)[0].lemma_ for word in words]
-    return words
-
-# Apply preprocessing to all messages
-processed_texts = [preprocess_text(msg["content"]) for msg in sample_messages]
-
-# Create Dictionary and Corpus
-dictionary = Dictionary(processed_texts)
-corpus = [dictionary.doc2bow(text) for text in processed_texts]
-
-# Train LDA Model
-num_topics = 10
-lda_model = LdaModel(corpus=corpus, id2word=dictionary, num_topics=num_topics, passes=15, random_state=42)
-
-# Print topics
-print("\nTop Topics Found:\n")
-for idx, topic in lda_model.print_topics():
-    print(f"Topic {idx}: {topic}")
-
-# Function to get topic for a single text
-def get_topic(text):
-    bow = dictionary.doc2bow(preprocess_text(text))
-    topics = lda_model.get_document_topics(bow)
-    return max(topics, key=lambda x: x[1])[0] if topics else None
-
-# Assign topics to each message (with metadata)
-chat_topics = []
-for msg in sample_messages:
-    topic = get_topic(msg["content"])
-    if topic is not None:
-        chat_topics.append((msg, topic))
-
-# Group messages by topic including metadata
-topic_dict = defaultdict(list)
-for msg, topic in chat_topics:
-    topic_dict[topic].append({
-        "author": msg["author"],
-        "timestamp": msg["timestamp"],
-        "content": msg["content"]
+# Columnar store built with JSON_filter/message_store.py; read instead of the
+# JSON file when present and built from it
+store_dir = "/Users/nikhil/PycharmProjects/vesuvius_discord_study/JSON_filter/message_store"
+
+SPACY_MODEL = "en_core_web_sm"
+# Worker processes for spaCy lemmatization (1 = in-process)
+N_PROCESS = 1
+LEMMA_BATCH_SIZE = 1000
+
+NUM_TOPICS = 10
+PASSES = 15
+RANDOM_STATE = 42
+
+# Saved model, dictionary and update state used by update.py
+MODEL_DIR = "lda_model"
+
+
+# spaCy pipeline and NLTK stopwords, loaded on first use and then shared by
+# every caller in the process (load_corpus, update.py)
+@lru_cache(maxsize=None)
+def load_nlp(model_name=SPACY_MODEL):
+    import spacy
+
+    return spacy.load(model_name)
+
+
+@lru_cache(maxsize=None)
+def load_stop_words(language="english"):
+    from nltk.corpus import stopwords
+
+    return frozenset(stopwords.words(language))
+
+
+# Default messages with content of the export json_file, read from the message
+# store's memory-mapped columns; None when the store was not built from this
+# version of the file (matched by name, size and modification time)
+def extract_from_store(json_file, store_dir):
+    from message_store import MessageStore
+
+    store = MessageStore(store_dir)
+    size, mtime = os.path.getsize(json_file), os.path.getmtime(json_file)
+    rows = [i for i, channel in enumerate(store.channels) if channel["source"] == os.path.basename(json_file)
+            and channel.get("source_size") == size and channel.get("source_mtime") == mtime]
+    if not rows:
+        return None
+    indices = store.select(types=["Default"], non_empty=True)
+    indices = indices[np.isin(store.channel[indices], rows)]
+    sample_messages = []
+    for _, message_id, timestamp, author, _, content in tqdm(store.iter_messages(indices), total=len(indices),
+                                                             desc="Extracting messages"):
+        sample_messages.append({
+            "id": str(message_id),
+            "content": content,
+            "author": author,
+            "timestamp": None if timestamp < 0 else
+            datetime.fromtimestamp(timestamp / 1000, timezone.utc).isoformat(timespec="milliseconds"),
+        })
+    return sample_messages
+
+
+# Load JSON and extract messages with metadata, or read them from the message
+# store when store_dir holds one built from json_file
+def extract_messages(json_file, store_dir=None):
+    if store_dir and os.path.isdir(store_dir):
+        sample_messages = extract_from_store(json_file, store_dir)
+        if sample_messages is not None:
+            return sample_messages
+
+    sample_messages = []
+    with open(json_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    messages = data.get("messages", [])
+    for message in tqdm(messages, desc="Extracting messages"):
+        if message.get("type") == "Default":
+            content = message.get("content", "")
+            if content:
+                sample_messages.append({
+                    "id": message.get("id"),
+                    "content": content,
+                    "author": message.get("author", {}).get("name") or message.get("author", {}).get("username"),
+                    "timestamp": message.get("timestamp")
+                })
+    return sample_messages
+
+
+# Dense document x topic matrix for the whole corpus. Documents are inferred in
+# chunks with one variational pass each, instead of get_document_topics per message;
+# rows are normalized like get_document_topics but without minimum_probability.
+def document_topic_matrix(lda_model, corpus, chunksize=2000):
+    from gensim.utils import grouper
+
+    blocks = []
+    for chunk in grouper(corpus, chunksize):
+        gamma, _ = lda_model.inference(chunk)
+        blocks.append(gamma / gamma.sum(axis=1, keepdims=True))
+    if not blocks:
+        return np.zeros((0, lda_model.num_topics), dtype=np.float32)
+    return np.vstack(blocks).astype(np.float32)
+
+
+# Highest Discord message id covered by the model. Snowflake ids grow with time,
+# so it works as a watermark for picking out messages newer than the last run.
+def max_message_id(messages, start=0):
+    return max((int(msg["id"]) for msg in messages if msg.get("id")), default=start)
+
+
+def save_model(lda_model, dictionary, state, model_dir=MODEL_DIR):
+    os.makedirs(model_dir, exist_ok=True)
+    lda_model.save(os.path.join(model_dir, "lda.model"))
+    dictionary.save(os.path.join(model_dir, "dictionary.dict"))
+    with open(os.path.join(model_dir, "state.json"), "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=4)
+
+
+def load_model(model_dir=MODEL_DIR):
+    from gensim.corpora.dictionary import Dictionary
+    from gensim.models.ldamodel import LdaModel
+
+    lda_model = LdaModel.load(os.path.join(model_dir, "lda.model"))
+    dictionary = Dictionary.load(os.path.join(model_dir, "dictionary.dict"))
+    with open(os.path.join(model_dir, "state.json"), encoding="utf-8") as f:
+        state = json.load(f)
+    return lda_model, dictionary, state
+
+
+# Extract, preprocess and build the Dictionary/BoW corpus, or reuse them from
+# the on-disk cache when the input file and preprocessing settings are unchanged
+def load_corpus(json_file, store_dir=None):
+    from corpus_cache import CorpusCache, cache_key
+    from preprocess import CUSTOM_REMOVE, preprocess_texts
+
+    stop_words = set(load_stop_words())
+    cache = CorpusCache(cache_key(json_file, stop_words, CUSTOM_REMOVE, SPACY_MODEL))
+    if cache.exists():
+        print(f"Using cached corpus {cache.path}")
+        return cache.load_messages(), cache.load_dictionary(), cache.load_corpus(), cache
+
+    # Load spaCy model for lemmatization
+    nlp = load_nlp()
+
+    sample_messages = extract_messages(json_file, store_dir)
+    print(f"Collected {len(sample_messages)} messages with type 'Default'.")
+
+    # Apply preprocessing to all messages, lemmatizing unique words in batches
+    start = time.perf_counter()
+    processed_texts = preprocess_texts([msg["content"] for msg in sample_messages], nlp, stop_words,
+                                       custom_remove=CUSTOM_REMOVE,
+                                       batch_size=LEMMA_BATCH_SIZE, n_process=N_PROCESS)
+    print(f"Preprocessed {len(processed_texts)} messages in {time.perf_counter() - start:.1f}s")
+
+    # Create Dictionary and Corpus; the corpus is serialized and streamed back from disk
+    from gensim.corpora.dictionary import Dictionary
+
+    dictionary = Dictionary(processed_texts)
+    cache.save(sample_messages, processed_texts, dictionary)
+    print(f"Cached preprocessed corpus in {cache.path}")
+    return sample_messages, dictionary, cache.load_corpus(), cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train an LDA topic model on one filtered channel export.")
+    parser.add_argument("json_file", nargs="?", default=json_file)
+    parser.add_argument("--store-dir", default=store_dir,
+                        help="message store to read the export from, when it was built from it")
+    parser.add_argument("--no-vis", action="store_true", help="skip the pyLDAvis dashboard")
+    args = parser.parse_args()
+
+    import pandas as pd
+    from gensim.models.ldamodel import LdaModel
+
+    sample_messages, dictionary, corpus, cache = load_corpus(args.json_file, args.store_dir)
+
+    # Train LDA Model
+    lda_model = LdaModel(corpus=corpus, id2word=dictionary, num_topics=NUM_TOPICS, passes=PASSES,
+                         random_state=RANDOM_STATE)
+
+    # Print topics
+    print("\nTop Topics Found:\n")
+    for idx, topic in lda_model.print_topics():
+        print(f"Topic {idx}: {topic}")
+
+    # Assign topics to each message (with metadata) from the existing corpus in one batch pass
+    doc_topics = document_topic_matrix(lda_model, corpus)
+    dominant_topics = np.argmax(doc_topics, axis=1)
+    chat_topics = list(zip(sample_messages, dominant_topics.tolist()))
+
+    # Group messages by topic including metadata
+    topic_dict = defaultdict(list)
+    for msg, topic in chat_topics:
+        topic_dict[topic].append({
+            "author": msg["author"],
+            "timestamp": msg["timestamp"],
+            "content": msg["content"]
+        })
+
+    # Sort topics numerically and save to JSON
+    sorted_topics = dict(sorted(topic_dict.items()))
+    output_file = "discord_chat_topics.json"
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(sorted_topics, f, indent=4)
+
+    print(f"\nTopic assignments with metadata saved to {output_file} (Ordered by topic)")
+
+    # Save full topic mixtures next to the JSON; rows follow message_ids
+    matrix_file = os.path.splitext(output_file)[0] + ".npz"
+    np.savez_compressed(matrix_file, doc_topics=doc_topics,
+                        message_ids=np.array([msg["id"] or "" for msg in sample_messages]))
+    print(f"Document-topic matrix {doc_topics.shape} saved to {matrix_file}")
+
+    # Columnar copy of the assignments for visualize_metadata.py
+    parquet_file = os.path.splitext(output_file)[0] + ".parquet"
+    pd.DataFrame({
+        "message_id": [msg["id"] for msg in sample_messages],
+        "topic": dominant_topics.astype(np.int16),
+        "topic_probability": doc_topics[np.arange(len(doc_topics)), dominant_topics],
+        "author": pd.Categorical([msg["author"] or "unknown" for msg in sample_messages]),
+        "timestamp": pd.to_datetime([msg["timestamp"] for msg in sample_messages], utc=True, format="ISO8601"),
+        "content": [msg["content"] for msg in sample_messages],
+    }).to_parquet(parquet_file, index=False)
+    print(f"Topic assignments saved to {parquet_file}")
+
+    # Save the model so update.py can refresh it with new exports instead of retraining
+    save_model(lda_model, dictionary, {
+        "max_message_id": str(max_message_id(sample_messages)),
+        "documents": len(sample_messages),
+        "oov_counts": {},
     })
+    print(f"Model and dictionary saved to {MODEL_DIR}")
+
+    # Visualize with pyLDAvis; the dashboard is written to HTML, so this works headless
+    if args.no_vis:
+        return
+    import pyLDAvis
+    import pyLDAvis.gensim_models as gensimvis
 
-# Sort topics numerically and save to JSON
-sorted_topics = dict(sorted(topic_dict.items()))
-output_file = "discord_chat_topics.json"
-with open(output_file, "w", encoding="utf-8") as f:
-    json.dump(sorted_topics, f, indent=4)
+    vis = gensimvis.prepare(lda_model, corpus, dictionary)
+    pyLDAvis.save_html(vis, "lda_visualization.html")
+    print("LDA visualization saved as lda_visualization.html")
 
-print(f"\nTopic assignments with metadata saved to {output_file} (Ordered by topic)")
 
-# Visualize with pyLDAvis
-vis = gensimvis.prepare(lda_model, corpus, dictionary)
-pyLDAvis.save_html(vis, "lda_visualization.html")
-print("LDA visualization saved as lda_visualization.html")
-pyLDAvis.display(vis)
+# Guarded so spaCy worker processes (N_PROCESS > 1) can import this module
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,47 @@
 import json
+import os
+import sys
 from tqdm import tqdm
 
-# Initialize a list to hold the text of messages with type "Default"
-sample_text = []
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "JSON_filter"))
 
 # Path to your JSON file
 json_file = "/Users/nikhil/PycharmProjects/vesuvius_discord_study/JSON_filter/filtered/Vesuvius Challenge - Text Channels - speculation [1164719267565027399]_filtered.json"
 
-# Open and load the JSON file
-with open(json_file, "r", encoding="utf-8") as f:
-    data = json.load(f)
+# Columnar store built with JSON_filter/message_store.py; used instead of json_file when present
+store_dir = "/Users/nikhil/PycharmProjects/vesuvius_discord_study/JSON_filter/message_store"
+channel_name = "speculation"
 
-# Get the list of messages (default to empty list if key is missing)
-messages = data.get("messages", [])
+# Text of the messages with type "Default" in one channel
+def load_text(json_file=json_file, store_dir=store_dir, channel_name=channel_name):
+    # Initialize a list to hold the text of messages with type "Default"
+    sample_text = []
 
-# Process each message with a progress bar
-for message in tqdm(messages, desc="Processing messages"):
-    # Check if the message type is "Default"
-    if message.get("type") == "Default":
-        content = message.get("content", "")
-        if content:  # Only add non-empty content
-            sample_text.append(content)
+    if os.path.isdir(store_dir):
+        from message_store import MessageStore
 
-print(f"Collected {len(sample_text)} messages with type 'Default'.")
+        # Select Default messages with content using the memory-mapped columns
+        store = MessageStore(store_dir)
+        indices = store.select(types=["Default"], channels=[channel_name], non_empty=True)
+        sample_text = [store.content(i) for i in tqdm(indices, desc="Processing messages")]
+    else:
+        # Open and load the JSON file
+        with open(json_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        # Get the list of messages (default to empty list if key is missing)
+        messages = data.get("messages", [])
+
+        # Process each message with a progress bar
+        for message in tqdm(messages, desc="Processing messages"):
+            # Check if the message type is "Default"
+            if message.get("type") == "Default":
+                content = message.get("content", "")
+                if content:  # Only add non-empty content
+                    sample_text.append(content)
+    return sample_text
+
+
+if __name__ == "__main__":
+    sample_text = load_text()
+    print(f"Collected {len(sample_text)} messages with type 'Default'.")
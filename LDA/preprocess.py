@@ -0,0 +1,84 @@
+import re
+from collections import OrderedDict
+
+from gensim.utils import simple_preprocess
+
+# Domain words that dominate every topic without telling them apart
+CUSTOM_REMOVE = {"scroll", "scrolls", "papyrus", "image", "ink"}
+
+# Lemmas only need the tagger, attribute ruler and lemmatizer
+UNUSED_PIPES = ("parser", "ner")
+
+
+# Regex cleanup, tokenization and stopword removal (everything except lemmatization)
+def clean_words(text, stop_words, custom_remove=CUSTOM_REMOVE):
+    text = re.sub(r"http\S+|www\S+|@\S+", "", text)
+    text = re.sub(r"[^a-zA-Z\s]", "", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    words = simple_preprocess(text, deacc=True)
+    words = [word for word in words if word not in stop_words]
+    words = [word for word in words if word not in custom_remove]
+    return words
+
+
+# Original per-token implementation, kept as the reference for benchmark_preprocess.py
+def preprocess_text(text, nlp, stop_words, custom_remove=CUSTOM_REMOVE):
+    words = clean_words(text, stop_words, custom_remove)
+    words = [nlp(word)[0].lemma_ for word in words]
+    return words
+
+
+# Word -> lemma memo with least-recently-used eviction. Each word is lemmatized
+# on its own, exactly like nlp(word)[0].lemma_, so cached lemmas do not depend on
+# the message the word first appeared in.
+class Lemmatizer:
+    def __init__(self, nlp, max_size=200_000, batch_size=1000, n_process=1):
+        self.nlp = nlp
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # Lemmatize every unseen word with one batched nlp.pipe call
+    def _lemmatize_new(self, words):
+        disabled = [name for name in UNUSED_PIPES if name in self.nlp.pipe_names]
+        with self.nlp.select_pipes(disable=disabled):
+            docs = self.nlp.pipe(words, batch_size=self.batch_size, n_process=self.n_process)
+            return {word: doc[0].lemma_ for word, doc in zip(words, docs)}
+
+    # Lemmatize a batch of word lists; the result has the same shape as word_lists
+    def lemmatize(self, word_lists):
+        cache = self.cache
+        batch = {}
+        for words in word_lists:
+            for word in words:
+                if word in batch:
+                    continue
+                lemma = cache.get(word)
+                if lemma is not None:
+                    cache.move_to_end(word)
+                    batch[word] = lemma
+                    self.hits += 1
+        new_words = list({word: None for words in word_lists for word in words if word not in batch})
+        self.misses += len(new_words)
+        if new_words:
+            new_lemmas = self._lemmatize_new(new_words)
+            batch.update(new_lemmas)
+            cache.update(new_lemmas)
+            while len(cache) > self.max_size:
+                cache.popitem(last=False)
+        return [[batch[word] for word in words] for words in word_lists]
+
+
+# Batched equivalent of [preprocess_text(text, ...) for text in texts]
+def preprocess_texts(texts, nlp, stop_words, custom_remove=CUSTOM_REMOVE, lemmatizer=None,
+                     chunk_size=20000, batch_size=1000, n_process=1):
+    lemmatizer = lemmatizer or Lemmatizer(nlp, batch_size=batch_size, n_process=n_process)
+    texts = list(texts)
+    processed = []
+    for start in range(0, len(texts), chunk_size):
+        word_lists = [clean_words(text, stop_words, custom_remove) for text in texts[start:start + chunk_size]]
+        processed.extend(lemmatizer.lemmatize(word_lists))
+    return processed
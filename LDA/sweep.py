@@ -0,0 +1,111 @@
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from gensim.models import CoherenceModel, LdaModel, LdaMulticore
+
+from lda import PASSES, RANDOM_STATE, json_file, load_corpus
+
+OUTPUT_DIR = "lda_sweep"
+
+
+# Train and score one topic count. Runs in a worker process, so the cached
+# dictionary/corpus are loaded from disk here rather than pickled across.
+def train_and_score(cache, num_topics, passes, coherence, multicore_workers, output_dir):
+    start = time.perf_counter()
+    dictionary = cache.load_dictionary()
+    corpus = cache.load_corpus()
+
+    if multicore_workers:
+        lda_model = LdaMulticore(corpus=corpus, id2word=dictionary, num_topics=num_topics, passes=passes,
+                                 random_state=RANDOM_STATE, workers=multicore_workers)
+    else:
+        lda_model = LdaModel(corpus=corpus, id2word=dictionary, num_topics=num_topics, passes=passes,
+                             random_state=RANDOM_STATE)
+    train_seconds = time.perf_counter() - start
+
+    # u_mass only needs the BoW corpus; sliding-window measures (c_v, c_npmi, ...) need the token lists
+    if coherence == "u_mass":
+        coherence_model = CoherenceModel(model=lda_model, corpus=corpus, dictionary=dictionary, coherence=coherence)
+    else:
+        coherence_model = CoherenceModel(model=lda_model, texts=list(cache.iter_tokens()), dictionary=dictionary,
+                                         coherence=coherence, processes=1)
+    coherence_score = coherence_model.get_coherence()
+    # log_perplexity returns the per-word likelihood bound (base 2)
+    perplexity = float(np.exp2(-lda_model.log_perplexity(corpus)))
+
+    model_path = os.path.join(output_dir, f"k{num_topics}", "lda.model")
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    lda_model.save(model_path)
+    return {
+        "num_topics": num_topics,
+        "coherence": coherence_score,
+        "perplexity": perplexity,
+        "train_seconds": train_seconds,
+        "total_seconds": time.perf_counter() - start,
+        "model_path": model_path,
+    }
+
+
+def print_table(results, coherence):
+    print(f"\n{'k':>4} {coherence:>10} {'perplexity':>12} {'train s':>9} {'total s':>9}")
+    for r in results:
+        print(f"{r['num_topics']:>4} {r['coherence']:>10.4f} {r['perplexity']:>12.1f} "
+              f"{r['train_seconds']:>9.1f} {r['total_seconds']:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train LDA models for a range of topic counts and compare them.")
+    parser.add_argument("--json-file", default=json_file)
+    parser.add_argument("--topics", type=int, nargs="+", default=None, help="explicit topic counts to try")
+    parser.add_argument("--k-min", type=int, default=4)
+    parser.add_argument("--k-max", type=int, default=30)
+    parser.add_argument("--k-step", type=int, default=2)
+    parser.add_argument("--passes", type=int, default=PASSES)
+    parser.add_argument("--coherence", default="c_v", choices=["c_v", "u_mass", "c_uci", "c_npmi"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="models trained concurrently")
+    parser.add_argument("--multicore", type=int, default=0, metavar="N",
+                        help="train each model with LdaMulticore using N workers (models then run one at a time)")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    topic_counts = args.topics or list(range(args.k_min, args.k_max + 1, args.k_step))
+    # Preprocess once (or hit the corpus cache) before fanning out
+    _, dictionary, corpus, cache = load_corpus(args.json_file)
+    workers = 1 if args.multicore else max(1, min(args.workers, len(topic_counts)))
+    print(f"Sweeping k={topic_counts} on {len(corpus)} documents with {workers} worker process(es)")
+
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(train_and_score, cache, k, args.passes, args.coherence, args.multicore,
+                                   args.output_dir) for k in topic_counts]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"k={result['num_topics']}: {args.coherence}={result['coherence']:.4f}, "
+                  f"perplexity={result['perplexity']:.1f} ({result['total_seconds']:.1f}s)")
+    results.sort(key=lambda r: r["num_topics"])
+    print_table(results, args.coherence)
+
+    results_file = os.path.join(args.output_dir, "sweep_results.csv")
+    with open(results_file, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+
+    # Higher is better for every supported coherence measure
+    best = max(results, key=lambda r: r["coherence"])
+    best_model = LdaModel.load(best["model_path"])
+    vis_file = os.path.join(args.output_dir, f"lda_visualization_k{best['num_topics']}.html")
+    import pyLDAvis
+    import pyLDAvis.gensim_models as gensimvis
+
+    pyLDAvis.save_html(gensimvis.prepare(best_model, corpus, dictionary), vis_file)
+
+    print(f"\nSweep finished in {time.perf_counter() - start:.1f}s; results saved to {results_file}")
+    print(f"Best k={best['num_topics']} ({args.coherence}={best['coherence']:.4f}), "
+          f"model {best['model_path']}, visualization {vis_file}")
@@ -0,0 +1,90 @@
+import argparse
+import json
+import time
+from collections import Counter
+
+import numpy as np
+
+from lda import (LEMMA_BATCH_SIZE, MODEL_DIR, N_PROCESS, document_topic_matrix, extract_messages, load_model,
+                 load_nlp, load_stop_words, max_message_id, save_model)
+from preprocess import CUSTOM_REMOVE, preprocess_texts
+
+UPDATES_FILE = "discord_chat_topics_updates.jsonl"
+# Share of new tokens missing from the frozen vocabulary above which a full retrain is recommended
+MAX_OOV_RATE = 0.15
+
+
+# Online update of the saved model with only the messages newer than its watermark.
+#
+# The vocabulary is frozen: term ids must match the trained topic-word matrix,
+# so words unseen at training time are dropped from the update and counted in
+# state.json instead. The accumulated counts show how much vocabulary a full
+# retrain with lda.py would add; a warning is printed once the OOV rate passes
+# --max-oov. Topic ids are unchanged by the update.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the saved LDA model with messages from new exports.")
+    parser.add_argument("json_files", nargs="+", help="filtered exports containing the new messages")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--updates-file", default=UPDATES_FILE)
+    parser.add_argument("--passes", type=int, default=1, help="online passes over the new messages")
+    parser.add_argument("--max-oov", type=float, default=MAX_OOV_RATE)
+    args = parser.parse_args()
+
+    lda_model, dictionary, state = load_model(args.model_dir)
+    watermark = int(state["max_message_id"])
+
+    new_messages = [msg for json_file in args.json_files for msg in extract_messages(json_file)
+                    if msg.get("id") and int(msg["id"]) > watermark]
+    if not new_messages:
+        raise SystemExit(f"No messages newer than id {watermark}; nothing to update.")
+    print(f"Found {len(new_messages)} new messages after id {watermark}")
+
+    nlp = load_nlp()
+    stop_words = set(load_stop_words())
+    processed_texts = preprocess_texts([msg["content"] for msg in new_messages], nlp, stop_words,
+                                       custom_remove=CUSTOM_REMOVE,
+                                       batch_size=LEMMA_BATCH_SIZE, n_process=N_PROCESS)
+
+    # Map onto the frozen vocabulary and track what falls outside it
+    corpus, oov = [], Counter()
+    for tokens in processed_texts:
+        bow, missing = dictionary.doc2bow(tokens, return_missing=True)
+        corpus.append(bow)
+        oov.update(missing)
+    total_tokens = sum(len(tokens) for tokens in processed_texts)
+    oov_rate = sum(oov.values()) / total_tokens if total_tokens else 0.0
+    print(f"Out-of-vocabulary tokens: {sum(oov.values())}/{total_tokens} ({oov_rate:.1%}), "
+          f"most common: {oov.most_common(10)}")
+
+    start = time.perf_counter()
+    lda_model.update(corpus, passes=args.passes)
+    print(f"Online update on {len(corpus)} documents took {time.perf_counter() - start:.1f}s")
+
+    # Topic assignments for the new messages only, appended to the running log
+    doc_topics = document_topic_matrix(lda_model, corpus)
+    dominant_topics = np.argmax(doc_topics, axis=1)
+    with open(args.updates_file, "a", encoding="utf-8") as f:
+        for msg, topic, mixture in zip(new_messages, dominant_topics.tolist(), doc_topics.tolist()):
+            f.write(json.dumps({
+                "id": msg["id"],
+                "author": msg["author"],
+                "timestamp": msg["timestamp"],
+                "content": msg["content"],
+                "topic": topic,
+                "topics": [round(p, 6) for p in mixture],
+            }) + "\n")
+    print(f"Appended {len(new_messages)} topic assignments to {args.updates_file}")
+
+    oov_counts = Counter(state.get("oov_counts", {}))
+    oov_counts.update(oov)
+    state.update({
+        "max_message_id": str(max_message_id(new_messages, watermark)),
+        "documents": state.get("documents", 0) + len(new_messages),
+        "oov_counts": dict(oov_counts.most_common(5000)),
+    })
+    save_model(lda_model, dictionary, state, args.model_dir)
+    print(f"Model saved to {args.model_dir}")
+
+    if oov_rate > args.max_oov:
+        print(f"Warning: {oov_rate:.1%} of new tokens are outside the vocabulary (limit {args.max_oov:.0%}); "
+              f"consider a full retrain with lda.py")
@@ -1,3 +1,4 @@
+import io
 import streamlit as st
 import json
 import pandas as pd
@@ -5,45 +6,63 @@ import altair as alt
 
 st.title("Topic Explorer: Author & Timeline Visualizations")
 
-# File uploader for JSON
-uploaded_file = st.file_uploader("Upload your topic JSON file", type="json")
+
+# Load only the columns the charts need. Parquet (written by lda.py) is read
+# column-wise; the legacy topic JSON is flattened into columns directly.
+def load_topics(file_bytes, file_name):
+    if file_name.endswith(".parquet"):
+        df = pd.read_parquet(io.BytesIO(file_bytes), columns=["topic", "author", "timestamp"])
+    else:
+        data = json.loads(file_bytes)
+        topics, authors, timestamps = [], [], []
+        for topic_str, msgs in data.items():
+            topic = int(topic_str)
+            for msg in msgs:
+                topics.append(topic)
+                authors.append(msg.get("author", "unknown"))
+                timestamps.append(msg.get("timestamp"))
+        df = pd.DataFrame({"topic": topics, "author": authors, "timestamp": timestamps})
+    df["author"] = df["author"].fillna("unknown").astype("category")
+    df["date"] = pd.to_datetime(df["timestamp"], utc=True, format="ISO8601").dt.normalize()
+    return df
+
+
+# Every per-topic table is computed once from a single topic x date x author
+# grouping, cached across reruns so sidebar changes only slice the results
+@st.cache_data(show_spinner="Aggregating topics...")
+def load_aggregates(file_bytes, file_name):
+    df = load_topics(file_bytes, file_name)
+    counts = df.groupby(["topic", "date", "author"], observed=True).size().rename("count")
+    author_counts = (
+        counts.groupby(level=["topic", "author"], observed=True).sum()
+        .reset_index()
+        .sort_values(["topic", "count"], ascending=[True, False])
+    )
+    timeline = counts.groupby(level=["topic", "date"]).sum().reset_index()
+    author_groups = {topic: group[["author", "count"]] for topic, group in author_counts.groupby("topic")}
+    timeline_groups = {topic: group[["date", "count"]] for topic, group in timeline.groupby("topic")}
+    return sorted(author_groups), author_groups, timeline_groups, len(df)
+
+
+# File uploader for topic assignments
+uploaded_file = st.file_uploader("Upload your topic file (Parquet or JSON)", type=["parquet", "json"])
 if uploaded_file:
-    # Load JSON data
-    data = json.load(uploaded_file)
-    # Flatten into DataFrame
-    records = []
-    for topic_str, msgs in data.items():
-        topic = int(topic_str)
-        for msg in msgs:
-            records.append({
-                "topic": topic,
-                "author": msg.get("author", "unknown"),
-                "timestamp": pd.to_datetime(msg.get("timestamp")),
-                "content": msg.get("content", "")
-            })
-    df = pd.DataFrame(records)
-    df['date'] = df['timestamp'].dt.date
+    topics, author_groups, timeline_groups, message_count = load_aggregates(uploaded_file.getvalue(),
+                                                                            uploaded_file.name)
+    st.caption(f"{message_count} messages across {len(topics)} topics")
 
     # Sidebar: topic selection
-    topics = sorted(df['topic'].unique())
     selected_topics = st.sidebar.multiselect(
         "Select topics to display", topics, default=topics
     )
 
     for topic in selected_topics:
         st.header(f"Topic {topic}")
-        df_topic = df[df['topic'] == topic]
 
         # Top authors bar chart
-        author_counts = (
-            df_topic['author']
-            .value_counts()
-            .reset_index(name='count')
-            .rename(columns={'index': 'author'})
-        )
         st.subheader("Top Authors")
         bar_chart = (
-            alt.Chart(author_counts)
+            alt.Chart(author_groups[topic])
             .mark_bar()
             .encode(
                 x=alt.X('count:Q', title='Message Count'),
@@ -53,14 +72,9 @@ if uploaded_file:
         st.altair_chart(bar_chart, use_container_width=True)
 
         # Timeline frequency line chart
-        timeline = (
-            df_topic.groupby('date')
-            .size()
-            .reset_index(name='count')
-        )
         st.subheader("Timeline Frequency")
         line_chart = (
-            alt.Chart(timeline)
+            alt.Chart(timeline_groups[topic])
             .mark_line(point=True)
             .encode(
                 x=alt.X('date:T', title='Date'),
@@ -69,4 +83,4 @@ if uploaded_file:
         )
         st.altair_chart(line_chart, use_container_width=True)
 else:
-    st.info("Please upload a JSON file to begin visualizing your topics.")
+    st.info("Please upload a Parquet or JSON topic file to begin visualizing your topics.")
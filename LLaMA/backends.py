@@ -0,0 +1,344 @@
+import hashlib
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+DEFAULT_HF_MODEL = "meta-llama/Meta-Llama-3-8B-Instruct"
+# Prompts per generate()/score() call, and a cap on padded prompt tokens per batch
+BATCH_SIZE = 32
+MAX_BATCH_TOKENS = 16384
+
+
+def log_softmax(logits):
+    logits = np.asarray(logits, dtype=np.float64)
+    shifted = logits - logits.max()
+    return shifted - np.log(np.exp(shifted).sum())
+
+
+# Positions grouped into batches of similar prompt length: sorted by token
+# count, then cut at batch_size prompts or max_batch_tokens padded tokens
+def length_buckets(prompt_lengths, batch_size=BATCH_SIZE, max_batch_tokens=MAX_BATCH_TOKENS):
+    order = np.argsort(prompt_lengths, kind="stable")
+    batch = []
+    for i in order:
+        # Sorted ascending, so the newest prompt is the longest in the batch
+        if batch and (len(batch) == batch_size or (len(batch) + 1) * prompt_lengths[i] > max_batch_tokens):
+            yield batch
+            batch = []
+        batch.append(int(i))
+    if batch:
+        yield batch
+
+
+# Every backend implements the same three calls used by run_llama.py:
+#   count_tokens(texts)              -> token count per text
+#   generate(prompts, max_new_tokens) -> generated text per prompt
+#   score(prompts, labels)           -> (len(prompts), len(labels)) label log-likelihoods
+# and exposes model_id, which keys the label cache.
+
+# ----------------------------
+# Hugging Face transformers (GPU or CPU)
+# ----------------------------
+# The model is loaded on first use, so constructing the backend (or importing
+# this module) never logs in or downloads anything.
+class HFBackend:
+    def __init__(self, model_id=DEFAULT_HF_MODEL, token=None, device_map="auto", torch_dtype="auto"):
+        self.model_id = model_id
+        self.token = token
+        self.device_map = device_map
+        self.torch_dtype = torch_dtype
+        self._tokenizer = None
+        self._model = None
+        self._generator = None
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+
+            if self.token:
+                from huggingface_hub import login
+                login(self.token)
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_id, token=self.token)
+            # Llama has no pad token; pad batches with EOS on the left so every
+            # prompt ends right where generation starts
+            self._tokenizer.pad_token = self._tokenizer.eos_token
+            self._tokenizer.padding_side = "left"
+        return self._tokenizer
+
+    @property
+    def model(self):
+        if self._model is None:
+            from transformers import AutoModelForCausalLM
+
+            # Loads the tokenizer first, which logs in when a token is set
+            self.tokenizer
+            self._model = AutoModelForCausalLM.from_pretrained(
+                self.model_id,
+                token=self.token,
+                device_map=self.device_map,
+                torch_dtype=self.torch_dtype
+            )
+        return self._model
+
+    def count_tokens(self, texts):
+        return [len(ids) for ids in self.tokenizer(list(texts), add_special_tokens=False)["input_ids"]]
+
+    def generate(self, prompts, max_new_tokens):
+        if self._generator is None:
+            from transformers import pipeline
+            self._generator = pipeline("text-generation", model=self.model, tokenizer=self.tokenizer,
+                                       return_full_text=False)
+        # Greedy, like the llama.cpp backend (temperature 0), so backends agree on labels
+        outputs = self._generator(list(prompts), max_new_tokens=max_new_tokens, batch_size=len(prompts),
+                                  pad_token_id=self.tokenizer.eos_token_id, do_sample=False)
+        return [output[0]["generated_text"] for output in outputs]
+
+    # The prompts run through the model once; their last logits score each
+    # label's first token. The key/value cache of that shared prefix is then
+    # repeated once per label and all labels' remaining tokens go through a
+    # single second forward pass.
+    def score(self, prompts, labels):
+        import torch
+
+        tokenizer, model = self.tokenizer, self.model
+        with torch.inference_mode():
+            label_ids = [tokenizer(label, add_special_tokens=False)["input_ids"] for label in labels]
+            n_labels, label_len = len(labels), max(len(ids) for ids in label_ids)
+            label_tokens = torch.full((n_labels, label_len), tokenizer.pad_token_id, dtype=torch.long)
+            label_mask = torch.zeros((n_labels, label_len), dtype=torch.bool)
+            for j, ids in enumerate(label_ids):
+                label_tokens[j, :len(ids)] = torch.tensor(ids)
+                label_mask[j, :len(ids)] = True
+
+            encoded = tokenizer(list(prompts), return_tensors="pt", padding=True).to(model.device)
+            attention_mask = encoded["attention_mask"]
+            # Left padding: positions count real tokens only
+            position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+            out = model(input_ids=encoded["input_ids"], attention_mask=attention_mask, position_ids=position_ids,
+                        use_cache=True)
+            first = torch.log_softmax(out.logits[:, -1, :].float(), dim=-1)
+            label_tokens, label_mask = label_tokens.to(model.device), label_mask.to(model.device)
+            scores = first[:, label_tokens[:, 0]]
+
+            if label_len > 1:
+                n_prompts = len(prompts)
+                inputs = label_tokens[:, :-1].repeat(n_prompts, 1)
+                prompt_lengths = attention_mask.sum(-1).repeat_interleave(n_labels)
+                out = model(
+                    input_ids=inputs,
+                    attention_mask=torch.cat([attention_mask.repeat_interleave(n_labels, dim=0),
+                                              torch.ones_like(inputs)], dim=1),
+                    position_ids=prompt_lengths[:, None] + torch.arange(label_len - 1, device=model.device),
+                    past_key_values=repeat_cache(out.past_key_values, n_labels),
+                    use_cache=False,
+                )
+                rest = torch.log_softmax(out.logits.float(), dim=-1)
+                targets = label_tokens[:, 1:].repeat(n_prompts, 1)
+                token_scores = rest.gather(-1, targets[..., None])[..., 0] * label_mask[:, 1:].repeat(n_prompts, 1)
+                scores = scores + token_scores.sum(-1).view(n_prompts, n_labels)
+            return scores.cpu().numpy()
+
+
+# Key/value cache with every batch row repeated n times (row-major: b0 x n, b1 x n, ...)
+def repeat_cache(past_key_values, n):
+    if hasattr(past_key_values, "batch_repeat_interleave"):
+        past_key_values.batch_repeat_interleave(n)
+        return past_key_values
+    return tuple(tuple(t.repeat_interleave(n, dim=0) for t in layer) for layer in past_key_values)
+
+
+# ----------------------------
+# llama.cpp on CPU (quantized GGUF model from a path)
+# ----------------------------
+def load_llama_cpp(model_path, n_threads, n_ctx, vocab_only=False):
+    from llama_cpp import Llama
+
+    return Llama(model_path=model_path, n_threads=n_threads, n_ctx=n_ctx, vocab_only=vocab_only, verbose=False)
+
+
+def llama_cpp_generate(llm, prompts, max_new_tokens):
+    return [llm.create_completion(prompt, max_tokens=max_new_tokens, temperature=0.0)["choices"][0]["text"]
+            for prompt in prompts]
+
+
+# Each prompt is evaluated once; labels are scored token by token on top of
+# it, rewinding the context to the end of the prompt between labels so the
+# prompt's key/value cache is reused.
+def llama_cpp_score(llm, prompts, labels):
+    label_tokens = [llm.tokenize(label.encode("utf-8"), add_bos=False) for label in labels]
+    scores = np.zeros((len(prompts), len(labels)), dtype=np.float32)
+    for i, prompt in enumerate(prompts):
+        llm.reset()
+        llm.eval(llm.tokenize(prompt.encode("utf-8")))
+        n_prompt = llm.n_tokens
+        first = log_softmax(llm.scores[n_prompt - 1])
+        for j, tokens in enumerate(label_tokens):
+            score = first[tokens[0]]
+            llm.n_tokens = n_prompt
+            for previous, token in zip(tokens[:-1], tokens[1:]):
+                llm.eval([previous])
+                score += log_softmax(llm.scores[llm.n_tokens - 1])[token]
+            scores[i, j] = score
+    return scores
+
+
+# One model per worker process
+_worker_llm = None
+
+
+def _init_worker(model_path, n_threads, n_ctx):
+    global _worker_llm
+    _worker_llm = load_llama_cpp(model_path, n_threads, n_ctx)
+
+
+def _worker_generate(prompts, max_new_tokens):
+    return llama_cpp_generate(_worker_llm, prompts, max_new_tokens)
+
+
+def _worker_score(prompts, labels):
+    return llama_cpp_score(_worker_llm, prompts, labels)
+
+
+# Quantized CPU inference through llama-cpp-python. With workers > 1 each
+# worker process holds its own copy of the model and threads are split
+# between them; a batch is divided evenly across the workers. The parent then
+# loads only the vocabulary (for count_tokens), never the weights, and the
+# workers are spawned rather than forked from it.
+class LlamaCppBackend:
+    def __init__(self, model_path, threads=None, workers=1, n_ctx=2048):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"GGUF model not found: {model_path}")
+        self.model_path = model_path
+        self.model_id = os.path.basename(model_path)
+        self.workers = workers
+        self.threads = threads or os.cpu_count()
+        self.n_ctx = n_ctx
+        self._llm = None
+        self._vocab = None
+        self._pool = None
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = load_llama_cpp(self.model_path, self.threads if self.workers == 1 else 1, self.n_ctx)
+        return self._llm
+
+    # Tokenizer only: the in-process model with one worker, else a vocab-only load
+    @property
+    def vocab(self):
+        if self.workers == 1:
+            return self.llm
+        if self._vocab is None:
+            self._vocab = load_llama_cpp(self.model_path, 1, self.n_ctx, vocab_only=True)
+        return self._vocab
+
+    def _map(self, function, prompts, *args):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker,
+                                             initargs=(self.model_path, max(1, self.threads // self.workers),
+                                                       self.n_ctx))
+        parts = [list(part) for part in np.array_split(np.asarray(prompts, dtype=object), self.workers) if len(part)]
+        return list(self._pool.map(function, parts, *[[arg] * len(parts) for arg in args]))
+
+    def count_tokens(self, texts):
+        return [len(self.vocab.tokenize(text.encode("utf-8"), add_bos=False)) for text in texts]
+
+    def generate(self, prompts, max_new_tokens):
+        if self.workers > 1:
+            return [text for part in self._map(_worker_generate, prompts, max_new_tokens) for text in part]
+        return llama_cpp_generate(self.llm, prompts, max_new_tokens)
+
+    def score(self, prompts, labels):
+        if self.workers > 1:
+            return np.concatenate(self._map(_worker_score, prompts, labels))
+        return llama_cpp_score(self.llm, prompts, labels)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+# ----------------------------
+# Deterministic stand-in
+# ----------------------------
+# No model at all: label scores and generated labels are derived from a hash
+# of the prompt, so runs are reproducible offline and on any machine. An
+# optional per-prompt delay stands in for model cost in benchmarks.
+class StubBackend:
+    def __init__(self, seconds_per_prompt=0.0):
+        self.model_id = "stub"
+        self.seconds_per_prompt = seconds_per_prompt
+
+    @staticmethod
+    def _unit(*parts):
+        digest = hashlib.sha256("\0".join(parts).encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+    def count_tokens(self, texts):
+        return [len(text.split()) for text in texts]
+
+    # Picks one of the options listed in the prompt's first "[a, b, ...]"
+    def generate(self, prompts, max_new_tokens):
+        time.sleep(self.seconds_per_prompt * len(prompts))
+        outputs = []
+        for prompt in prompts:
+            options = re.search(r"\[([^\]]*)\]", prompt)
+            labels = [label.strip() for label in options.group(1).split(",")] if options else ["None"]
+            outputs.append(" " + labels[int(self._unit(prompt) * len(labels))])
+        return outputs
+
+    def score(self, prompts, labels):
+        time.sleep(self.seconds_per_prompt * len(prompts))
+        return np.array([[-10 * self._unit(prompt, label) for label in labels] for prompt in prompts],
+                        dtype=np.float32)
+
+
+def load_backend(name, **kwargs):
+    if name == "hf":
+        return HFBackend(**kwargs)
+    if name == "llama-cpp":
+        return LlamaCppBackend(**kwargs)
+    if name == "stub":
+        return StubBackend(**kwargs)
+    raise ValueError(f"Unknown backend: {name}")
+
+
+# ----------------------------
+# Measurement
+# ----------------------------
+# Throughput and latency of one backend, measured the same way for all of
+# them: length-bucketed batches, wall time per batch (every message in a batch
+# waits for the whole batch).
+def measure(backend, prompts, labels, mode="score", batch_size=BATCH_SIZE, max_new_tokens=8):
+    prompt_lengths = backend.count_tokens(prompts)
+    batch_seconds, batch_sizes = [], []
+    start = time.perf_counter()
+    for batch in length_buckets(prompt_lengths, batch_size):
+        batch_start = time.perf_counter()
+        if mode == "score":
+            backend.score([prompts[i] for i in batch], labels)
+        else:
+            backend.generate([prompts[i] for i in batch], max_new_tokens)
+        batch_seconds.append(time.perf_counter() - batch_start)
+        batch_sizes.append(len(batch))
+    elapsed = time.perf_counter() - start
+    per_message = np.repeat(np.asarray(batch_seconds) * 1000, batch_sizes)
+    return {
+        "backend": type(backend).__name__,
+        "model_id": backend.model_id,
+        "mode": mode,
+        "messages": len(prompts),
+        "batch_size": batch_size,
+        "seconds": elapsed,
+        "msgs_per_sec": len(prompts) / elapsed if elapsed else float("inf"),
+        "latency_p50_ms": float(np.percentile(per_message, 50)) if len(per_message) else 0.0,
+        "latency_p99_ms": float(np.percentile(per_message, 99)) if len(per_message) else 0.0,
+        "prompt_tokens": int(sum(prompt_lengths)),
+    }
@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import sys
+
+from backends import BATCH_SIZE, load_backend, measure
+from prompts import EMOTION_LABELS, EMOTION_PROMPT, SENTIMENT_LABELS, SENTIMENT_PROMPT
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "JSON_filter"))
+
+NUM_MESSAGES = 200
+RESULTS_PATH = "backend_benchmark.json"
+
+TASKS = {
+    "emotion": (EMOTION_PROMPT, EMOTION_LABELS),
+    "sentiment": (SENTIMENT_PROMPT, SENTIMENT_LABELS),
+}
+
+
+# Real messages from the message store or exports when available, otherwise
+# synthetic ones with a spread of lengths
+def sample_messages(n, store_dir, input_folder):
+    if os.path.isdir(store_dir):
+        from message_store import MessageStore
+
+        store = MessageStore(store_dir)
+        indices = store.select(non_empty=True)[:n]
+        return [store.content(int(i)) for i in indices]
+    if os.path.isdir(input_folder):
+        from export_reader import iter_messages
+
+        messages = []
+        for fname in sorted(os.listdir(input_folder)):
+            for msg in iter_messages(os.path.join(input_folder, fname)):
+                if msg.get("content"):
+                    messages.append(msg["content"])
+                    if len(messages) == n:
+                        return messages
+        if messages:
+            return messages
+    words = "thanks for the new scan the ink detection model finally works on segment".split()
+    return [" ".join(words[(i + j) % len(words)] for j in range(5 + (i * 7) % 60)) for i in range(n)]
+
+
+# "hf", "stub" or "llama-cpp:<path/to/model.gguf>"
+def make_backend(spec, args, workers):
+    if spec.startswith("llama-cpp:"):
+        return load_backend("llama-cpp", model_path=spec.split(":", 1)[1], threads=args.threads, workers=workers)
+    if spec == "stub":
+        return load_backend("stub", seconds_per_prompt=args.stub_delay)
+    return load_backend(spec)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput and latency of the run_llama.py inference backends.")
+    parser.add_argument("--backends", nargs="+", default=["stub"],
+                        help='"hf", "stub" or "llama-cpp:<path/to/model.gguf>"')
+    parser.add_argument("--modes", nargs="+", choices=["score", "generate"], default=["score", "generate"])
+    parser.add_argument("--tasks", nargs="+", choices=list(TASKS), default=list(TASKS))
+    parser.add_argument("--messages", type=int, default=NUM_MESSAGES)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=os.cpu_count())
+    parser.add_argument("--workers", type=int, nargs="+", default=[1], help="llama-cpp worker processes to try")
+    parser.add_argument("--stub-delay", type=float, default=0.0, help="seconds per prompt for the stub backend")
+    parser.add_argument("--store-dir", default="message_store")
+    parser.add_argument("--input-folder", default="filtered_JSON")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    messages = sample_messages(args.messages, args.store_dir, args.input_folder)
+    print(f"Benchmarking on {len(messages)} messages")
+
+    results = []
+    for spec in args.backends:
+        for workers in (args.workers if spec.startswith("llama-cpp:") else [1]):
+            backend = make_backend(spec, args, workers)
+            for task in args.tasks:
+                prompt_template, labels = TASKS[task]
+                prompts = [prompt_template.format(message=msg) for msg in messages]
+                for mode in args.modes:
+                    result = measure(backend, prompts, labels, mode=mode, batch_size=args.batch_size)
+                    result.update({"task": task, "workers": workers})
+                    results.append(result)
+                    print(f"{spec:<24} workers={workers:<3} {task:<10} {mode:<9} "
+                          f"{result['msgs_per_sec']:>9.1f} msgs/sec  p50 {result['latency_p50_ms']:>8.1f} ms  "
+                          f"p99 {result['latency_p99_ms']:>8.1f} ms")
+            if hasattr(backend, "close"):
+                backend.close()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import sqlite3
+
+CACHE_PATH = "llama_label_cache.sqlite"
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# Short hash identifying a prompt template, its label set and the
+# classification mode; editing any of them starts a fresh set of cache entries
+def prompt_version(prompt_template, labels, mode):
+    payload = json.dumps([prompt_template, list(labels), mode])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+# Persistent label store for run_llama.py, keyed by (content hash, task,
+# prompt version, model id).
+#
+# Results are committed batch by batch to an SQLite file in WAL mode, so a
+# crashed run keeps everything classified so far and a rerun only classifies
+# what is missing. Keying by content means identical messages (common in
+# Discord) are classified once.
+class LabelCache:
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS labels (
+                content_hash TEXT NOT NULL,
+                task TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                model_id TEXT NOT NULL,
+                label TEXT NOT NULL,
+                probs TEXT,
+                PRIMARY KEY (content_hash, task, prompt_version, model_id)
+            )""")
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    # {content_hash: (label, probs or None)} for the cached hashes
+    def get_many(self, hashes, task, version, model_id, batch_size=500):
+        hashes = list(hashes)
+        found = {}
+        for start in range(0, len(hashes), batch_size):
+            batch = hashes[start:start + batch_size]
+            rows = self.conn.execute(
+                f"SELECT content_hash, label, probs FROM labels WHERE task = ? AND prompt_version = ? "
+                f"AND model_id = ? AND content_hash IN ({','.join('?' * len(batch))})",
+                [task, version, model_id, *batch])
+            for h, label, probs in rows:
+                found[h] = (label, json.loads(probs) if probs else None)
+        return found
+
+    # Store {content_hash: (label, probs or None)} and commit
+    def put_many(self, results, task, version, model_id):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO labels VALUES (?, ?, ?, ?, ?, ?)",
+            [(h, task, version, model_id, label, json.dumps(probs) if probs is not None else None)
+             for h, (label, probs) in results.items()])
+        self.conn.commit()
+
+    def count(self, task, version, model_id):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM labels WHERE task = ? AND prompt_version = ? AND model_id = ?",
+            (task, version, model_id)).fetchone()[0]
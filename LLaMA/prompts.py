@@ -0,0 +1,33 @@
+# Prompts and allowed labels shared by run_llama.py and benchmark_backends.py
+
+EMOTION_PROMPT = """
+You are an assistant that analyzes Discord messages for emotion.
+Reply with ONLY one of these emotions:
+Emotion: [Gratitude, Ingratitude, Respect, Disrespect, Excitement, Forgiveness, Unforgiveness, Arrogance, Humility, Eagerness, Reluctance, Helpfulness, Frustration, Confusion]
+
+Example:
+Message: "Thanks for your help!"
+Emotion: Gratitude
+
+Now analyze this message:
+Message: "{message}"
+Emotion:
+"""
+
+SENTIMENT_PROMPT = """
+You are an assistant that analyzes Discord messages for sentiment.
+Reply with ONLY one of the following:
+Sentiment: [Positive, Neutral, Negative, None]
+
+Example:
+Message: "Thanks for your help!"
+Sentiment: Positive
+
+Now analyze this message:
+Message: "{message}"
+Sentiment:
+"""
+
+EMOTION_LABELS = ["Gratitude", "Ingratitude", "Respect", "Disrespect", "Excitement", "Forgiveness", "Unforgiveness",
+                  "Arrogance", "Humility", "Eagerness", "Reluctance", "Helpfulness", "Frustration", "Confusion"]
+SENTIMENT_LABELS = ["Positive", "Neutral", "Negative", "None"]
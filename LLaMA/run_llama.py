@@ -1,41 +1,75 @@
 # ========================
-# SETUP: Hugging Face Transformers and Environment
+# SETUP: Inference Backend and Environment
 # ========================
 
 import os
 import re
+import sys
 import json
 import time
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 from datetime import datetime
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-from huggingface_hub import login
+
+from backends import MAX_BATCH_TOKENS, length_buckets, load_backend
 
 # Hugging Face setup — use your own token for access to huggingface llama
 HUGGINGFACE_TOKEN = "YOUR_HUGGINGFACE_TOKEN_HERE"
 
-login(HUGGINGFACE_TOKEN)
-
 model_id = "meta-llama/Meta-Llama-3-8B-Instruct"
 
-# Load model and tokenizer
-tokenizer = AutoTokenizer.from_pretrained(model_id, token=HUGGINGFACE_TOKEN)
-model = AutoModelForCausalLM.from_pretrained(
-    model_id,
-    token=HUGGINGFACE_TOKEN,
-    device_map="auto",
-    torch_dtype="auto"
-)
+# Inference backend (backends.py): "hf" runs model_id with transformers (GPU when
+# available); "llama-cpp" runs a quantized GGUF model from LLAMA_CPP_MODEL_PATH on
+# CPU; "stub" is a deterministic stand-in without a model. LLAMA_BACKEND overrides it.
+BACKEND = os.environ.get("LLAMA_BACKEND", "hf")
+LLAMA_CPP_MODEL_PATH = "models/Meta-Llama-3-8B-Instruct-Q4_K_M.gguf"
+LLAMA_CPP_THREADS = os.cpu_count()
+# Processes with their own copy of the model; threads are split between them
+LLAMA_CPP_WORKERS = 1
+
+_backend = None
+
+# The configured backend, created on first use and shared by every call in the
+# process; importing this module loads no model
+def get_backend():
+    global _backend
+    if _backend is None:
+        if BACKEND == "hf":
+            # Logs in and loads the model on first use
+            _backend = load_backend("hf", model_id=model_id, token=HUGGINGFACE_TOKEN)
+        elif BACKEND == "llama-cpp":
+            _backend = load_backend("llama-cpp", model_path=LLAMA_CPP_MODEL_PATH, threads=LLAMA_CPP_THREADS,
+                                    workers=LLAMA_CPP_WORKERS)
+        else:
+            _backend = load_backend(BACKEND)
+    return _backend
+
+# Prompts per generate() call
+BATCH_SIZE = 32
 
-# Set up text generation pipeline
-generator = pipeline("text-generation", model=model, tokenizer=tokenizer, return_full_text=False)
+# "score": rank every allowed label by log-likelihood in one forward pass (no
+# invalid outputs, per-label probabilities); "generate": free-text generation + regex
+CLASSIFICATION_MODE = "score"
+# Prompts per scoring pass; each is expanded to one row per label, so keep it below BATCH_SIZE
+SCORE_BATCH_SIZE = 8
+# Label picked in "score" mode: "sum" takes the most probable label (summed token
+# log-probabilities, log P(label | prompt)); "mean" is a ranking heuristic that
+# divides by the label's token count so multi-token labels ("Unforgiveness")
+# are not penalized. The saved _p_<label> probabilities are P(label | prompt) either way.
+SCORE_RANKING = "sum"
 
 # ========================
 # Load Discord Data
 # ========================
-input_folder = 'filtered_JSON' #have filtered_JSON folder in the same directory as this script
-output_path = 'LLaMA_emotion_sentiment_ALL.xlsx'
+# LLAMA_INPUT_DIR, LLAMA_STORE_DIR, LLAMA_OUTPUT and LLAMA_CACHE override the paths below
+input_folder = os.environ.get("LLAMA_INPUT_DIR", 'filtered_JSON') #have filtered_JSON folder in the same directory as this script
+store_dir = os.environ.get("LLAMA_STORE_DIR", 'message_store') #columnar store from JSON_filter/message_store.py, used instead of input_folder when present
+output_path = os.environ.get("LLAMA_OUTPUT", 'LLaMA_emotion_sentiment_ALL.xlsx')
+cache_path = os.environ.get("LLAMA_CACHE", 'llama_label_cache.sqlite') #labels already classified; delete it to start over
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "JSON_filter"))
+from label_cache import LabelCache, content_hash, prompt_version
 
 def get_all_documents(folder):
     all_docs = []
@@ -60,111 +94,246 @@ def get_all_documents(folder):
                     })
     return all_docs
 
-df = pd.DataFrame(get_all_documents(input_folder))
-df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-df['timestamp'] = df['timestamp'].dt.strftime('%m/%d/%Y %H:%M')
+# Same rows as get_all_documents, built column-wise from the memory-mapped store
+def get_all_documents_from_store(store_dir):
+    from message_store import MessageStore
+
+    store = MessageStore(store_dir)
+    indices = store.select(non_empty=True)
+    channel_names = np.asarray(store.channel_names, dtype=object)
+    author_names = np.asarray(store.author_names, dtype=object)
+    timestamps = pd.Series(store.timestamp[indices])
+    docs = pd.DataFrame({
+        "channel": channel_names[store.channel[indices]],
+        "user": author_names[store.author[indices]],
+        "timestamp": pd.to_datetime(timestamps.where(timestamps >= 0), unit="ms"),
+        "content": [store.content(i) for i in indices],
+    })
+    joined = docs["content"].str.lower().str.contains("joined the server", regex=False)
+    return docs[~joined].reset_index(drop=True)
+
+# Messages to classify, from the store when present, with display timestamps
+def load_documents(input_folder=input_folder, store_dir=store_dir):
+    if os.path.isdir(store_dir):
+        df = get_all_documents_from_store(store_dir)
+    else:
+        df = pd.DataFrame(get_all_documents(input_folder))
+    df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
+    df['timestamp'] = df['timestamp'].dt.strftime('%m/%d/%Y %H:%M')
+    return df
 
 # ========================
 # PROMPTS
 # ========================
 
-EMOTION_PROMPT = """
-You are an assistant that analyzes Discord messages for emotion.
-Reply with ONLY one of these emotions:
-Emotion: [Gratitude, Ingratitude, Respect, Disrespect, Excitement, Forgiveness, Unforgiveness, Arrogance, Humility, Eagerness, Reluctance, Helpfulness, Frustration, Confusion]
+# Prompt templates and allowed labels live in prompts.py
+from prompts import EMOTION_PROMPT, SENTIMENT_PROMPT, EMOTION_LABELS, SENTIMENT_LABELS
 
-Example:
-Message: "Thanks for your help!"
-Emotion: Gratitude
+# ========================
+# BATCHED CLASSIFICATION
+# ========================
 
-Now analyze this message:
-Message: "{message}"
-Emotion:
-"""
+# "<Label_name>: <label>" as in the original patterns, or an output that is
+# nothing but the bare label; a label word elsewhere in the text is not a match
+def label_pattern(labels, label_name):
+    alternatives = '|'.join(labels)
+    return rf"(?:{label_name}:\s*|^\s*(?=(?:{alternatives})\W*$))\b({alternatives})\b"
 
-SENTIMENT_PROMPT = """
-You are an assistant that analyzes Discord messages for sentiment.
-Reply with ONLY one of the following:
-Sentiment: [Positive, Neutral, Negative, None]
+# Enough new tokens for "<Label_name>: <label>" plus a leading newline
+def label_token_budget(labels, label_name):
+    return max(get_backend().count_tokens([f"\n{label_name.capitalize()}: {label}" for label in labels])) + 2
 
-Example:
-Message: "Thanks for your help!"
-Sentiment: Positive
+# Generated text for each prompt, or None where generation failed. A failing
+# batch is halved and retried (e.g. out of memory on the longest bucket), so
+# only prompts that fail on their own are given up on.
+def generate_splitting(prompts, max_new_tokens, label_name):
+    try:
+        return get_backend().generate(prompts, max_new_tokens)
+    except Exception as e:
+        if len(prompts) == 1:
+            print(f"Error on a {label_name} prompt: {e}")
+            return [None]
+        print(f"Error on {label_name} batch of {len(prompts)}, retrying in halves: {e}")
+        half = len(prompts) // 2
+        return (generate_splitting(prompts[:half], max_new_tokens, label_name)
+                + generate_splitting(prompts[half:], max_new_tokens, label_name))
 
-Now analyze this message:
-Message: "{message}"
-Sentiment:
-"""
+# Classify messages in length-bucketed batches. Returns labels in the order of
+# messages ("invalid" when no label could be parsed, "error" when generation
+# failed) and the positions of the invalid ones, which need another pass.
+# Errors are not retried: a prompt that failed alone would fail again.
+def classify_with_prompt(messages, prompt_template, pattern, label_name="emotion", max_new_tokens=50,
+                         batch_size=BATCH_SIZE):
+    messages = list(messages)
+    prompts = [prompt_template.format(message=msg) for msg in messages]
+    prompt_lengths = get_backend().count_tokens(prompts)
+    results = ["invalid"] * len(prompts)
+    invalids = []
 
-# ========================
-# EMOTION CLASSIFICATION
-# ========================
+    start = time.perf_counter()
+    with tqdm(total=len(prompts), desc=f"Classifying {label_name}") as progress:
+        for batch in length_buckets(prompt_lengths, batch_size):
+            outputs = generate_splitting([prompts[i] for i in batch], max_new_tokens, label_name)
+            for i, output in zip(batch, outputs):
+                if output is None:
+                    results[i] = "error"
+                    continue
+                match = re.search(pattern, output, re.IGNORECASE)
+                if match:
+                    results[i] = match.group(1).lower()
+                else:
+                    invalids.append(i)
+            progress.update(len(batch))
+    elapsed = time.perf_counter() - start
+    if prompts:
+        print(f"{label_name}: {len(prompts)} messages in {elapsed:.1f}s "
+              f"({len(prompts) / max(elapsed, 1e-9):.1f} msgs/sec), {len(invalids)} invalid")
 
-def classify_with_prompt(messages, prompt_template, pattern, label_name="emotion"):
-    results = []
-    invalids = []
+    return results, sorted(invalids)
 
-    for i, msg in enumerate(tqdm(messages, desc=f"Classifying {label_name}")):
-        prompt = prompt_template.format(message=msg)
-        try:
-            output = generator(prompt, max_new_tokens=50)[0]['generated_text']
-            match = re.search(pattern, output, re.IGNORECASE)
-            if match:
-                results.append(match.group(1).lower())
-            else:
-                results.append("invalid")
-                invalids.append(i)
-        except Exception as e:
-            print(f"Error on {label_name} index {i}: {e}")
-            results.append("error")
-            invalids.append(i)
-
-    return results, invalids
-
-def reclassify_until_valid(df, column_name, messages, prompt_template, pattern, label_name="emotion", max_retries=300):
+# Retry the messages without a parsable label in batched passes; returns the
+# final labels, "invalid" where every pass failed
+def classify_until_valid(messages, prompt_template, pattern, label_name="emotion", max_retries=300,
+                         max_new_tokens=50):
+    messages = list(messages)
+    results, invalid_positions = classify_with_prompt(messages, prompt_template, pattern, label_name=label_name,
+                                                      max_new_tokens=max_new_tokens)
     for attempt in range(max_retries):
-        invalid_indices = df[df[column_name] == "invalid"].index
-        if len(invalid_indices) == 0:
+        if len(invalid_positions) == 0:
             print(f"All {label_name} entries valid after {attempt} retry pass(es).")
             break
-        print(f"🔁 Retry {attempt + 1}/{max_retries}: {len(invalid_indices)} invalid {label_name} entries remaining...")
-        
-        for i in tqdm(invalid_indices, desc=f"Retrying {label_name}, pass {attempt+1}"):
-            prompt = prompt_template.format(message=messages[i])
-            try:
-                output = generator(prompt, max_new_tokens=50)[0]['generated_text']
-                match = re.search(pattern, output, re.IGNORECASE)
-                if match:
-                    df.at[i, column_name] = match.group(1).lower()
-            except Exception as e:
-                print(f"Error retrying index {i}: {e}")
+        print(f"🔁 Retry {attempt + 1}/{max_retries}: {len(invalid_positions)} invalid {label_name} entries remaining...")
+
+        labels, still_invalid = classify_with_prompt([messages[i] for i in invalid_positions], prompt_template,
+                                                     pattern, label_name=f"{label_name} (retry {attempt + 1})",
+                                                     max_new_tokens=max_new_tokens)
+        for i, label in zip(invalid_positions, labels):
+            results[i] = label
+        invalid_positions = [invalid_positions[j] for j in still_invalid]
     else:
-        print(f"❗ Reached max retries for {label_name}. {len(df[df[column_name] == 'invalid'])} still invalid.")
-# EMOTION classification
-emotion_pattern = r"Emotion:\s*(Gratitude|Ingratitude|Respect|Disrespect|Excitement|Forgiveness|Unforgiveness|Arrogance|Humility|Eagerness|Reluctance|Helpfulness|Frustration|Confusion)"
-df["llama_emotion"], _ = classify_with_prompt(df["content"], EMOTION_PROMPT, emotion_pattern)
-reclassify_until_valid(df, "llama_emotion", df["content"], EMOTION_PROMPT, emotion_pattern, label_name="emotion")
+        print(f"❗ Reached max retries for {label_name}. {len(invalid_positions)} still invalid.")
+    return results
+
+# ========================
+# LABEL SCORING
+# ========================
+
+# Constrained classification: the chosen label for every message (see
+# SCORE_RANKING), plus the label distribution (log-likelihoods renormalized
+# over the labels), in the order of messages. Each label is scored by its
+# log-likelihood given the prompt (backend.score); batches are length-bucketed
+# as in classify_with_prompt.
+def score_with_prompt(messages, prompt_template, labels, label_name="emotion", batch_size=SCORE_BATCH_SIZE):
+    prompts = [prompt_template.format(message=msg) for msg in messages]
+    prompt_lengths = get_backend().count_tokens(prompts)
+    log_likelihoods = np.zeros((len(prompts), len(labels)), dtype=np.float32)
+
+    start = time.perf_counter()
+    with tqdm(total=len(prompts), desc=f"Scoring {label_name}") as progress:
+        for batch in length_buckets(prompt_lengths, batch_size, MAX_BATCH_TOKENS // len(labels)):
+            log_likelihoods[batch] = get_backend().score([prompts[i] for i in batch], labels)
+            progress.update(len(batch))
+    elapsed = time.perf_counter() - start
+    if prompts:
+        print(f"{label_name}: {len(prompts)} messages in {elapsed:.1f}s "
+              f"({len(prompts) / max(elapsed, 1e-9):.1f} msgs/sec)")
+
+    probs = np.exp(log_likelihoods - log_likelihoods.max(axis=1, keepdims=True))
+    probs /= probs.sum(axis=1, keepdims=True)
+    ranking = log_likelihoods
+    if SCORE_RANKING == "mean":
+        ranking = log_likelihoods / np.maximum(np.asarray(get_backend().count_tokens(labels), dtype=np.float32), 1)
+    predicted = [labels[j].lower() for j in ranking.argmax(axis=1)]
+    return predicted, probs
+
+# ========================
+# CACHED CLASSIFICATION
+# ========================
+
+# Unique messages classified per cache flush; a crash loses at most one group
+CACHE_FLUSH_SIZE = 1024
+
+# Label (and label probabilities) for every message, in order. Identical
+# contents are classified once; results are read from and flushed to the
+# label cache, so an interrupted run resumes where it stopped.
+def classify_cached(cache, messages, prompt_template, labels, label_name):
+    # The heuristic ranking picks different labels, so it gets its own cache version
+    mode = f"score:{SCORE_RANKING}" if CLASSIFICATION_MODE == "score" and SCORE_RANKING != "sum" else CLASSIFICATION_MODE
+    version = prompt_version(prompt_template, labels, mode)
+    model_key = get_backend().model_id
+    hashes = [content_hash(msg) for msg in messages]
+    unique = dict(zip(hashes, messages))
+    results = cache.get_many(unique, label_name, version, model_key)
+    missing = [h for h in unique if h not in results]
+    print(f"{label_name}: {len(messages)} messages, {len(unique)} unique, {len(results)} cached, "
+          f"{len(missing)} to classify")
+
+    for start in range(0, len(missing), CACHE_FLUSH_SIZE):
+        group = missing[start:start + CACHE_FLUSH_SIZE]
+        texts = [unique[h] for h in group]
+        if CLASSIFICATION_MODE == "score":
+            predicted, probs = score_with_prompt(texts, prompt_template, labels, label_name=label_name)
+            classified = {h: (label, p.tolist()) for h, label, p in zip(group, predicted, probs)}
+        else:
+            pattern = label_pattern(labels, label_name.capitalize())
+            predicted = classify_until_valid(texts, prompt_template, pattern, label_name=label_name,
+                                             max_new_tokens=label_token_budget(labels, label_name))
+            # Invalid rows are left out so the next run tries them again
+            classified = {h: (label, None) for h, label in zip(group, predicted) if label not in ("invalid", "error")}
+        cache.put_many(classified, label_name, version, model_key)
+        results.update(classified)
 
-# SENTIMENT classification
-sentiment_pattern = r"Sentiment:\s*(Positive|Neutral|Negative)"
-df["llama_sentiment"], _ = classify_with_prompt(df["content"], SENTIMENT_PROMPT, sentiment_pattern, label_name="sentiment")
-reclassify_until_valid(df, "llama_sentiment", df["content"], SENTIMENT_PROMPT, sentiment_pattern, label_name="sentiment")
+    predicted = [results[h][0] if h in results else "invalid" for h in hashes]
+    probs = np.full((len(messages), len(labels)), np.nan, dtype=np.float32)
+    for row, h in enumerate(hashes):
+        if h in results and results[h][1] is not None:
+            probs[row] = results[h][1]
+    return predicted, probs
+
+# Label column, plus the probability columns when labels were scored
+def add_label_columns(df, column_name, labels, predicted, probs):
+    df[column_name] = predicted
+    if CLASSIFICATION_MODE != "score":
+        return
+    df[f"{column_name}_prob"] = np.nanmax(probs, axis=1) if len(probs) else []
+    for j, label in enumerate(labels):
+        df[f"{column_name}_p_{label.lower()}"] = probs[:, j]
+
+# Add emotion and sentiment columns to df
+def label_messages(df, cache_path=cache_path):
+    messages = list(df["content"])
+    with LabelCache(cache_path) as cache:
+        emotions, emotion_probs = classify_cached(cache, messages, EMOTION_PROMPT, EMOTION_LABELS, "emotion")
+        add_label_columns(df, "llama_emotion", EMOTION_LABELS, emotions, emotion_probs)
+        sentiments, sentiment_probs = classify_cached(cache, messages, SENTIMENT_PROMPT, SENTIMENT_LABELS, "sentiment")
+        add_label_columns(df, "llama_sentiment", SENTIMENT_LABELS, sentiments, sentiment_probs)
+    return df
 
 # ========================
 # SAVE RESULTS
 # ========================
-os.makedirs(os.path.dirname(output_path), exist_ok=True)
-df.to_excel(output_path, index=False)
+def save_results(df, output_path=output_path):
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    df.to_excel(output_path, index=False)
+
+    # Summary sheets
+    emotion_counts = df["llama_emotion"].value_counts().reset_index()
+    emotion_counts.columns = ["Emotion", "Count"]
+
+    sentiment_counts = df["llama_sentiment"].value_counts().reset_index()
+    sentiment_counts.columns = ["Sentiment", "Count"]
 
-# Summary sheets
-emotion_counts = df["llama_emotion"].value_counts().reset_index()
-emotion_counts.columns = ["Emotion", "Count"]
+    with pd.ExcelWriter(output_path, engine='openpyxl', mode='a') as writer:
+        emotion_counts.to_excel(writer, sheet_name="Emotion Counts", index=False)
+        sentiment_counts.to_excel(writer, sheet_name="Sentiment Counts", index=False)
 
-sentiment_counts = df["llama_sentiment"].value_counts().reset_index()
-sentiment_counts.columns = ["Sentiment", "Count"]
+    print(f"Results saved to: {output_path}")
 
-with pd.ExcelWriter(output_path, engine='openpyxl', mode='a') as writer:
-    emotion_counts.to_excel(writer, sheet_name="Emotion Counts", index=False)
-    sentiment_counts.to_excel(writer, sheet_name="Sentiment Counts", index=False)
+def main():
+    df = load_documents()
+    label_messages(df)
+    save_results(df)
 
-print(f"Results saved to: {output_path}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import numpy as np
+from langchain_core.prompts import PromptTemplate
+
+from config import DEFAULT_DATABASE
+from qa_prompt import template
+from retrieval_client import RetrievalClient
+
+DEFAULT_MODEL = "llama3.2:latest"
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+# Answers generated at once, and retrievals running at once ahead of them
+CONCURRENCY = 4
+RETRIEVAL_CONCURRENCY = 8
+K = 8
+
+prompt = PromptTemplate.from_template(template)
+
+
+# Questions from a text file (one per line) or a JSONL file with a "question" field
+def load_questions(path):
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                line = json.loads(line)["question"]
+            questions.append(line)
+    return questions
+
+
+# ----------------------------
+# Retrieval
+# ----------------------------
+# Blocking search function for the chosen source; it runs in worker threads
+def make_search(mode, database_loc):
+    if mode == "none":
+        return lambda question: []
+    if mode in ("auto", "server"):
+        client = RetrievalClient()
+        if client.available():
+            return lambda question: client.search(question, k=K)
+        if mode == "server":
+            raise SystemExit("Retrieval server is not running (python retrieval_server.py)")
+
+    from langchain_chroma import Chroma
+    from embedding_cache import load_query_embeddings
+
+    vectorstore = Chroma(persist_directory=database_loc, embedding_function=load_query_embeddings())
+    return lambda question: vectorstore.similarity_search(question, k=K)
+
+
+# ----------------------------
+# Batch QA
+# ----------------------------
+# Retrieval and generation as two stages joined by a bounded queue: up to
+# retrieval_concurrency searches run ahead (in threads) while up to
+# concurrency answers stream from Ollama, so the next questions' context is
+# ready by the time a generation slot frees up. Each result is written as
+# soon as its answer is complete.
+class BatchQA:
+    def __init__(self, llm, search, concurrency=CONCURRENCY, retrieval_concurrency=RETRIEVAL_CONCURRENCY,
+                 echo=False):
+        self.llm = llm
+        self.search = search
+        self.concurrency = concurrency
+        self.retrieval_concurrency = retrieval_concurrency
+        self.echo = echo
+
+    async def _retrieve(self, index, question, limit, queue):
+        async with limit:
+            started, error = time.perf_counter(), None
+            try:
+                docs = await asyncio.to_thread(self.search, question)
+            except Exception as e:
+                # Answered without context rather than stalling the batch
+                docs, error = [], f"retrieval: {e}"
+            await queue.put((index, question, docs, started, time.perf_counter(), error))
+
+    async def _generate(self, queue, results, out):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            index, question, docs, retrieval_started, retrieved, error = item
+            context = "\n\n".join(doc.page_content for doc in docs)
+            messages = prompt.invoke({"question": question, "context": context})
+            chunks, first_token = [], None
+            generation_started = time.perf_counter()
+            try:
+                async for chunk in self.llm.astream(messages):
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                    chunks.append(chunk)
+                    if self.echo:
+                        print(chunk, end="", flush=True)
+            except Exception as e:
+                error = f"generation: {e}"
+            finished = time.perf_counter()
+            if self.echo:
+                print()
+
+            result = {
+                "index": index,
+                "question": question,
+                "answer": "".join(chunks),
+                "context_ids": [getattr(doc, "id", None) for doc in docs],
+                "retrieval_ms": (retrieved - retrieval_started) * 1000,
+                "queue_ms": (generation_started - retrieved) * 1000,
+                "ttft_ms": (first_token - generation_started) * 1000 if first_token else None,
+                "generation_ms": (finished - generation_started) * 1000,
+                "total_ms": (finished - retrieval_started) * 1000,
+                "chunks": len(chunks),
+            }
+            if error:
+                result["error"] = error
+            results.append(result)
+            if out is not None:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+
+    async def run(self, questions, out=None):
+        # Retrieved contexts waiting for a generation slot are capped, so retrieval
+        # stays just ahead of generation instead of running through the whole batch
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        limit = asyncio.Semaphore(self.retrieval_concurrency)
+        results = []
+        workers = [asyncio.create_task(self._generate(queue, results, out)) for _ in range(self.concurrency)]
+        await asyncio.gather(*(self._retrieve(i, q, limit, queue) for i, q in enumerate(questions)))
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+        return sorted(results, key=lambda result: result["index"])
+
+
+def summarize(results, elapsed):
+    def percentiles(key):
+        values = [r[key] for r in results if r.get(key) is not None]
+        if not values:
+            return {}
+        return {f"{key}_p50": float(np.percentile(values, 50)), f"{key}_p95": float(np.percentile(values, 95))}
+
+    summary = {"questions": len(results), "errors": sum("error" in r for r in results), "seconds": elapsed,
+               "questions_per_sec": len(results) / elapsed if elapsed else 0.0}
+    for key in ("retrieval_ms", "ttft_ms", "total_ms"):
+        summary.update(percentiles(key))
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a batch of questions concurrently with streaming generation.")
+    parser.add_argument("questions", help="text file with one question per line, or JSONL with a 'question' field")
+    parser.add_argument("--output", default="batch_qa_results.jsonl")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--ollama-url", default=DEFAULT_OLLAMA_URL,
+                        help="Ollama endpoint; point it at fake_ollama.py for tests")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--retrieval-concurrency", type=int, default=RETRIEVAL_CONCURRENCY)
+    parser.add_argument("--retrieval", choices=["auto", "server", "local", "none"], default="auto",
+                        help="auto uses the retrieval server when it is running, else the local Chroma store")
+    parser.add_argument("--database", default=DEFAULT_DATABASE)
+    parser.add_argument("--echo", action="store_true", help="print tokens as they stream (use with --concurrency 1)")
+    args = parser.parse_args()
+
+    from langchain_ollama import OllamaLLM
+
+    questions = load_questions(args.questions)
+    llm = OllamaLLM(model=args.model, base_url=args.ollama_url)
+    qa = BatchQA(llm, make_search(args.retrieval, args.database), args.concurrency, args.retrieval_concurrency,
+                 args.echo)
+
+    start = time.perf_counter()
+    with open(args.output, "w", encoding="utf-8") as out:
+        results = asyncio.run(qa.run(questions, out))
+    summary = summarize(results, time.perf_counter() - start)
+
+    summary_path = args.output.rsplit(".", 1)[0] + "_summary.json"
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print(json.dumps(summary, indent=2))
+    print(f"Answers written to {args.output}, summary to {summary_path}", file=sys.stderr)
@@ -0,0 +1,164 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import time
+
+import numpy as np
+
+from config import DEFAULT_DATABASE
+from quantized_store import DEFAULT_NPROBE, QuantizedVectorStore, normalize
+
+K = 8
+NUM_QUERIES = 200
+BENCH_DIR = "./vector_store_bench"
+
+
+# ----------------------------
+# Backends, each timed in its own process so resident memory is comparable
+# ----------------------------
+def peak_rss_mib():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_backend(name, bench_dir, database_loc):
+    if name == "exact":
+        vectors = normalize(np.load(os.path.join(bench_dir, "exact_vectors.npy")))
+        with open(os.path.join(bench_dir, "ids.json"), encoding="utf-8") as f:
+            ids = json.load(f)
+
+        def search(query, k):
+            scores = vectors @ query
+            top = np.argpartition(-scores, k - 1)[:k]
+            return [ids[i] for i in top[np.argsort(-scores[top])]]
+        return search
+    if name == "chroma":
+        from langchain_chroma import Chroma
+
+        chroma = Chroma(persist_directory=database_loc)
+
+        def search(query, k):
+            hits = chroma.similarity_search_by_vector_with_relevance_scores(query.tolist(), k=k)
+            return [doc.id for doc, _ in hits]
+        return search
+
+    # "<dtype>-ivf<nprobe>", e.g. int8-ivf16
+    dtype, nprobe = name.split("-ivf")
+    store = QuantizedVectorStore(os.path.join(bench_dir, dtype), nprobe=int(nprobe))
+
+    def search(query, k):
+        return [store.ids[row] for row, _ in store.search_rows(query, k)]
+    return search
+
+
+def run_backend(name, bench_dir, database_loc, k, results):
+    baseline = peak_rss_mib()
+    start = time.perf_counter()
+    search = load_backend(name, bench_dir, database_loc)
+    load_seconds = time.perf_counter() - start
+    queries = np.load(os.path.join(bench_dir, "queries.npy"))
+    with open(os.path.join(bench_dir, "query_ids.json"), encoding="utf-8") as f:
+        query_ids = json.load(f)
+
+    hits, latencies = [], []
+    for query, query_id in zip(queries, query_ids):
+        start = time.perf_counter()
+        found = search(query, k + 1)
+        latencies.append((time.perf_counter() - start) * 1000)
+        # Queries sampled from the store would trivially find themselves
+        hits.append([doc_id for doc_id in found if doc_id != query_id][:k])
+    results.put({
+        "backend": name,
+        "hits": hits,
+        "load_seconds": load_seconds,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "peak_rss_mib": peak_rss_mib(),
+        "rss_over_baseline_mib": peak_rss_mib() - baseline,
+    })
+
+
+def measure(name, bench_dir, database_loc, k):
+    # spawn, so no backend inherits memory from this process or a previous run
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run_backend, args=(name, bench_dir, database_loc, k, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+# ----------------------------
+# Benchmark data
+# ----------------------------
+# Export the Chroma store once, build the quantized stores and pick queries
+def prepare(database_loc, bench_dir, num_queries, nlist, queries_file, seed=0):
+    os.makedirs(bench_dir, exist_ok=True)
+    start = time.perf_counter()
+    ids, texts, metadatas, vectors = QuantizedVectorStore.export_chroma(database_loc)
+    print(f"Exported {len(ids)} chunks from {database_loc} in {time.perf_counter() - start:.1f}s")
+    np.save(os.path.join(bench_dir, "exact_vectors.npy"), vectors)
+    with open(os.path.join(bench_dir, "ids.json"), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+
+    for dtype in ("int8", "float16"):
+        QuantizedVectorStore.build(os.path.join(bench_dir, dtype), ids, texts, metadatas, vectors, dtype=dtype,
+                                   nlist=nlist)
+
+    if queries_file:
+        # Real questions, embedded with the model the store was built with
+        from embedding_cache import CachedEmbeddings
+
+        with open(queries_file, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        embeddings = CachedEmbeddings()
+        queries = normalize([embeddings.embed_query(question) for question in questions])
+        query_ids = [None] * len(questions)
+    else:
+        # Stored chunks as queries; each is excluded from its own results
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(len(ids), min(num_queries, len(ids)), replace=False)
+        queries = normalize(vectors[rows])
+        query_ids = [ids[row] for row in rows]
+    np.save(os.path.join(bench_dir, "queries.npy"), queries)
+    with open(os.path.join(bench_dir, "query_ids.json"), "w", encoding="utf-8") as f:
+        json.dump(query_ids, f)
+
+
+def recall_at_k(hits, truth, k):
+    return float(np.mean([len(set(found[:k]) & set(expected[:k])) / max(len(expected[:k]), 1)
+                          for found, expected in zip(hits, truth)]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall, latency and memory of the vector store backends.")
+    parser.add_argument("--database", default=DEFAULT_DATABASE)
+    parser.add_argument("--bench-dir", default=BENCH_DIR)
+    parser.add_argument("--queries", type=int, default=NUM_QUERIES, help="number of stored chunks used as queries")
+    parser.add_argument("--queries-file", default=None, help="text file with one question per line instead")
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, DEFAULT_NPROBE, 64])
+    parser.add_argument("--skip-chroma", action="store_true")
+    parser.add_argument("--reuse", action="store_true", help="reuse the exported data in --bench-dir")
+    args = parser.parse_args()
+
+    if not args.reuse:
+        prepare(args.database, args.bench_dir, args.queries, args.nlist, args.queries_file)
+
+    backends = ["exact"] + ([] if args.skip_chroma else ["chroma"])
+    backends += [f"{dtype}-ivf{nprobe}" for dtype in ("int8", "float16") for nprobe in args.nprobe]
+
+    results = [measure(name, args.bench_dir, args.database, K) for name in backends]
+    truth = results[0]["hits"]
+    print(f"{'backend':<16}{'recall@' + str(K):>10}{'p50 ms':>10}{'p99 ms':>10}{'load s':>10}{'RSS MiB':>10}")
+    for result in results:
+        result["recall"] = recall_at_k(result.pop("hits"), truth, K)
+        print(f"{result['backend']:<16}{result['recall']:>10.3f}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+              f"{result['load_seconds']:>10.2f}{result['rss_over_baseline_mib']:>10.1f}")
+
+    with open(os.path.join(args.bench_dir, "results.json"), "w", encoding="utf-8") as f:
+        json.dump({"k": K, "database": args.database, "results": results}, f, indent=2)
+    print(f"Results written to {os.path.join(args.bench_dir, 'results.json')}")
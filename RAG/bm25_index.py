@@ -0,0 +1,118 @@
+import math
+import pickle
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from config import DEFAULT_DATABASE
+
+# load_messages.py saves the index next to the vector store as <database_loc>_bm25.pkl
+DEFAULT_INDEX_PATH = f"{DEFAULT_DATABASE}_bm25.pkl"
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+# In-memory inverted index with Okapi BM25 scoring over the RAG chunks.
+#
+# Built alongside the vector store in load_messages.py. Besides postings it keeps
+# the chunk metadata needed for pre-filtering (channel, authors, time span) as
+# arrays, so author/channel/time filters become a boolean mask over chunks that
+# is applied before any scoring. Chunk texts are not stored; hits are resolved
+# through the vector store by id.
+class BM25Index:
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids = []
+        self.lengths = []
+        self.channels = []
+        self.authors = []
+        self.start_times = []
+        self.end_times = []
+        self._postings = defaultdict(list)
+        self._frozen = False
+
+    def __len__(self):
+        return len(self.ids)
+
+    # authors is the chunk's list of author names; the joined "authors" metadata
+    # string is only split when it is not given, which breaks names containing ", "
+    def add(self, doc_id, text, metadata, authors=None):
+        row = len(self.ids)
+        tokens = tokenize(text)
+        for term, tf in Counter(tokens).items():
+            self._postings[term].append((row, tf))
+        self.ids.append(doc_id)
+        self.lengths.append(len(tokens))
+        self.channels.append(metadata.get("channel", ""))
+        if authors is None:
+            authors = metadata.get("authors", "").split(", ")
+        self.authors.append(frozenset(a.strip().lower() for a in authors if a.strip()))
+        self.start_times.append(metadata.get("start_time", 0))
+        self.end_times.append(metadata.get("end_time", 0))
+
+    # Convert postings and metadata to arrays once all chunks are added
+    def freeze(self):
+        if self._frozen:
+            return self
+        self.postings = {term: (np.array([row for row, _ in rows], dtype=np.int32),
+                                np.array([tf for _, tf in rows], dtype=np.float32))
+                         for term, rows in self._postings.items()}
+        del self._postings
+        self.lengths = np.asarray(self.lengths, dtype=np.float32)
+        self.start_times = np.asarray(self.start_times, dtype=np.int64)
+        self.end_times = np.asarray(self.end_times, dtype=np.int64)
+        self.channel_array = np.asarray(self.channels, dtype=object)
+        self.avg_length = float(self.lengths.mean()) if len(self.ids) else 0.0
+        self._frozen = True
+        return self
+
+    def save(self, path=DEFAULT_INDEX_PATH):
+        self.freeze()
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path=DEFAULT_INDEX_PATH):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    # Boolean mask of chunks matching the filters (None when nothing is filtered).
+    # Time bounds are epoch seconds; a chunk matches if its span overlaps them.
+    def filter_mask(self, author=None, channel=None, start_time=None, end_time=None):
+        if author is None and channel is None and start_time is None and end_time is None:
+            return None
+        mask = np.ones(len(self.ids), dtype=bool)
+        if channel is not None:
+            mask &= self.channel_array == channel
+        if author is not None:
+            author = author.lower()
+            mask &= np.fromiter((author in authors for authors in self.authors), dtype=bool, count=len(self.ids))
+        if start_time is not None:
+            mask &= self.end_times >= start_time
+        if end_time is not None:
+            mask &= self.start_times <= end_time
+        return mask
+
+    # Top-k (chunk id, BM25 score) pairs, restricted to mask when given
+    def search(self, query, k=8, mask=None):
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        n = len(self.ids)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            rows, tf = self.postings[term]
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[rows] / self.avg_length)
+            scores[rows] += idf * tf * (self.k1 + 1) / (tf + norm)
+        if mask is not None:
+            scores[~mask] = 0
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(self.ids[i], float(scores[i])) for i in hits]
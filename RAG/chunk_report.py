@@ -0,0 +1,96 @@
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+from chunking import (MAX_CHUNK_TOKENS, OVERLAP_TOKENS, TIME_THRESHOLD_SECONDS, SessionChunker, format_line,
+                      group_by_time, load_token_counter, merge_messages)
+from embedding_cache import DEFAULT_MODEL
+
+
+# Token-count distribution of a set of chunk texts
+def summarize(token_counts, max_tokens):
+    counts = np.asarray(token_counts)
+    if not len(counts):
+        return {"chunks": 0}
+    return {
+        "chunks": int(len(counts)),
+        "mean_tokens": float(counts.mean()),
+        "p50_tokens": float(np.percentile(counts, 50)),
+        "p90_tokens": float(np.percentile(counts, 90)),
+        "p99_tokens": float(np.percentile(counts, 99)),
+        "max_tokens": int(counts.max()),
+        "over_limit": int((counts > max_tokens).sum()),
+        "total_tokens": int(counts.sum()),
+        # Tokens beyond the model's sequence length are truncated away: computed for nothing and never retrievable
+        "truncated_tokens": int(np.clip(counts - max_tokens, 0, None).sum()),
+    }
+
+
+# Embed up to sample_size chunks (uncached) and extrapolate to the full set
+def time_embedding(texts, model, sample_size, batch_size):
+    rng = np.random.default_rng(0)
+    sample = [texts[i] for i in rng.choice(len(texts), min(sample_size, len(texts)), replace=False)]
+    start = time.perf_counter()
+    model.encode(sample, batch_size=batch_size)
+    seconds = time.perf_counter() - start
+    return {"sample": len(sample), "sample_seconds": seconds,
+            "estimated_total_seconds": seconds * len(texts) / max(len(sample), 1)}
+
+
+# Compares the original global time-gap grouping with the per-channel,
+# token-bounded sessionization on the same exports.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare chunk-size distributions of the old and new chunkers.")
+    parser.add_argument("input_dir", nargs="?",
+                        default="/Users/nikhil/PycharmProjects/vesuvius_discord_study/JSON_filter/filtered")
+    parser.add_argument("--max-tokens", type=int, default=MAX_CHUNK_TOKENS)
+    parser.add_argument("--overlap-tokens", type=int, default=OVERLAP_TOKENS)
+    parser.add_argument("--gap-seconds", type=int, default=TIME_THRESHOLD_SECONDS)
+    parser.add_argument("--embed-sample", type=int, default=0, help="also time embedding N random chunks of each")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--output", default="chunk_report.json")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.input_dir, "*.json")))
+    count_tokens = load_token_counter(DEFAULT_MODEL)
+
+    start = time.perf_counter()
+    before_texts = ["\n".join(format_line(msg) for msg in group)
+                    for group in group_by_time(merge_messages(paths), args.gap_seconds)]
+    before_tokens = [count_tokens(text) for text in before_texts]
+    before_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chunker = SessionChunker(count_tokens, args.max_tokens, args.overlap_tokens, args.gap_seconds)
+    after_texts, after_tokens = [], []
+    for chunk in chunker.chunks(merge_messages(paths)):
+        after_texts.append(chunk.content)
+        after_tokens.append(count_tokens(chunk.content))
+    after_seconds = time.perf_counter() - start
+
+    report = {
+        "settings": {"max_tokens": args.max_tokens, "overlap_tokens": args.overlap_tokens,
+                     "gap_seconds": args.gap_seconds, "files": len(paths)},
+        "before": {**summarize(before_tokens, args.max_tokens), "chunking_seconds": before_seconds},
+        "after": {**summarize(after_tokens, args.max_tokens), "chunking_seconds": after_seconds},
+    }
+    if args.embed_sample:
+        from sentence_transformers import SentenceTransformer
+
+        model = SentenceTransformer(DEFAULT_MODEL)
+        report["before"]["embed"] = time_embedding(before_texts, model, args.embed_sample, args.batch_size)
+        report["after"]["embed"] = time_embedding(after_texts, model, args.embed_sample, args.batch_size)
+
+    for name in ("before", "after"):
+        stats = report[name]
+        print(f"{name:>6}: {stats['chunks']} chunks, mean {stats.get('mean_tokens', 0):.0f} / "
+              f"p90 {stats.get('p90_tokens', 0):.0f} / max {stats.get('max_tokens', 0)} tokens, "
+              f"{stats.get('over_limit', 0)} over the limit, {stats.get('truncated_tokens', 0)} tokens truncated"
+              + (f", est. embed {stats['embed']['estimated_total_seconds']:.0f}s" if "embed" in stats else ""))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"Report saved to {args.output}")
@@ -0,0 +1,206 @@
+import hashlib
+import heapq
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "JSON_filter"))
+from export_reader import ExportReader, parse_timestamp
+
+# Set the grouping threshold in seconds (here, approx. 16.6 minutes = 1000 seconds)
+TIME_THRESHOLD_SECONDS = 1000
+# all-mpnet-base-v2 embeds at most 384 tokens including [CLS]/[SEP]; longer chunks get truncated
+MAX_CHUNK_TOKENS = 382
+# Trailing context repeated at the start of the next chunk when a session is split for size
+OVERLAP_TOKENS = 64
+
+# Many exports are open at once during the merge, so each reads in small chunks
+MERGE_CHUNK_SIZE = 1 << 16
+
+
+# ----------------------------
+# Merge per-channel message streams
+# ----------------------------
+# Messages of one channel export with parsed UTC timestamps, in file (= time) order
+def iter_channel(path):
+    with ExportReader(path, MERGE_CHUNK_SIZE) as reader:
+        channel = reader.header.get("channel") or {}
+        channel_name = channel.get("name", "Unknown") if isinstance(channel, dict) else channel
+        for msg in reader.messages():
+            msg_time = parse_timestamp(msg.get("timestamp"))
+            if msg_time is None:
+                # Skip messages with unparseable timestamps.
+                continue
+            yield msg_time, channel_name, msg
+
+
+# Lazily merge the already time-ordered channel exports into one stream of
+# (timestamp, channel, message). A message present in overlapping exports has
+# the same id and timestamp, so duplicates can only occur among equal
+# timestamps and the id set is reset whenever the timestamp advances.
+def merge_messages(paths):
+    streams = [iter_channel(path) for path in paths]
+    current_time, seen_ids = None, set()
+    for msg_time, channel, msg in heapq.merge(*streams, key=lambda item: item[0]):
+        if msg_time != current_time:
+            current_time = msg_time
+            seen_ids.clear()
+        msg_id = msg.get("id")
+        if msg_id is not None:
+            if msg_id in seen_ids:
+                continue
+            seen_ids.add(msg_id)
+        yield msg_time, channel, msg
+
+
+# ----------------------------
+# Chunk text
+# ----------------------------
+def author_display(msg):
+    author_info = msg.get("author", {})
+    # Use 'nickname' if available; otherwise, 'name'. Defaults to "Unknown".
+    return author_info.get("nickname") or author_info.get("name", "Unknown")
+
+
+# Construct a line with timestamp, author, and content.
+def format_line(msg):
+    return f'{msg["timestamp"]} - {author_display(msg)}: {msg.get("content", "")}'
+
+
+# Deterministic chunk id from the first/last Discord message ids and a hash of
+# the chunk text, so an unchanged conversation gets the same id on every run.
+def chunk_id(messages, content):
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+    return f'{messages[0].get("id", "")}-{messages[-1].get("id", "")}-{digest}'
+
+
+# Token counter for the embedding model's tokenizer (special tokens excluded)
+def load_token_counter(model_name):
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    return lambda text: len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+class Chunk:
+    def __init__(self, channel):
+        self.channel = channel
+        self.messages = []
+        self.times = []
+        self.lines = []
+        self.line_tokens = []
+        self.tokens = 0
+
+    def add(self, msg_time, msg, line, tokens):
+        self.messages.append(msg)
+        self.times.append(msg_time)
+        self.lines.append(line)
+        self.line_tokens.append(tokens)
+        # +1 for the newline joining this line to the previous one
+        self.tokens += tokens + (1 if len(self.lines) > 1 else 0)
+
+    @property
+    def content(self):
+        return "\n".join(self.lines)
+
+    @property
+    def id(self):
+        return chunk_id(self.messages, self.content)
+
+    # Display names of everyone with a message in the chunk, sorted
+    @property
+    def authors(self):
+        return sorted({author_display(msg) for msg in self.messages})
+
+    # Vector-store metadata: scalars only, since lists are dropped by filter_complex_metadata
+    def metadata(self):
+        return {
+            "channel": self.channel,
+            "authors": ", ".join(self.authors),
+            "start_timestamp": self.messages[0]["timestamp"],
+            "end_timestamp": self.messages[-1]["timestamp"],
+            "start_time": int(self.times[0].timestamp()),
+            "end_time": int(self.times[-1].timestamp()),
+            "first_message_id": self.messages[0].get("id", ""),
+            "last_message_id": self.messages[-1].get("id", ""),
+            "message_count": len(self.messages),
+            "token_count": self.tokens,
+        }
+
+
+# Single streaming pass that sessionizes the merged stream per channel.
+#
+# Each channel has one open chunk. A chunk is closed when its channel is quiet
+# for more than gap_seconds, or when the next message would push it past
+# max_tokens; in the latter case the new chunk starts with the trailing
+# messages of the old one, up to overlap_tokens. A single message longer than
+# max_tokens becomes a chunk of its own. Chunks of channels that went quiet are
+# swept out as the stream advances, so memory is bounded by one chunk per channel.
+class SessionChunker:
+    def __init__(self, count_tokens, max_tokens=MAX_CHUNK_TOKENS, overlap_tokens=OVERLAP_TOKENS,
+                 gap_seconds=TIME_THRESHOLD_SECONDS):
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.gap_seconds = gap_seconds
+        self._open = {}
+        self._last_sweep = None
+
+    def chunks(self, stream):
+        for msg_time, channel, msg in stream:
+            yield from self._sweep(msg_time)
+            line = format_line(msg)
+            tokens = self.count_tokens(line)
+            chunk = self._open.get(channel)
+
+            if chunk is not None and (msg_time - chunk.times[-1]).total_seconds() > self.gap_seconds:
+                yield chunk
+                chunk = None
+            if chunk is not None and chunk.tokens + 1 + tokens > self.max_tokens:
+                yield chunk
+                chunk = self._overlap(chunk, tokens)
+            if chunk is None:
+                chunk = Chunk(channel)
+            chunk.add(msg_time, msg, line, tokens)
+            self._open[channel] = chunk
+
+        # Close what is left in time order
+        yield from sorted(self._open.values(), key=lambda c: c.times[0])
+        self._open = {}
+
+    # New chunk seeded with the trailing messages of a full one
+    def _overlap(self, chunk, next_tokens):
+        budget = min(self.overlap_tokens, self.max_tokens - next_tokens - 1)
+        keep, used = 0, 0
+        for tokens in reversed(chunk.line_tokens):
+            if used + tokens + 1 > budget:
+                break
+            used += tokens + 1
+            keep += 1
+        seeded = Chunk(chunk.channel)
+        start = len(chunk.messages) - keep
+        for i in range(start, len(chunk.messages)):
+            seeded.add(chunk.times[i], chunk.messages[i], chunk.lines[i], chunk.line_tokens[i])
+        return seeded
+
+    def _sweep(self, now):
+        if self._last_sweep is not None and (now - self._last_sweep).total_seconds() <= self.gap_seconds:
+            return
+        self._last_sweep = now
+        quiet = [channel for channel, chunk in self._open.items()
+                 if (now - chunk.times[-1]).total_seconds() > self.gap_seconds]
+        for channel in sorted(quiet, key=lambda c: self._open[c].times[0]):
+            yield self._open.pop(channel)
+
+
+# The original grouping: one global stream split only on time gaps, across all channels
+def group_by_time(stream, gap_seconds=TIME_THRESHOLD_SECONDS):
+    current_group = []
+    prev_time = None
+    for msg_time, _, msg in stream:
+        if prev_time is not None and (msg_time - prev_time).total_seconds() > gap_seconds:
+            yield current_group
+            current_group = []
+        current_group.append(msg)
+        prev_time = msg_time
+    if current_group:
+        yield current_group
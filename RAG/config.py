@@ -0,0 +1,10 @@
+# Defaults shared by the RAG scripts. Kept in a module without imports so any
+# of them (including library modules like bm25_index.py) can read them cheaply.
+
+# Chroma store built by load_messages.py and its quantized copy (quantized_store.py)
+DEFAULT_DATABASE = "./chroma_db_test6"
+DEFAULT_QUANTIZED = "./quantized_db_test6"
+
+# Address of retrieval_server.py
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
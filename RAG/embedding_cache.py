@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import re
+import time
+from functools import lru_cache
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Same default model as langchain_huggingface.HuggingFaceEmbeddings()
+DEFAULT_MODEL = "sentence-transformers/all-mpnet-base-v2"
+CACHE_DIR = "./embedding_cache"
+KEY_SIZE = 32
+
+
+# HuggingFaceEmbeddings replaces newlines with spaces before encoding; doing the
+# same keeps stored vectors identical to its output and to query vectors
+def normalize_text(text):
+    return text.replace("\n", " ")
+
+
+# Cache key of a text, after normalization, so vectors cached before it was
+# applied to multi-line chunks are not reused
+def text_key(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).digest()
+
+
+# HuggingFaceEmbeddings for embedding queries, loaded on first use and shared by
+# everything in the process (rag.py, retrieval_server.py, batch_qa.py)
+@lru_cache(maxsize=None)
+def load_query_embeddings(model_name=DEFAULT_MODEL):
+    from langchain_huggingface.embeddings import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+# Persistent text-hash -> vector cache in front of a sentence-transformers model.
+#
+# Vectors live in one append-only float32 file that is memory-mapped for
+# lookups, with the SHA-256 of each text in a parallel keys file. Only texts
+# never seen before are embedded, so re-chunking or rebuilding a vector store
+# reuses earlier work. Misses are sorted by length and encoded in explicit
+# batches to cut padding, optionally on several CPU worker processes.
+#
+# Implements the LangChain Embeddings interface, so it can be passed to Chroma
+# wherever HuggingFaceEmbeddings() was used. Texts get the same newline
+# normalization, so vectors are identical to those of HuggingFaceEmbeddings
+# with the same model.
+class CachedEmbeddings(Embeddings):
+    def __init__(self, model_name=DEFAULT_MODEL, cache_dir=CACHE_DIR, batch_size=64, workers=1,
+                 flush_every=16):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.workers = workers
+        # Misses are encoded and appended to disk in groups of batch_size * flush_every texts
+        self.flush_every = flush_every
+        self.path = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        self.hits = 0
+        self.misses = 0
+        self.embed_seconds = 0.0
+        self._model = None
+        self._pool = None
+        self._index = {}
+        self._vectors = None
+        self.dim = None
+        self._open()
+
+    # ----------------------------
+    # Cache storage
+    # ----------------------------
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _open(self):
+        os.makedirs(self.path, exist_ok=True)
+        if os.path.exists(self._file("meta.json")):
+            with open(self._file("meta.json"), encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+        if self.dim is None:
+            return
+        with open(self._file("keys.bin"), "rb") as f:
+            keys = f.read()
+        # A run interrupted between the two appends leaves a partial row; ignore it
+        count = min(len(keys) // KEY_SIZE, os.path.getsize(self._file("vectors.f32")) // (4 * self.dim))
+        self._index = {keys[i * KEY_SIZE:(i + 1) * KEY_SIZE]: i for i in range(count)}
+        self._map(count)
+
+    def _map(self, count):
+        self._vectors = None
+        if count:
+            self._vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(count, self.dim))
+
+    def _append(self, keys, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(self._file("meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"model_name": self.model_name, "dim": self.dim}, f)
+            open(self._file("keys.bin"), "wb").close()
+            open(self._file("vectors.f32"), "wb").close()
+        # Vectors first: a key is only trusted once its row exists. Rows are
+        # appended right after the last trusted one, dropping any partial tail.
+        count = len(self._index)
+        with open(self._file("vectors.f32"), "r+b") as f:
+            f.truncate(count * 4 * self.dim)
+            f.seek(0, os.SEEK_END)
+            f.write(vectors.tobytes())
+        with open(self._file("keys.bin"), "r+b") as f:
+            f.truncate(count * KEY_SIZE)
+            f.seek(0, os.SEEK_END)
+            f.write(b"".join(keys))
+        for row, key in enumerate(keys, start=count):
+            self._index[key] = row
+        self._map(count + len(keys))
+
+    def __len__(self):
+        return len(self._index)
+
+    # ----------------------------
+    # Model
+    # ----------------------------
+    def _encode(self, texts):
+        texts = [normalize_text(text) for text in texts]
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name)
+        start = time.perf_counter()
+        if self.workers > 1:
+            if self._pool is None:
+                self._pool = self._model.start_multi_process_pool(["cpu"] * self.workers)
+            vectors = self._model.encode_multi_process(texts, self._pool, batch_size=self.batch_size)
+        else:
+            vectors = self._model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+        self.embed_seconds += time.perf_counter() - start
+        return vectors
+
+    def close(self):
+        if self._pool is not None:
+            self._model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    # ----------------------------
+    # Embeddings interface
+    # ----------------------------
+    def embed_documents(self, texts):
+        keys = [text_key(text) for text in texts]
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self._index and key not in missing:
+                missing[key] = text
+        self.misses += len(missing)
+        self.hits += len(texts) - len(missing)
+
+        # Longest first, so each batch holds texts of similar length
+        pending = sorted(missing.items(), key=lambda item: len(item[1]), reverse=True)
+        group_size = self.batch_size * self.flush_every
+        for start in range(0, len(pending), group_size):
+            group = pending[start:start + group_size]
+            vectors = self._encode([text for _, text in group])
+            self._append([key for key, _ in group], vectors)
+
+        if not texts:
+            return []
+        rows = [self._index[key] for key in keys]
+        return self._vectors[rows].tolist()
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
+
+    def stats(self):
+        return (f"{self.hits} cached, {self.misses} embedded in {self.embed_seconds:.1f}s "
+                f"({len(self)} vectors in {self.path})")
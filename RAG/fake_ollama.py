@@ -0,0 +1,98 @@
+import argparse
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 11435
+WORDS = ("the scroll segment ink papyrus layer scan fragment model volume surface letters "
+         "detection team prize result sheet fibers").split()
+
+
+# Deterministic answer for a prompt: the same prompt always streams the same tokens
+def fake_tokens(prompt, num_tokens):
+    seed = hashlib.sha256(prompt.encode("utf-8")).digest()
+    return [("" if i == 0 else " ") + WORDS[seed[i % len(seed)] % len(WORDS)] for i in range(num_tokens)]
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+# Local stand-in for Ollama's /api/generate, for testing batch_qa.py without a
+# model. Streams NDJSON chunks like Ollama does, after first_token_delay
+# seconds and then one token every token_delay seconds.
+def make_handler(first_token_delay, token_delay, num_tokens):
+    class FakeOllamaHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path in ("/", "/api/version"):
+                self._send_json(200, {"version": "0.0.0-fake"})
+            elif self.path == "/api/tags":
+                self._send_json(200, {"models": []})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/api/generate":
+                self._send_json(404, {"error": "not found"})
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            model = request.get("model", "fake")
+            started = time.perf_counter()
+            tokens = fake_tokens(request.get("prompt", ""), num_tokens)
+
+            if not request.get("stream", True):
+                time.sleep(first_token_delay + token_delay * (len(tokens) - 1))
+                self._send_json(200, {"model": model, "created_at": now(), "response": "".join(tokens),
+                                      "done": True, "done_reason": "stop", "eval_count": len(tokens)})
+                return
+
+            # No Content-Length: the stream ends when the connection closes
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            time.sleep(first_token_delay)
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(token_delay)
+                self.wfile.write(json.dumps({"model": model, "created_at": now(), "response": token,
+                                             "done": False}).encode("utf-8") + b"\n")
+                self.wfile.flush()
+            self.wfile.write(json.dumps({
+                "model": model, "created_at": now(), "response": "", "done": True, "done_reason": "stop",
+                "total_duration": int((time.perf_counter() - started) * 1e9), "eval_count": len(tokens),
+            }).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeOllamaHandler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama server that streams deterministic answers.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--first-token-delay", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between tokens")
+    parser.add_argument("--tokens", type=int, default=40, help="tokens per answer")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port),
+                                 make_handler(args.first_token_delay, args.token_delay, args.tokens))
+    print(f"Fake Ollama listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
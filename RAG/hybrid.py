@@ -0,0 +1,120 @@
+import os
+import sys
+
+import numpy as np
+from langchain_core.documents import Document
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "JSON_filter"))
+from export_reader import parse_timestamp
+
+# Constant of reciprocal rank fusion; larger values flatten the rank weighting
+RRF_K = 60
+# Results taken from each retriever before fusion, per requested result
+CANDIDATES_PER_RESULT = 4
+# Author matches up to this many chunks are passed to Chroma as an id list;
+# beyond it the dense search fetches POST_FILTER_OVERFETCH times as many results
+# and drops those outside the author filter
+MAX_FILTER_IDS = 1000
+POST_FILTER_OVERFETCH = 8
+
+
+# Epoch seconds from an ISO timestamp/date string or a number. A bare date is
+# its midnight, or with end=True its last second, so an end date includes that day.
+def to_epoch_seconds(value, end=False):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    date_only = "T" not in value
+    parsed = parse_timestamp(value + "T00:00:00" if date_only else value)
+    if parsed is None:
+        raise ValueError(f"Unparseable time filter: {value!r}")
+    seconds = int(parsed.timestamp())
+    return seconds + 86400 - 1 if date_only and end else seconds
+
+
+# Chroma "where" filter for the dense search matching BM25Index.filter_mask, so
+# both retrievers search the same chunks. Channel and time are native metadata
+# clauses. The author (matched against the index's author lists, which the
+# chunk text cannot express exactly) becomes a chunk_id list when mask selects
+# few chunks; otherwise the ids in mask are returned as a set to post-filter
+# dense results with. Returns (where or None, post-filter id set or None).
+def chroma_filter(bm25_index, mask, author=None, channel=None, start_time=None, end_time=None):
+    clauses, allowed = [], None
+    if channel is not None:
+        clauses.append({"channel": channel})
+    if start_time is not None:
+        clauses.append({"end_time": {"$gte": start_time}})
+    if end_time is not None:
+        clauses.append({"start_time": {"$lte": end_time}})
+    if author is not None:
+        ids = [bm25_index.ids[i] for i in np.flatnonzero(mask)]
+        if len(ids) <= MAX_FILTER_IDS:
+            clauses.append({"chunk_id": {"$in": ids}})
+        else:
+            allowed = set(ids)
+    if not clauses:
+        return None, allowed
+    return (clauses[0] if len(clauses) == 1 else {"$and": clauses}), allowed
+
+
+# BM25 + dense retrieval fused with reciprocal rank fusion.
+#
+# Author/channel/time filters are applied before scoring on both sides: as a
+# mask over the BM25 index, and as the equivalent Chroma filter (see
+# chroma_filter), so the dense search ranks the same matching chunks. Returned
+# Documents carry the fused score and each retriever's rank in metadata.
+class HybridRetriever:
+    def __init__(self, vectorstore, bm25_index, rrf_k=RRF_K, candidates_per_result=CANDIDATES_PER_RESULT):
+        self.vectorstore = vectorstore
+        self.bm25_index = bm25_index
+        self.rrf_k = rrf_k
+        self.candidates_per_result = candidates_per_result
+
+    def search(self, query, k=8, author=None, channel=None, start=None, end=None, query_vector=None):
+        start_time, end_time = to_epoch_seconds(start), to_epoch_seconds(end, end=True)
+        candidates = k * self.candidates_per_result
+
+        mask = self.bm25_index.filter_mask(author, channel, start_time, end_time)
+        if mask is not None and not mask.any():
+            return []
+        lexical = self.bm25_index.search(query, candidates, mask)
+
+        where, allowed = chroma_filter(self.bm25_index, mask, author, channel, start_time, end_time)
+        fetch = candidates if allowed is None else candidates * POST_FILTER_OVERFETCH
+        if query_vector is None:
+            dense = self.vectorstore.similarity_search_with_score(query, k=fetch, filter=where)
+        else:
+            dense = self.vectorstore.similarity_search_by_vector_with_relevance_scores(
+                query_vector, k=fetch, filter=where)
+        if allowed is not None:
+            dense = [(doc, distance) for doc, distance in dense
+                     if (getattr(doc, "id", None) or doc.metadata.get("chunk_id")) in allowed][:candidates]
+
+        fused, docs, ranks = {}, {}, {}
+        for rank, (doc, distance) in enumerate(dense, start=1):
+            doc_id = getattr(doc, "id", None) or doc.metadata.get("chunk_id")
+            docs[doc_id] = doc
+            ranks.setdefault(doc_id, {})["dense_rank"] = rank
+            ranks[doc_id]["distance"] = distance
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1 / (self.rrf_k + rank)
+        for rank, (doc_id, score) in enumerate(lexical, start=1):
+            ranks.setdefault(doc_id, {})["bm25_rank"] = rank
+            ranks[doc_id]["bm25_score"] = score
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1 / (self.rrf_k + rank)
+
+        top = sorted(fused, key=fused.get, reverse=True)[:k]
+        # Chunks found only lexically are fetched from the vector store by id
+        missing = [doc_id for doc_id in top if doc_id not in docs]
+        if missing:
+            stored = self.vectorstore.get(ids=missing, include=["documents", "metadatas"])
+            for doc_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+                docs[doc_id] = Document(id=doc_id, page_content=text, metadata=metadata or {})
+
+        results = []
+        for doc_id in top:
+            if doc_id not in docs:
+                continue
+            doc = docs[doc_id]
+            doc.metadata.update(ranks[doc_id])
+            doc.metadata["score"] = fused[doc_id]
+            results.append(doc)
+        return results
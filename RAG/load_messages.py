@@ -1,125 +1,152 @@
-import json
-from datetime import datetime
-from uuid import uuid4
+import argparse
 import collections
-import matplotlib.pyplot as plt
+import glob
+import os
+import time
 
-from langchain.docstore.document import Document
-from langchain_chroma import Chroma
-from langchain_huggingface.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores.utils import filter_complex_metadata
+from bm25_index import BM25Index
+from chunking import MAX_CHUNK_TOKENS, OVERLAP_TOKENS, TIME_THRESHOLD_SECONDS, SessionChunker, load_token_counter, \
+    merge_messages
+from config import DEFAULT_DATABASE
+from embedding_cache import DEFAULT_MODEL, CachedEmbeddings
 
-# ----------------------------
-# Parameters
-# ----------------------------
-# Set the grouping threshold in seconds (here, approx. 16.6 minutes = 1000 seconds)
-TIME_THRESHOLD_SECONDS = 1000
-
-# ----------------------------
-# Load and sort messages
-# ----------------------------
-import glob, os
+# LangChain, Chroma and matplotlib are imported where they are used, so this
+# module can be imported (e.g. by a pipeline worker) without loading them.
 
 # ----------------------------
-# Load all JSONs in a folder and sort messages
-# ----------------------------
-all_messages = []
-for path in glob.glob(os.path.join("/Users/nikhil/PycharmProjects/vesuvius_discord_study/JSON_filter/filtered", "*.json")):
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-        all_messages.extend(data.get("messages", []))
-
-# Now sort them by timestamp as before
-messages = all_messages
-messages.sort(key=lambda x: x["timestamp"])
-
-
-def parse_timestamp(ts_str):
-    # Assumes ISO 8601 format; adjust if necessary.
-    return datetime.fromisoformat(ts_str)
-
-# ----------------------------
-# Group messages by time proximity.
+# Parameters
 # ----------------------------
-groups = []
-current_group = []
-prev_time = None
-
-for msg in messages:
-    try:
-        msg_time = parse_timestamp(msg["timestamp"])
-    except Exception:
-        # Skip messages with unparseable timestamps.
-        continue
-
-    if prev_time is None:
-        current_group.append(msg)
-    else:
-        # If the time difference is within the threshold, group the message together.
-        if (msg_time - prev_time).total_seconds() <= TIME_THRESHOLD_SECONDS:
-            current_group.append(msg)
-        else:
-            groups.append(current_group)
-            current_group = [msg]
-    prev_time = msg_time
+# Chunks are split per channel on gaps longer than TIME_THRESHOLD_SECONDS and
+# capped at MAX_CHUNK_TOKENS embedding-model tokens with OVERLAP_TOKENS of overlap
+# (see chunking.py).
+# Chunks sent to the vector store per add/delete call
+UPSERT_BATCH_SIZE = 1000
+# Texts per embedding forward pass and CPU worker processes for embedding (1 = in-process)
+EMBED_BATCH_SIZE = 64
+EMBED_WORKERS = 1
+
+INPUT_DIR = "/Users/nikhil/PycharmProjects/vesuvius_discord_study/JSON_filter/filtered"
+DATABASE_LOC = DEFAULT_DATABASE
+
+
+# ----------------------------
+# Chunk, create Document objects and upsert in one streaming pass.
+# ----------------------------
+# All filtered JSONs in input_dir are read as one merged stream. Chunk ids are
+# deterministic (first/last message id plus content hash), so chunks already in
+# the store are skipped, only new or changed chunks are embedded (embeddings
+# are cached by chunk-text hash), and chunks that no longer exist are deleted
+# at the end. Every chunk, new or not, goes into the BM25 index, which is
+# rebuilt on each run and saved next to the store.
+#
+# Returns the number of messages in each chunk.
+def ingest(input_dir=INPUT_DIR, database_loc=DATABASE_LOC, embedding_model=None):
+    from langchain.docstore.document import Document
+    from langchain_chroma import Chroma
+    from langchain_community.vectorstores.utils import filter_complex_metadata
+
+    paths = sorted(glob.glob(os.path.join(input_dir, "*.json")))
+    messages = merge_messages(paths)
+
+    owns_model = embedding_model is None
+    if owns_model:
+        embedding_model = CachedEmbeddings(DEFAULT_MODEL, batch_size=EMBED_BATCH_SIZE, workers=EMBED_WORKERS)
+    vector_store = Chroma(embedding_function=embedding_model, persist_directory=database_loc)
+    existing_ids = set(vector_store.get(include=[])["ids"])
+    bm25_index = BM25Index()
+    bm25_index_loc = f"{database_loc}_bm25.pkl"
+
+    chunker = SessionChunker(load_token_counter(DEFAULT_MODEL), MAX_CHUNK_TOKENS, OVERLAP_TOKENS,
+                             TIME_THRESHOLD_SECONDS)
+    current_ids = set()
+    pending_ids, pending_docs = [], []
+    added = 0
+    chunk_sizes = []
+    start = time.perf_counter()
+
+    def flush_pending():
+        nonlocal added
+        if pending_docs:
+            vector_store.add_documents(filter_complex_metadata(pending_docs), ids=pending_ids)
+            added += len(pending_ids)
+            pending_ids.clear()
+            pending_docs.clear()
+
+    for chunk in chunker.chunks(messages):
+        chunk_sizes.append(len(chunk.messages))
+        doc_id = chunk.id
+        if doc_id in current_ids:
+            continue
+        current_ids.add(doc_id)
+        content, metadata = chunk.content, {**chunk.metadata(), "chunk_id": doc_id}
+        bm25_index.add(doc_id, content, metadata, chunk.authors)
+        if doc_id not in existing_ids:
+            pending_ids.append(doc_id)
+            pending_docs.append(Document(page_content=content, metadata=metadata))
+            if len(pending_ids) >= UPSERT_BATCH_SIZE:
+                flush_pending()
+    flush_pending()
+
+    stale_ids = sorted(existing_ids - current_ids)
+    for batch_start in range(0, len(stale_ids), UPSERT_BATCH_SIZE):
+        vector_store.delete(ids=stale_ids[batch_start:batch_start + UPSERT_BATCH_SIZE])
+
+    print(f"Created {len(chunk_sizes)} document chunks from the merged messages in {time.perf_counter() - start:.1f}s.")
+    print(f"Vector store updated: {added} chunks added, {len(stale_ids)} stale chunks deleted, "
+          f"{len(current_ids) - added} unchanged.")
+    print(f"Embeddings: {embedding_model.stats()}")
+    if owns_model:
+        embedding_model.close()
+
+    bm25_index.save(bm25_index_loc)
+    print(f"BM25 index with {len(bm25_index)} chunks saved to {bm25_index_loc}")
+    return chunk_sizes
 
-if current_group:
-    groups.append(current_group)
 
 # ----------------------------
 # Generate a bar graph for the frequency distribution.
 # ----------------------------
-# Compute the number of messages in each chunk.
-chunk_sizes = [len(group) for group in groups]
-# Count the frequency of each chunk size.
-size_counts = collections.Counter(chunk_sizes)
-# Sort the keys for plotting.
-keys = sorted(size_counts.keys())
-values = [size_counts[k] for k in keys]
-
-plt.bar(keys, values)
-plt.xlabel("Number of Messages in Chunk")
-plt.ylabel("Frequency (Number of Chunks)")
-plt.title("Distribution of Messages per Chunk")
-plt.xlim(0, 100)
-plt.ylim(0, 2000)
-plt.show()
+# Shown in a window, or written to output_path without needing a display
+def plot_chunk_sizes(chunk_sizes, output_path=None):
+    import matplotlib
+
+    if output_path:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    # Count the frequency of each chunk size (messages per chunk).
+    size_counts = collections.Counter(chunk_sizes)
+    # Sort the keys for plotting.
+    keys = sorted(size_counts.keys())
+    values = [size_counts[k] for k in keys]
+
+    plt.bar(keys, values)
+    plt.xlabel("Number of Messages in Chunk")
+    plt.ylabel("Frequency (Number of Chunks)")
+    plt.title("Distribution of Messages per Chunk")
+    plt.xlim(0, 100)
+    plt.ylim(0, 2000)
+    if output_path:
+        plt.savefig(output_path)
+        plt.close()
+        print(f"Chunk size histogram saved to {output_path}")
+    else:
+        plt.show()
 
-# ----------------------------
-# Create Document objects with metadata.
-# ----------------------------
-docs = []
-for group in groups:
-    content_lines = []
-    authors = set()
-    for msg in group:
-        author_info = msg.get("author", {})
-        # Use 'nickname' if available; otherwise, 'name'. Defaults to "Unknown".
-        author_display = author_info.get("nickname") or author_info.get("name", "Unknown")
-        authors.add(author_display)
-        # Construct a line with timestamp, author, and content.
-        line = f'{msg["timestamp"]} - {author_display}: {msg.get("content", "")}'
-        content_lines.append(line)
-    group_content = "\n".join(content_lines)
-    # Store the list of authors in metadata.
-    doc = Document(page_content=group_content, metadata={"authors": list(authors)})
-    docs.append(doc)
-
-print(f"Created {len(docs)} document chunks from the grouped messages.")
 
-# ----------------------------
-# Filter out complex metadata.
-# ----------------------------
-filtered_docs = filter_complex_metadata(docs)
+def main():
+    parser = argparse.ArgumentParser(description="Chunk filtered exports and upsert them into the vector store.")
+    parser.add_argument("--input-dir", default=INPUT_DIR)
+    parser.add_argument("--database", default=DATABASE_LOC)
+    parser.add_argument("--no-plot", action="store_true", help="skip the chunk size histogram (for unattended runs)")
+    parser.add_argument("--plot-file", default=None, help="save the histogram to this image instead of showing it")
+    args = parser.parse_args()
 
-# ----------------------------
-# Store documents in the vector store.
-# ----------------------------
-embedding_model = HuggingFaceEmbeddings()
-database_loc = "./chroma_db_test6"
-vector_store = Chroma(embedding_function=embedding_model, persist_directory=database_loc)
+    chunk_sizes = ingest(args.input_dir, args.database)
+    if not args.no_plot:
+        plot_chunk_sizes(chunk_sizes, args.plot_file)
 
-uuids = [str(uuid4()) for _ in range(len(filtered_docs))]
-vector_store.add_documents(filtered_docs, ids=uuids)
 
-print("Documents have been added to the vector store.")
+# Guarded so embedding worker processes (EMBED_WORKERS > 1) can import this module
+if __name__ == "__main__":
+    main()
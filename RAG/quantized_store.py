@@ -0,0 +1,414 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from config import DEFAULT_DATABASE, DEFAULT_QUANTIZED
+
+DEFAULT_DIR = DEFAULT_QUANTIZED
+# "int8" stores one byte per dimension plus a float32 scale per vector; "float16" two bytes
+DEFAULT_DTYPE = "int8"
+# Inverted lists probed per query; more lists raise recall and latency
+DEFAULT_NPROBE = 16
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+# Stores smaller than this are a single list, i.e. exact search over quantized vectors
+MIN_IVF_SIZE = 10000
+EXPORT_BATCH_SIZE = 5000
+VERSION = 1
+
+
+# ----------------------------
+# Quantization and clustering
+# ----------------------------
+# Digest of a store's chunk ids; chunk ids hash the chunk content, so this
+# changes whenever a chunk is added, removed or re-chunked
+def ids_digest(ids):
+    digest = hashlib.sha256()
+    for doc_id in sorted(ids):
+        digest.update(doc_id.encode("utf-8") + b"\n")
+    return digest.hexdigest()
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# Symmetric per-vector int8 quantization: x ~= q * scale
+def quantize_int8(vectors):
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def default_nlist(n):
+    if n < MIN_IVF_SIZE:
+        return 1
+    return int(4 * np.sqrt(n))
+
+
+# Nearest centroid of every vector, in batches to bound the score matrix
+def assign(vectors, centroids, batch_size=65536):
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch_size):
+        labels[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+    return labels
+
+
+# Spherical k-means on a sample of the (unit) vectors
+def train_centroids(vectors, nlist, iterations=KMEANS_ITERATIONS, seed=0):
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * KMEANS_SAMPLE_PER_LIST)
+    sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=nlist)
+        # Empty lists are re-seeded with random sample points
+        empty = counts == 0
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+        centroids = normalize(sums)
+    return centroids
+
+
+# ----------------------------
+# Chroma "where" filters over metadata columns
+# ----------------------------
+_COMPARISONS = {
+    "$eq": np.equal, "$ne": np.not_equal,
+    "$gt": np.greater, "$gte": np.greater_equal,
+    "$lt": np.less, "$lte": np.less_equal,
+}
+
+
+def where_mask(columns, where, size):
+    mask = np.ones(size, dtype=bool)
+    for key, condition in where.items():
+        if key == "$and":
+            for clause in condition:
+                mask &= where_mask(columns, clause, size)
+        elif key == "$or":
+            mask &= np.logical_or.reduce([where_mask(columns, clause, size) for clause in condition])
+        else:
+            if key not in columns:
+                return np.zeros(size, dtype=bool)
+            column = columns[key]
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, value in condition.items():
+                if op == "$in":
+                    mask &= np.isin(column, value)
+                elif op == "$nin":
+                    mask &= ~np.isin(column, value)
+                else:
+                    mask &= compare(column, op, value)
+    return mask
+
+
+# Comparison of a metadata column with a value. Chunks without the key (None
+# in an object column) never match, as in Chroma, and are left out of the
+# comparison since None cannot be ordered against numbers.
+def compare(column, op, value):
+    if column.dtype != object:
+        return _COMPARISONS[op](column, value)
+    present = np.fromiter((item is not None for item in column), dtype=bool, count=len(column))
+    result = np.zeros(len(column), dtype=bool)
+    result[present] = _COMPARISONS[op](column[present], value)
+    return result
+
+
+# In-process vector store: quantized embeddings in a memory-mapped array with
+# an inverted-file (IVF) index.
+#
+# Vectors are unit-normalized and stored int8 (with a per-vector scale) or
+# float16, ordered by their k-means list so that each probed list is one
+# contiguous slice of the memmap. A query scores the centroids, then only the
+# vectors of the nprobe closest lists. Chunk texts are in one byte blob with
+# offsets (as in message_store.py) and read on demand; metadata is kept as
+# columns, so Chroma-style "where" filters are a mask applied before scoring.
+#
+# Implements the LangChain VectorStore interface, plus the Chroma methods used
+# by hybrid.py and retrieval_server.py, so it can replace Chroma there. Scores
+# are cosine distances (lower is closer), which rank like Chroma's L2 on the
+# unit-length all-mpnet-base-v2 embeddings.
+#
+# The store is read-only: the IVF lists are fixed at build time, so there is no
+# add_texts()/add_documents(). New chunks go into Chroma (load_messages.py) and
+# the store is rebuilt with from_chroma() or from_texts().
+class QuantizedVectorStore(VectorStore):
+    def __init__(self, store_dir=DEFAULT_DIR, embedding_function=None, nprobe=DEFAULT_NPROBE):
+        self.store_dir = store_dir
+        self.embedding_function = embedding_function
+        self.nprobe = nprobe
+        with open(self._file("meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.dtype = self.meta["dtype"]
+        count, dim = self.meta["count"], self.meta["dim"]
+        self.vectors = np.load(self._file("vectors.npy"), mmap_mode="r")
+        self.scales = np.load(self._file("scales.npy")) if self.dtype == "int8" else None
+        self.centroids = np.load(self._file("centroids.npy"))
+        self.list_offsets = np.load(self._file("list_offsets.npy"))
+        self.content_offsets = np.load(self._file("content_offsets.npy"))
+        self._content = np.memmap(self._file("content.bin"), dtype=np.uint8, mode="r") \
+            if self.content_offsets[-1] else np.zeros(0, dtype=np.uint8)
+        with open(self._file("ids.json"), encoding="utf-8") as f:
+            self.ids = json.load(f)
+        self._rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        with open(self._file("metadata.json"), encoding="utf-8") as f:
+            columns = json.load(f)
+        self.columns = {key: np.asarray(values) for key, values in columns.items()}
+        if self.vectors.shape != (count, dim):
+            raise ValueError(f"{self._file('vectors.npy')} has shape {self.vectors.shape}, "
+                             f"expected {(count, dim)} from meta.json")
+
+    def _file(self, name):
+        return os.path.join(self.store_dir, name)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    # ----------------------------
+    # Build
+    # ----------------------------
+    # Write a store from ids, texts, metadata dicts and float vectors
+    @staticmethod
+    def build(store_dir, ids, texts, metadatas, vectors, dtype=DEFAULT_DTYPE, nlist=None, model_name=None):
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        vectors = normalize(vectors)
+        n, dim = vectors.shape
+        nlist = min(nlist or default_nlist(n), n) or 1
+        start = time.perf_counter()
+        centroids = train_centroids(vectors, nlist) if nlist > 1 else normalize(vectors.mean(axis=0, keepdims=True))
+        labels = assign(vectors, centroids)
+        order = np.argsort(labels, kind="stable")
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=nlist), out=list_offsets[1:])
+
+        tmp_dir = store_dir.rstrip("/\\") + ".tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        vectors = vectors[order]
+        if dtype == "int8":
+            codes, scales = quantize_int8(vectors)
+            np.save(os.path.join(tmp_dir, "vectors.npy"), codes)
+            np.save(os.path.join(tmp_dir, "scales.npy"), scales)
+        else:
+            np.save(os.path.join(tmp_dir, "vectors.npy"), vectors.astype(np.float16))
+        np.save(os.path.join(tmp_dir, "centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(tmp_dir, "list_offsets.npy"), list_offsets)
+
+        content_offsets = np.zeros(n + 1, dtype=np.int64)
+        with open(os.path.join(tmp_dir, "content.bin"), "wb") as f:
+            for i, row in enumerate(order):
+                encoded = texts[row].encode("utf-8")
+                f.write(encoded)
+                content_offsets[i + 1] = content_offsets[i] + len(encoded)
+        np.save(os.path.join(tmp_dir, "content_offsets.npy"), content_offsets)
+
+        # Metadata as columns; keys missing from a chunk are stored as None
+        keys = sorted({key for metadata in metadatas for key in (metadata or {})})
+        columns = {key: [(metadatas[row] or {}).get(key) for row in order] for key in keys}
+        with open(os.path.join(tmp_dir, "metadata.json"), "w", encoding="utf-8") as f:
+            json.dump(columns, f, ensure_ascii=False)
+        with open(os.path.join(tmp_dir, "ids.json"), "w", encoding="utf-8") as f:
+            json.dump([ids[row] for row in order], f)
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"version": VERSION, "count": n, "dim": dim, "dtype": dtype, "nlist": nlist,
+                       "model_name": model_name, "source_digest": ids_digest(ids),
+                       "build_seconds": time.perf_counter() - start}, f, indent=2)
+
+        if os.path.exists(store_dir):
+            for name in os.listdir(store_dir):
+                os.remove(os.path.join(store_dir, name))
+            os.rmdir(store_dir)
+        os.rename(tmp_dir, store_dir)
+
+    # Export every chunk (with its stored embedding) from a Chroma store
+    @staticmethod
+    def export_chroma(database_loc, batch_size=EXPORT_BATCH_SIZE):
+        from langchain_chroma import Chroma
+
+        chroma = Chroma(persist_directory=database_loc)
+        ids, texts, metadatas, vectors = [], [], [], []
+        offset = 0
+        while True:
+            batch = chroma.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+            if not batch["ids"]:
+                break
+            ids.extend(batch["ids"])
+            texts.extend(batch["documents"])
+            metadatas.extend(batch["metadatas"])
+            vectors.append(np.asarray(batch["embeddings"], dtype=np.float32))
+            offset += len(batch["ids"])
+        return ids, texts, metadatas, np.concatenate(vectors) if vectors else np.zeros((0, 0), np.float32)
+
+    @classmethod
+    def from_chroma(cls, database_loc, store_dir=DEFAULT_DIR, embedding_function=None, dtype=DEFAULT_DTYPE,
+                    nlist=None, nprobe=DEFAULT_NPROBE):
+        cls.build(store_dir, *cls.export_chroma(database_loc), dtype=dtype, nlist=nlist,
+                  model_name=getattr(embedding_function, "model_name", None))
+        return cls(store_dir, embedding_function, nprobe)
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, store_dir=DEFAULT_DIR, dtype=DEFAULT_DTYPE,
+                   nlist=None, nprobe=DEFAULT_NPROBE, **kwargs):
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        vectors = np.asarray(embedding.embed_documents(texts), dtype=np.float32)
+        cls.build(store_dir, ids, texts, metadatas, vectors, dtype=dtype, nlist=nlist,
+                  model_name=getattr(embedding, "model_name", None))
+        return cls(store_dir, embedding, nprobe)
+
+    # ----------------------------
+    # Lookup
+    # ----------------------------
+    def content(self, row):
+        return bytes(self._content[self.content_offsets[row]:self.content_offsets[row + 1]]).decode("utf-8")
+
+    def metadata(self, row):
+        metadata = {}
+        for key, column in self.columns.items():
+            value = column[row]
+            if value is not None:
+                metadata[key] = value.item() if isinstance(value, np.generic) else value
+        return metadata
+
+    def document(self, row):
+        return Document(id=self.ids[row], page_content=self.content(row), metadata=self.metadata(row))
+
+    # Chroma-compatible get() by ids
+    def get(self, ids=None, include=("documents", "metadatas"), **kwargs):
+        rows = range(len(self.ids)) if ids is None else [self._rows[doc_id] for doc_id in ids if doc_id in self._rows]
+        result = {"ids": [self.ids[row] for row in rows]}
+        if "documents" in include:
+            result["documents"] = [self.content(row) for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [self.metadata(row) for row in rows]
+        return result
+
+    def get_by_ids(self, ids):
+        return [self.document(self._rows[doc_id]) for doc_id in ids if doc_id in self._rows]
+
+    # ----------------------------
+    # Search
+    # ----------------------------
+    # Cosine similarity of the query to rows [start, end) of the memmap
+    def _scores(self, query, start, end):
+        block = self.vectors[start:end].astype(np.float32)
+        scores = block @ query
+        if self.scales is not None:
+            scores *= self.scales[start:end]
+        return scores
+
+    # Top-k (row, cosine distance) pairs. A filter mask is applied inside the
+    # probed lists; when they hold fewer than k matching rows, all lists are scanned.
+    def search_rows(self, query_vector, k=4, mask=None, nprobe=None):
+        query = normalize(query_vector)
+        nlist = len(self.centroids)
+        nprobe = min(nprobe or self.nprobe, nlist)
+        lists = np.argsort(-(self.centroids @ query))[:nprobe] if nprobe < nlist else np.arange(nlist)
+        rows, scores = self._probe(query, lists, mask)
+        if len(rows) < k and nprobe < nlist:
+            rows, scores = self._probe(query, np.arange(nlist), mask)
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(rows[i]), float(1 - scores[i])) for i in order]
+
+    def _probe(self, query, lists, mask):
+        # Adjacent lists are contiguous in the memmap, so merge them into runs
+        lists = np.sort(lists)
+        runs = []
+        for start, end in zip(self.list_offsets[lists], self.list_offsets[lists + 1]):
+            if start == end:
+                continue
+            if runs and runs[-1][1] == start:
+                runs[-1][1] = end
+            else:
+                runs.append([start, end])
+        all_rows, all_scores = [], []
+        for start, end in runs:
+            rows = np.arange(start, end)
+            scores = self._scores(query, start, end)
+            if mask is not None:
+                keep = mask[start:end]
+                rows, scores = rows[keep], scores[keep]
+            all_rows.append(rows)
+            all_scores.append(scores)
+        if not all_rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return np.concatenate(all_rows), np.concatenate(all_scores)
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, where_document=None,
+                                               nprobe=None, **kwargs):
+        mask = where_mask(self.columns, filter, len(self.ids)) if filter else None
+        contains = (where_document or {}).get("$contains")
+        if contains is None:
+            hits = self.search_rows(embedding, k, mask, nprobe)
+        else:
+            # Document-text filters need the text, so they are checked on a
+            # widening candidate list until k rows match
+            hits, fetch = [], k
+            while len(hits) < k:
+                candidates = self.search_rows(embedding, fetch, mask, nprobe)
+                hits = [(row, distance) for row, distance in candidates if contains in self.content(row)]
+                if len(candidates) < fetch:
+                    break
+                fetch *= 4
+            hits = hits[:k]
+        return [(self.document(row), distance) for row, distance in hits]
+
+    # Same name and arguments as Chroma, used by retrieval_server.py and hybrid.py
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k=4, filter=None, where_document=None,
+                                                          **kwargs):
+        return self.similarity_search_by_vector_with_score(embedding, k, filter, where_document, **kwargs)
+
+    def similarity_search_with_score(self, query, k=4, filter=None, where_document=None, **kwargs):
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k, filter,
+                                                           where_document, **kwargs)
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, **kwargs)]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    # Cosine distance in [0, 2] to a relevance score in [0, 1]
+    def _select_relevance_score_fn(self):
+        return lambda distance: 1.0 - distance / 2
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a quantized IVF vector store from a Chroma store.")
+    parser.add_argument("database", nargs="?", default=DEFAULT_DATABASE)
+    parser.add_argument("store_dir", nargs="?", default=DEFAULT_DIR)
+    parser.add_argument("--dtype", choices=["int8", "float16"], default=DEFAULT_DTYPE)
+    parser.add_argument("--nlist", type=int, default=None, help="number of IVF lists (default: 4 * sqrt(n))")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    ids, texts, metadatas, vectors = QuantizedVectorStore.export_chroma(args.database)
+    print(f"Exported {len(ids)} chunks from {args.database} in {time.perf_counter() - start:.1f}s")
+    QuantizedVectorStore.build(args.store_dir, ids, texts, metadatas, vectors, dtype=args.dtype, nlist=args.nlist)
+    store = QuantizedVectorStore(args.store_dir)
+    size = sum(os.path.getsize(store._file(name)) for name in os.listdir(args.store_dir))
+    print(f"Wrote {len(store)} {args.dtype} vectors in {store.meta['nlist']} lists to {args.store_dir} "
+          f"({size / 2**20:.1f} MiB, {vectors.nbytes / 2**20:.1f} MiB as float32) "
+          f"in {store.meta['build_seconds']:.1f}s")
@@ -1,30 +1,101 @@
-from langchain_chroma import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter, Language
-from langchain_huggingface.embeddings import HuggingFaceEmbeddings
-from langchain_community.document_loaders import JSONLoader
-from uuid import uuid4
-
-embedding_model = HuggingFaceEmbeddings()
-database_loc = ("./chroma_db_test1")
-
-vectorstore = Chroma(persist_directory=database_loc,
-      embedding_function=embedding_model)
-
+import json
+import os
 from typing import List
 from langchain_core.runnables import chain
 from langchain_core.documents import Document
 
-@chain
-def retriever(query: str) -> List[Document]:
-    docs, scores = zip(*vectorstore.similarity_search_with_score(query, k=8))
-    for doc, score in zip(docs, scores):
-        doc.metadata["score"] = score
+from config import DEFAULT_DATABASE, DEFAULT_QUANTIZED
+from retrieval_client import RetrievalClient
+
+# The store load_messages.py builds and the server serves, so answers come from
+# the same corpus whether or not the server is running
+DATABASE_LOC = DEFAULT_DATABASE
+# Quantized in-process copy of the store (python quantized_store.py), if built
+QUANTIZED_LOC = DEFAULT_QUANTIZED
+K = 8
+
+
+# The quantized copy is used only when it holds the same chunks as the Chroma
+# store (same count and id digest); a store updated by load_messages.py since
+# the copy was built wins. Compares ids rather than file times, since Chroma
+# touches its files whenever the store is opened.
+def quantized_is_current(database_loc=DATABASE_LOC, quantized_loc=QUANTIZED_LOC):
+    meta_path = os.path.join(quantized_loc, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    from langchain_chroma import Chroma
+    from quantized_store import ids_digest
+
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    ids = Chroma(persist_directory=database_loc).get(include=[])["ids"]
+    if meta.get("count") != len(ids) or meta.get("source_digest") != ids_digest(ids):
+        print(f"{quantized_loc} does not match {database_loc}; using Chroma "
+              f"(rebuild with python quantized_store.py {database_loc} {quantized_loc})")
+        return False
+    return True
+
+
+# Vector store for the local fallback: the quantized copy when it is current,
+# else Chroma. The embedding model is shared with everything else in the process.
+def load_vectorstore(database_loc=DATABASE_LOC, quantized_loc=QUANTIZED_LOC):
+    from embedding_cache import load_query_embeddings
+
+    embedding_model = load_query_embeddings()
+    if quantized_is_current(database_loc, quantized_loc):
+        from quantized_store import QuantizedVectorStore
+
+        return QuantizedVectorStore(quantized_loc, embedding_model)
+    from langchain_chroma import Chroma
+
+    return Chroma(persist_directory=database_loc, embedding_function=embedding_model)
+
+
+# Use the warm retrieval server (python retrieval_server.py) when it is running;
+# otherwise load the embedding model and vector store in this process. Nothing
+# is loaded until this is called.
+def make_retriever(client=None, k=K, database_loc=DATABASE_LOC, quantized_loc=QUANTIZED_LOC):
+    client = client or RetrievalClient()
+    if client.available():
+        @chain
+        def retriever(query: str) -> List[Document]:
+            return client.search(query, k=k)
+        return retriever
+
+    vectorstore = load_vectorstore(database_loc, quantized_loc)
+    bm25_index_loc = f"{database_loc}_bm25.pkl"
+
+    if os.path.exists(bm25_index_loc):
+        from bm25_index import BM25Index
+        from hybrid import HybridRetriever
+
+        # BM25 + dense fusion; pass author/channel/start/end to search() to pre-filter
+        hybrid = HybridRetriever(vectorstore, BM25Index.load(bm25_index_loc))
+
+        @chain
+        def retriever(query: str) -> List[Document]:
+            return hybrid.search(query, k=k)
+    else:
+        @chain
+        def retriever(query: str) -> List[Document]:
+            docs, scores = zip(*vectorstore.similarity_search_with_score(query, k=k))
+            for doc, score in zip(docs, scores):
+                doc.metadata["score"] = score
+
+            return docs
+    return retriever
+
 
-    return docs
+def main():
+    client = RetrievalClient()
+    retriever = make_retriever(client)
+    phrase = "How are the scrolls scanned?"
 
-phrase = "How are the scrolls scanned?"
-embedding = HuggingFaceEmbeddings().embed_query(phrase)
+    results = retriever.invoke(phrase)
+    print(results)
+    if client.last_timings:
+        print(f"Retrieval timings (ms): {client.last_timings}")
 
-results = retriever.invoke(phrase)
-print(results)
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import json
+import time
+from urllib import request
+from urllib.error import URLError
+
+from langchain_core.documents import Document
+
+from config import DEFAULT_HOST, DEFAULT_PORT
+
+
+# Thin client for retrieval_server.py. Results come back as LangChain Documents
+# with the distance in metadata["score"], like rag.py's retriever.
+class RetrievalClient:
+    def __init__(self, url=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", timeout=30):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        # Server-side timing breakdown plus round-trip time of the last request
+        self.last_timings = None
+
+    def available(self):
+        try:
+            with request.urlopen(f"{self.url}/health", timeout=1) as response:
+                return response.status == 200
+        except (URLError, OSError):
+            return False
+
+    # Optional keyword filters are forwarded to the server: mode ("hybrid"/"dense"),
+    # author, channel, start, end (ISO dates/timestamps or epoch seconds)
+    def search_batch(self, queries, k=8, filter=None, **filters):
+        payload = {"queries": list(queries), "k": k}
+        if filter:
+            payload["filter"] = filter
+        payload.update({key: value for key, value in filters.items() if value is not None})
+        req = request.Request(f"{self.url}/search", data=json.dumps(payload).encode("utf-8"),
+                              headers={"Content-Type": "application/json"})
+        start = time.perf_counter()
+        with request.urlopen(req, timeout=self.timeout) as response:
+            body = json.loads(response.read())
+        self.last_timings = {**body["timings"], "round_trip_ms": (time.perf_counter() - start) * 1000}
+        return [[Document(page_content=hit["page_content"], metadata={**hit["metadata"], "score": hit["score"]})
+                 for hit in hits] for hits in body["results"]]
+
+    def search(self, query, k=8, filter=None, **filters):
+        return self.search_batch([query], k, filter, **filters)[0]
@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import DEFAULT_DATABASE, DEFAULT_HOST, DEFAULT_PORT
+from embedding_cache import load_query_embeddings
+
+QUERY_CACHE_SIZE = 4096
+
+
+# Embedding model and vector store loaded once and kept warm; query
+# embeddings are memoized in an LRU cache so repeated questions skip the model.
+# When the BM25 index built by load_messages.py exists, searches are hybrid.
+# With quantized_loc, vectors are searched in a QuantizedVectorStore instead of Chroma.
+# Chroma and the model are imported here, so retrieval_client.py can import
+# this module for its defaults without loading either.
+class WarmRetriever:
+    def __init__(self, database_loc=DEFAULT_DATABASE, cache_size=QUERY_CACHE_SIZE, bm25_index_loc=None,
+                 quantized_loc=None):
+        self.embedding_model = load_query_embeddings()
+        if quantized_loc:
+            from quantized_store import QuantizedVectorStore
+
+            self.vectorstore = QuantizedVectorStore(quantized_loc, self.embedding_model)
+        else:
+            from langchain_chroma import Chroma
+
+            self.vectorstore = Chroma(persist_directory=database_loc, embedding_function=self.embedding_model)
+        bm25_index_loc = bm25_index_loc or f"{database_loc}_bm25.pkl"
+        self.hybrid = None
+        if os.path.exists(bm25_index_loc):
+            from bm25_index import BM25Index
+            from hybrid import HybridRetriever
+
+            self.hybrid = HybridRetriever(self.vectorstore, BM25Index.load(bm25_index_loc))
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Embed queries, running the model once for all cache misses
+    def embed(self, queries):
+        with self._lock:
+            vectors = {q: self._cache[q] for q in queries if q in self._cache}
+            for q in vectors:
+                self._cache.move_to_end(q)
+            missing = list(dict.fromkeys(q for q in queries if q not in vectors))
+            if missing:
+                for q, vector in zip(missing, self.embedding_model.embed_documents(missing)):
+                    vectors[q] = vector
+                    self._cache[q] = vector
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return [vectors[q] for q in queries], len(queries) - len(missing)
+
+    # Top-k chunks per query as (Document, score) pairs, plus a timing breakdown.
+    # Hybrid scores are fused ranks (higher is better); dense scores are distances.
+    def search(self, queries, k=8, filter=None, mode=None, author=None, channel=None, start=None, end=None):
+        mode = mode or ("hybrid" if self.hybrid else "dense")
+        if mode == "hybrid" and self.hybrid is None:
+            raise ValueError("hybrid search needs the BM25 index built by load_messages.py")
+        started = time.perf_counter()
+        vectors, cache_hits = self.embed(queries)
+        embedded = time.perf_counter()
+        if mode == "hybrid":
+            results = []
+            for query, vector in zip(queries, vectors):
+                docs = self.hybrid.search(query, k, author=author, channel=channel, start=start, end=end,
+                                          query_vector=vector)
+                results.append([(doc, doc.metadata["score"]) for doc in docs])
+        else:
+            results = [self.vectorstore.similarity_search_by_vector_with_relevance_scores(vector, k=k, filter=filter)
+                       for vector in vectors]
+        done = time.perf_counter()
+        timings = {
+            "embed_ms": (embedded - started) * 1000,
+            "search_ms": (done - embedded) * 1000,
+            "total_ms": (done - started) * 1000,
+            "queries": len(queries),
+            "mode": mode,
+            "cache_hits": cache_hits,
+        }
+        return results, timings
+
+
+def make_handler(retriever):
+    class RetrievalHandler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, {"status": "ok"})
+            else:
+                self._send(404, {"error": "not found"})
+
+        # POST /search {"query": "..."} or {"queries": [...]}, optional "k", "mode" ("hybrid"/"dense"),
+        # "author", "channel", "start", "end" pre-filters, or a raw Chroma "filter" for dense mode
+        def do_POST(self):
+            if self.path != "/search":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                queries = request["queries"] if "queries" in request else [request["query"]]
+                results, timings = retriever.search(queries, k=int(request.get("k", 8)),
+                                                    filter=request.get("filter"), mode=request.get("mode"),
+                                                    author=request.get("author"), channel=request.get("channel"),
+                                                    start=request.get("start"), end=request.get("end"))
+            except (KeyError, ValueError, TypeError) as e:
+                self._send(400, {"error": str(e)})
+                return
+            self._send(200, {
+                "results": [[{"page_content": doc.page_content, "metadata": doc.metadata, "score": score}
+                             for doc, score in hits] for hits in results],
+                "timings": timings,
+            })
+
+        def log_message(self, format, *args):
+            pass
+
+    return RetrievalHandler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve similarity search over the Chroma store with a warm model.")
+    parser.add_argument("--database", default=DEFAULT_DATABASE)
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--cache-size", type=int, default=QUERY_CACHE_SIZE)
+    parser.add_argument("--bm25-index", default=None, help="defaults to <database>_bm25.pkl")
+    parser.add_argument("--quantized-store", default=None,
+                        help="search a store built by quantized_store.py instead of Chroma")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    retriever = WarmRetriever(args.database, args.cache_size, args.bm25_index, args.quantized_store)
+    # Warm up the model so the first request does not pay for lazy initialization
+    retriever.embed(["warm up"])
+    print(f"Loaded embedding model and {args.database} in {time.perf_counter() - start:.1f}s")
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(retriever))
+    print(f"Retrieval server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
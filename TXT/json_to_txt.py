@@ -1,45 +1,258 @@
-import json
-
-#Open input file
-def convert_json_to_txt(input_file, output_file):
-  with open(input_file, 'r') as json_file:
-    data = json.load(json_file)
-
-  with open(output_file, 'w') as txt_file:
-    for message in data.get("messages", []):
-      #get message details
-      timestamp = message.get("timestamp", "No Timestamp")
-      author = message.get("author", {})
-      author_name = author.get("nickname") or f"{author.get('name', 'Unknown Author')}#{author.get('discriminator', '0000')}"
-      content = message.get("content", "[No Content]")
-            
-      #write message details
-      txt_file.write(f"[{timestamp}] {author_name}\n")
-      txt_file.write(f"Content: {content}\n")
-
-      #Stickers
-      stickers = message.get("stickers", [])
-      for sticker in stickers:
-        sticker_name = sticker.get("name", "Unknown Sticker")
-        sticker_format = sticker.get("format", "Unknown Format")
-        txt_file.write(f"Sticker: {sticker_name} (Format: {sticker_format})\n")
-            
-      #Attachments
-      attachments = message.get("attachments", [])
-      for attachment in attachments:
-        txt_file.write(f"Attachment: {attachment.get('url', '[No URL]')}\n")
-            
-      #Reactions
-      reactions = message.get("reactions", [])
-      if reactions:
-        reaction_summary = ', '.join([f"{reaction['emoji']} ({reaction['count']})" for reaction in reactions])
-        txt_file.write(f"Reactions: {reaction_summary}\n")
-            
-      #Add blank line between messages
-      txt_file.write("\n")
+import argparse
+import gzip
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "JSON_filter"))
+from export_reader import ExportReader, timestamp_to_ms
+
+# Transcript bytes buffered before each write; with --gzip every flush is one
+# gzip member, so a reader can start decompressing at any member
+BUFFER_SIZE = 1 << 20
+INDEX_COLUMNS = ["offset", "block", "skip", "timestamp_ms", "message_id"]
+# Shard date formats for --shard
+SHARD_FORMATS = {"day": "%Y-%m-%d", "month": "%Y-%m"}
+
+#Format one message exactly as the original transcript did
+def format_message(message):
+  #get message details
+  timestamp = message.get("timestamp", "No Timestamp")
+  author = message.get("author", {})
+  author_name = author.get("nickname") or f"{author.get('name', 'Unknown Author')}#{author.get('discriminator', '0000')}"
+  content = message.get("content", "[No Content]")
+
+  #write message details
+  lines = [f"[{timestamp}] {author_name}\n", f"Content: {content}\n"]
+
+  #Stickers
+  stickers = message.get("stickers", [])
+  for sticker in stickers:
+    sticker_name = sticker.get("name", "Unknown Sticker")
+    sticker_format = sticker.get("format", "Unknown Format")
+    lines.append(f"Sticker: {sticker_name} (Format: {sticker_format})\n")
+
+  #Attachments
+  attachments = message.get("attachments", [])
+  for attachment in attachments:
+    lines.append(f"Attachment: {attachment.get('url', '[No URL]')}\n")
+
+  #Reactions
+  reactions = message.get("reactions", [])
+  if reactions:
+    reaction_summary = ', '.join([f"{reaction['emoji']} ({reaction['count']})" for reaction in reactions])
+    lines.append(f"Reactions: {reaction_summary}\n")
+
+  #Add blank line between messages
+  lines.append("\n")
+  return "".join(lines)
+
+def index_path(transcript_path):
+  base = transcript_path[:-3] if transcript_path.endswith(".gz") else transcript_path
+  return os.path.splitext(base)[0] + ".idx.tsv"
+
+#Buffered transcript writer that records where every message starts.
+#
+#Index rows are (offset, block, skip, timestamp_ms, message_id): offset is the
+#message's position in the uncompressed transcript; block is the file offset
+#of the gzip member holding it (0 for plain text) and skip how many
+#uncompressed bytes into that member it starts. With offset set, an existing
+#transcript of that uncompressed length is appended to instead of replaced.
+class TranscriptWriter:
+  def __init__(self, path, compress=False, offset=None, buffer_size=BUFFER_SIZE):
+    self.path = path
+    self.compress = compress
+    self.buffer_size = buffer_size
+    append = offset is not None
+    self.file = open(path, "ab" if append else "wb")
+    self.index = open(index_path(path), "a" if append else "w", encoding="utf-8")
+    if not append:
+      self.index.write("\t".join(INDEX_COLUMNS) + "\n")
+    self.offset = offset or 0
+    self.block = self.file.tell() if compress else 0
+    self.skip = 0 if compress else self.offset
+    self.buffer = []
+    self.buffered = 0
+    self.rows = []
+
+  def write(self, text, timestamp_ms, message_id):
+    data = text.encode("utf-8")
+    self.rows.append(f"{self.offset}\t{self.block}\t{self.skip}\t{'' if timestamp_ms is None else timestamp_ms}\t"
+                     f"{message_id or ''}\n")
+    self.buffer.append(data)
+    self.buffered += len(data)
+    self.offset += len(data)
+    self.skip += len(data)
+    if self.buffered >= self.buffer_size:
+      self.flush()
+
+  def flush(self):
+    if self.buffer:
+      data = b"".join(self.buffer)
+      if self.compress:
+        self.file.write(gzip.compress(data, mtime=0))
+        self.block = self.file.tell()
+        self.skip = 0
+      else:
+        self.file.write(data)
+      self.buffer, self.buffered = [], 0
+    if self.rows:
+      self.index.writelines(self.rows)
+      self.rows = []
+
+  def close(self):
+    self.flush()
+    self.file.close()
+    self.index.close()
+
+#Stream one export into a transcript (and its .idx.tsv index)
+def convert_json_to_txt(input_file, output_file, compress=False):
+  writer = TranscriptWriter(output_file, compress)
+  with ExportReader(input_file) as reader:
+    for message in reader.messages():
+      writer.write(format_message(message), timestamp_to_ms(message.get("timestamp")), message.get("id"))
+  writer.close()
 
   print(f"Converted JSON data has been saved to {output_file}")
 
-input_file = "/content/Vesuvius Challenge - Text Channels - papyrology [1108134343295127592]_filtered.json"
-output_file = "/content/Vesuvius Challenge - Text Channels - papyrology [1108134343295127592]_filtered.txt"
-convert_json_to_txt(input_file, output_file)
+#Stream one export into <output_dir>/<export name>.txt, or with shard="day"/"month"
+#into one transcript per UTC day/month in <output_dir>/<export name>/. Runs in a
+#worker process in bulk mode; returns the counts for the summary.
+def convert_file(input_file, output_dir, shard="channel", compress=False):
+  start = time.perf_counter()
+  stem = os.path.basename(input_file)[:-5]
+  extension = ".txt.gz" if compress else ".txt"
+  if shard != "channel":
+    shard_dir = os.path.join(output_dir, stem)
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    os.makedirs(shard_dir)
+
+  #Uncompressed length of every transcript written so far; exports are in time
+  #order, so a date shard is finished once the date moves on, but one that comes
+  #back is appended to
+  ends = {}
+  writer = None
+  messages = 0
+  with ExportReader(input_file) as reader:
+    for message in reader.messages():
+      timestamp = timestamp_to_ms(message.get("timestamp"))
+      if shard == "channel":
+        path = os.path.join(output_dir, stem + extension)
+      else:
+        date = "unknown" if timestamp is None else time.strftime(SHARD_FORMATS[shard], time.gmtime(timestamp // 1000))
+        path = os.path.join(shard_dir, date + extension)
+      if writer is None or writer.path != path:
+        if writer is not None:
+          writer.close()
+          ends[writer.path] = writer.offset
+        writer = TranscriptWriter(path, compress, ends.get(path))
+      writer.write(format_message(message), timestamp, message.get("id"))
+      messages += 1
+  if writer is None and shard == "channel":
+    writer = TranscriptWriter(os.path.join(output_dir, stem + extension), compress)
+  if writer is not None:
+    writer.close()
+    ends[writer.path] = writer.offset
+
+  return {
+    "input": input_file,
+    "outputs": len(ends),
+    "bytes": os.path.getsize(input_file),
+    "messages": messages,
+    "output_bytes": sum(os.path.getsize(path) for path in ends),
+    "seconds": time.perf_counter() - start,
+  }
+
+#Convert every export in input_dir with worker processes, largest first so
+#one big channel does not finish last on its own
+def convert_directory(input_dir, output_dir, workers=os.cpu_count(), shard="channel", compress=False):
+  os.makedirs(output_dir, exist_ok=True)
+  input_files = sorted((os.path.join(input_dir, file_name) for file_name in os.listdir(input_dir)
+                        if file_name.endswith(".json")), key=os.path.getsize, reverse=True)
+  results = []
+  with ProcessPoolExecutor(max_workers=max(1, workers or 1)) as executor:
+    futures = [executor.submit(convert_file, path, output_dir, shard, compress) for path in input_files]
+    for future in as_completed(futures):
+      results.append(future.result())
+  return results
+
+# ----------------------------
+# Reading transcripts through the index
+# ----------------------------
+def load_index(transcript_path):
+  rows = []
+  with open(index_path(transcript_path), encoding="utf-8") as f:
+    next(f)
+    for line in f:
+      offset, block, skip, ms, message_id = line.rstrip("\n").split("\t")
+      rows.append((int(offset), int(block), int(skip), int(ms) if ms else None, message_id))
+  return rows
+
+#Text of index rows first..last (inclusive), read without scanning the transcript
+def read_rows(transcript_path, rows, first, last):
+  length = rows[last + 1][0] - rows[first][0] if last + 1 < len(rows) else -1
+  with open(transcript_path, "rb") as f:
+    if transcript_path.endswith(".gz"):
+      f.seek(rows[first][1])
+      with gzip.GzipFile(fileobj=f) as member:
+        member.read(rows[first][2])
+        data = member.read(length)
+    else:
+      f.seek(rows[first][0])
+      data = f.read(length)
+  return data.decode("utf-8")
+
+#One message by id, or None
+def read_message(transcript_path, message_id, rows=None):
+  rows = rows or load_index(transcript_path)
+  for i, row in enumerate(rows):
+    if row[4] == message_id:
+      return read_rows(transcript_path, rows, i, i)
+  return None
+
+#Messages with start_ms <= timestamp < end_ms (either bound may be None);
+#transcripts are in time order, so the range is one contiguous read
+def read_time_range(transcript_path, start_ms=None, end_ms=None, rows=None):
+  rows = rows or load_index(transcript_path)
+  selected = [i for i, row in enumerate(rows) if row[3] is not None
+              and (start_ms is None or row[3] >= start_ms) and (end_ms is None or row[3] < end_ms)]
+  if not selected:
+    return ""
+  return read_rows(transcript_path, rows, selected[0], selected[-1])
+
+def print_summary(results, wall_seconds, workers):
+  total_mb = sum(r["bytes"] for r in results) / 1e6
+  output_mb = sum(r["output_bytes"] for r in results) / 1e6
+  total_messages = sum(r["messages"] for r in results)
+  wall_seconds = max(wall_seconds, 1e-9)
+  print(f"{len(results)} exports ({total_mb:.2f} MB) -> {sum(r['outputs'] for r in results)} transcripts "
+        f"({output_mb:.2f} MB), {total_messages} messages in {wall_seconds:.2f}s with {workers} worker(s): "
+        f"{total_mb / wall_seconds:.2f} MB/s, {total_messages / wall_seconds:.0f} msgs/s")
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Convert Discord JSON exports to plain-text transcripts.")
+  parser.add_argument("input", nargs="?",
+                      default="/content/Vesuvius Challenge - Text Channels - papyrology [1108134343295127592]_filtered.json",
+                      help="an export, or a directory of exports (converted in parallel)")
+  parser.add_argument("output", nargs="?", default=None,
+                      help="transcript path, or the output directory when input is a directory")
+  parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes for a directory")
+  parser.add_argument("--shard", choices=["channel", "day", "month"], default="channel",
+                      help="one transcript per export (channel), or one per day/month in a folder per export")
+  parser.add_argument("--gzip", action="store_true", help="write gzip-compressed transcripts (.txt.gz)")
+  args = parser.parse_args()
+
+  if os.path.isdir(args.input):
+    output_dir = args.output or args.input
+    start = time.perf_counter()
+    results = convert_directory(args.input, output_dir, args.workers, args.shard, args.gzip)
+    print_summary(results, time.perf_counter() - start, args.workers)
+  elif args.shard != "channel":
+    output_dir = args.output or os.path.dirname(args.input) or "."
+    os.makedirs(output_dir, exist_ok=True)
+    print_summary([convert_file(args.input, output_dir, args.shard, args.gzip)], 0, 1)
+  else:
+    default_output = os.path.splitext(args.input)[0] + (".txt.gz" if args.gzip else ".txt")
+    convert_json_to_txt(args.input, args.output or default_output, args.gzip)
@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+GUILD = {"id": "1079907749569237093", "name": "Vesuvius Challenge", "iconUrl": "guild_icon.png"}
+CATEGORY_ID = "1079907750265499770"
+CHANNEL_NAMES = ["general", "papyrology", "ink-detection", "segmentation", "progress-prizes", "scanning",
+                 "volume-cartographer", "off-topic", "announcements", "machine-learning", "hardware", "introductions"]
+ROLE_NAMES = ["team", "Accepted", "moderator", "contributor", "papyrologist", "prize winner", "segmenter"]
+# Time span of the synthetic history; filter.py keeps 2023-03-15 .. 2023-10-28 of it
+START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+END = datetime(2024, 6, 30, tzinfo=timezone.utc)
+DISCORD_EPOCH_MS = 1420070400000
+
+WORDS = ("the a to and of is in it that for on with this was i you we be can have are not but at so if they "
+         "just do what there an one about my will from all like would think how get more also any when "
+         "scroll scrolls papyrus ink segment segmentation fragment volume scan scans layer layers surface letters "
+         "greek text model training detection crackle fibers sheet mesh render tif prize progress team herculaneum "
+         "vesuvius ct resolution micron voxel label labels dataset submission unwrapping flattening autosegment "
+         "thanks great awesome nice question anyone know please help working looks amazing").split()
+EMOJI = [("\U0001f44d", "thumbsup"), ("❤️", "heart"), ("\U0001f525", "fire"), ("\U0001f389", "tada"),
+         ("\U0001f440", "eyes"), ("\U0001f602", "joy"), ("\U0001f64f", "pray"), ("\U0001f92f", "exploding_head")]
+STICKER_FORMATS = ["Png", "Apng", "Lottie"]
+
+
+def snowflake(ms, worker, increment):
+    return str(((ms - DISCORD_EPOCH_MS) << 22) | ((worker & 0x3FF) << 12) | (increment & 0xFFF))
+
+
+# DiscordChatExporter-style timestamp: millisecond precision with trailing
+# zeros trimmed, so fractions are ragged ("20:50:18.31", "20:50:18.5", "20:50:18")
+def format_timestamp(moment):
+    base = moment.strftime("%Y-%m-%dT%H:%M:%S")
+    fraction = f"{moment.microsecond // 1000:03d}".rstrip("0")
+    return f"{base}.{fraction}+00:00" if fraction else f"{base}+00:00"
+
+
+# The same author pool in every worker: ids, names, nicknames and roles come from the seed
+def make_authors(count, seed):
+    rng = np.random.default_rng(seed)
+    roles = [{"id": snowflake(1600000000000 + i, 0, i), "name": name,
+              "color": None if i % 3 else "#2ECC71", "position": 13 - i} for i, name in enumerate(ROLE_NAMES)]
+    authors = []
+    for i in range(count):
+        name = f"{WORDS[rng.integers(len(WORDS))]}{WORDS[rng.integers(len(WORDS))]}{i}"
+        author_roles = [roles[j] for j in sorted(rng.choice(len(roles), rng.integers(0, 3), replace=False))]
+        authors.append({
+            "id": snowflake(1500000000000 + i * 1000, 1, i),
+            "name": name,
+            "discriminator": "0000",
+            "nickname": name.capitalize() if rng.random() < 0.5 else None,
+            "color": author_roles[0]["color"] if author_roles else None,
+            "isBot": bool(rng.random() < 0.01),
+            "roles": author_roles,
+            "avatarUrl": f"avatars/{i}.png",
+        })
+    return authors
+
+
+# Mention/reaction user objects carry no roles or color
+def user_ref(author):
+    return {key: author[key] for key in ("id", "name", "discriminator", "nickname", "isBot", "avatarUrl")}
+
+
+def make_content(rng):
+    words = [WORDS[i] for i in rng.integers(len(WORDS), size=max(1, int(rng.lognormal(2.3, 0.9))))]
+    if rng.random() < 0.05:
+        words.append(f"https://scrollprize.org/{WORDS[rng.integers(len(WORDS))]}")
+    if rng.random() < 0.03:
+        words.append(EMOJI[rng.integers(len(EMOJI))][0])
+    return " ".join(words).capitalize()
+
+
+# Message times for one channel in milliseconds after START: mostly short gaps
+# inside conversations, some long quiet periods, scaled to span START..END.
+# Some times are rounded to whole seconds or tenths, as Discord's are.
+def message_times(rng, count):
+    if not count:
+        return np.zeros(0, dtype=np.int64)
+    gaps = np.where(rng.random(count) < 0.9, rng.exponential(90, count), rng.exponential(20000, count))
+    times = np.cumsum(gaps)
+    span_ms = (END - START).total_seconds() * 1000
+    ms = (times / times[-1] * span_ms * rng.uniform(0.7, 1.0)).astype(np.int64)
+    rounding = rng.choice([1, 10, 100, 1000], size=count, p=[0.85, 0.08, 0.05, 0.02])
+    return np.sort(ms // rounding * rounding)
+
+
+def make_channel_messages(channel_index, channel_id, count, authors, seed):
+    rng = np.random.default_rng(seed + 1000 + channel_index)
+    weights = 1.0 / np.arange(1, len(authors) + 1) ** 1.1
+    author_index = rng.choice(len(authors), size=count, p=weights / weights.sum())
+    previous_ids = []
+    for i, offset in enumerate(message_times(rng, count)):
+        moment = START + timedelta(milliseconds=int(offset))
+        ms = int(moment.timestamp() * 1000)
+        message_id = snowflake(ms, channel_index + 2, i)
+        author = authors[author_index[i]]
+        kind = rng.random()
+        message_type = "Default"
+        content = make_content(rng)
+        reference = None
+        if previous_ids and kind < 0.18:
+            message_type = "Reply"
+            reference = {"messageId": previous_ids[-1 - int(rng.integers(min(len(previous_ids), 20)))],
+                         "channelId": channel_id, "guildId": GUILD["id"]}
+        elif kind > 0.998:
+            message_type = "ThreadCreated"
+            content = "Started a thread."
+            reference = {"messageId": None, "channelId": snowflake(ms, 900, i), "guildId": GUILD["id"]}
+        elif kind > 0.997:
+            message_type = "ChannelPinnedMessage"
+            content = "Pinned a message."
+
+        attachments = []
+        if rng.random() < 0.09:
+            attachments.append({"id": snowflake(ms, 901, i), "url": f"files/image-{message_id}.png",
+                                "fileName": "image.png", "fileSizeBytes": int(rng.integers(10_000, 5_000_000))})
+            if rng.random() < 0.4:
+                # Attachment-only message
+                content = ""
+        message = {
+            "id": message_id,
+            "type": message_type,
+            "timestamp": format_timestamp(moment),
+            "timestampEdited": format_timestamp(moment + timedelta(seconds=float(rng.exponential(300))))
+            if rng.random() < 0.09 else None,
+            "callEndedTimestamp": None,
+            "isPinned": bool(rng.random() < 0.002),
+            "content": content,
+            "author": author,
+            "attachments": attachments,
+            "embeds": [{"title": "Vesuvius Challenge", "url": "https://scrollprize.org/", "timestamp": None,
+                        "description": make_content(rng), "thumbnail": None, "images": [], "fields": []}]
+            if rng.random() < 0.03 else [],
+            "stickers": [{"id": snowflake(ms, 902, i), "name": WORDS[rng.integers(len(WORDS))],
+                          "format": STICKER_FORMATS[rng.integers(len(STICKER_FORMATS))],
+                          "sourceUrl": f"stickers/{i}.png"}] if rng.random() < 0.005 else [],
+            "reactions": [],
+            "mentions": [authors[j] for j in rng.integers(len(authors), size=rng.integers(1, 3))]
+            if rng.random() < 0.2 else [],
+        }
+        if rng.random() < 0.14:
+            for e in rng.choice(len(EMOJI), size=rng.integers(1, 4), replace=False):
+                users = [user_ref(authors[j]) for j in rng.integers(len(authors), size=rng.integers(1, 9))]
+                message["reactions"].append({
+                    "emoji": {"id": "", "name": EMOJI[e][0], "code": EMOJI[e][1], "isAnimated": False,
+                              "imageUrl": f"emoji/{EMOJI[e][1]}.svg"},
+                    "count": len(users),
+                    "users": users,
+                })
+        if reference is not None:
+            message["reference"] = reference
+        previous_ids.append(message_id)
+        yield message
+
+
+# Write one channel export in the DiscordChatExporter layout (2-space indent),
+# streaming so memory stays flat however many messages the channel has
+def write_channel(output_dir, channel_index, count, num_authors, seed):
+    name = CHANNEL_NAMES[channel_index % len(CHANNEL_NAMES)]
+    if channel_index >= len(CHANNEL_NAMES):
+        name = f"{name}-{channel_index // len(CHANNEL_NAMES)}"
+    channel_id = snowflake(1680000000000 + channel_index * 1000, 3, channel_index)
+    header = {
+        "guild": GUILD,
+        "channel": {"id": channel_id, "type": "GuildTextChat", "categoryId": CATEGORY_ID,
+                    "category": "Text Channels", "name": name, "topic": None},
+        "dateRange": {"after": None, "before": None},
+        "exportedAt": "2025-01-20T22:07:57.3900215+00:00",
+    }
+    path = os.path.join(output_dir, f"Vesuvius Challenge - Text Channels - {name} [{channel_id}].json")
+    authors = make_authors(num_authors, seed)
+    with open(path, "w", encoding="utf-8", buffering=1 << 20) as f:
+        head = json.dumps(header, indent=2, ensure_ascii=False)
+        f.write(head[:-2] + ',\n  "messages": [')
+        for i, message in enumerate(make_channel_messages(channel_index, channel_id, count, authors, seed)):
+            body = json.dumps(message, indent=2, ensure_ascii=False).replace("\n", "\n    ")
+            f.write(("," if i else "") + "\n    " + body)
+        f.write(f'\n  ],\n  "messageCount": {count}\n}}\n')
+    return path
+
+
+# Split total_messages over channels with a skewed (Zipf-like) activity
+def channel_sizes(total_messages, channels):
+    weights = 1.0 / np.arange(1, channels + 1)
+    sizes = np.floor(weights / weights.sum() * total_messages).astype(int)
+    sizes[0] += total_messages - sizes.sum()
+    return sizes.tolist()
+
+
+def generate_exports(output_dir, total_messages, channels=len(CHANNEL_NAMES), authors=2000, seed=0, workers=1):
+    os.makedirs(output_dir, exist_ok=True)
+    sizes = channel_sizes(total_messages, channels)
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(write_channel, output_dir, i, size, authors, seed) for i, size in enumerate(sizes)]
+        return [future.result() for future in futures]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic Discord exports with the real export schema.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--messages", type=int, default=100_000, help="total messages over all channels")
+    parser.add_argument("--channels", type=int, default=len(CHANNEL_NAMES))
+    parser.add_argument("--authors", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    paths = generate_exports(args.output_dir, args.messages, args.channels, args.authors, args.seed, args.workers)
+    size = sum(os.path.getsize(path) for path in paths)
+    print(f"Wrote {args.messages} messages in {len(paths)} channel exports to {args.output_dir} "
+          f"({size / 2**20:.1f} MiB) in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,314 @@
+import argparse
+import contextlib
+import glob
+import hashlib
+import io
+import json
+import multiprocessing
+import queue
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from generate_exports import generate_exports
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SIZES = [10_000, 100_000, 1_000_000]
+STAGES = ["generate", "filter", "json_to_txt", "message_store", "lda_preprocess", "rag_ingest", "llama_load"]
+DATA_DIR = "bench_data"
+RESULTS_DIR = "bench_results"
+# A stage this much slower (or bigger in memory) than in --compare is a regression
+REGRESSION_RATIO = 1.2
+# How often a running stage is checked for having died without a result
+RESULT_POLL_SECONDS = 1.0
+# Stand-in embedding width, the same as all-mpnet-base-v2
+EMBEDDING_DIM = 768
+
+
+def peak_rss_mib(who=resource.RUSAGE_SELF):
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def use_dir(name):
+    path = os.path.join(ROOT, name)
+    if path not in sys.path:
+        sys.path.append(path)
+
+
+def exports(size_dir):
+    return sorted(glob.glob(os.path.join(size_dir, "exports", "*.json")))
+
+
+def filtered(size_dir):
+    return sorted(glob.glob(os.path.join(size_dir, "filtered", "*.json")))
+
+
+# Messages kept by the filter, from the messageCount it writes
+def filtered_count(size_dir):
+    count = 0
+    for path in filtered(size_dir):
+        with open(path, encoding="utf-8") as f:
+            count += json.load(f).get("messageCount", 0)
+    return count
+
+
+# ----------------------------
+# Stages. Each takes the directory for one size and returns the number of
+# items it processed; outputs go next to the inputs so later stages can use them.
+# ----------------------------
+def stage_generate(size_dir, size):
+    shutil.rmtree(os.path.join(size_dir, "exports"), ignore_errors=True)
+    # One worker, so peak memory is that of a single process
+    generate_exports(os.path.join(size_dir, "exports"), size, workers=1)
+    return size
+
+
+def stage_filter(size_dir, size):
+    use_dir("JSON_filter")
+    from filter import process_file
+
+    output_dir = os.path.join(size_dir, "filtered")
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    return sum(process_file(path, output_dir, "")["messages"] for path in exports(size_dir))
+
+
+def stage_json_to_txt(size_dir, size):
+    use_dir("TXT")
+    from json_to_txt import convert_json_to_txt
+
+    output_dir = os.path.join(size_dir, "txt")
+    os.makedirs(output_dir, exist_ok=True)
+    for path in filtered(size_dir):
+        with contextlib.redirect_stdout(io.StringIO()):
+            convert_json_to_txt(path, os.path.join(output_dir, os.path.basename(path)[:-5] + ".txt"))
+    return filtered_count(size_dir)
+
+
+def stage_message_store(size_dir, size):
+    use_dir("JSON_filter")
+    from message_store import MessageStore, build_store
+
+    store_dir = os.path.join(size_dir, "message_store")
+    shutil.rmtree(store_dir, ignore_errors=True)
+    build_store(filtered(size_dir), store_dir)
+    return len(MessageStore(store_dir))
+
+
+# Blank English spaCy pipeline whose lemma is the lowercased word, standing in
+# for en_core_web_sm so the benchmark measures preprocess.py, not the model
+def stand_in_nlp():
+    import spacy
+    from spacy.language import Language
+
+    @Language.component("lowercase_lemma")
+    def lowercase_lemma(doc):
+        for token in doc:
+            token.lemma_ = token.lower_
+        return doc
+
+    nlp = spacy.blank("en")
+    nlp.add_pipe("lowercase_lemma")
+    return nlp
+
+
+def stage_lda_preprocess(size_dir, size):
+    use_dir("LDA")
+    from spacy.lang.en.stop_words import STOP_WORDS
+    from lda import extract_messages
+    from preprocess import preprocess_texts
+
+    nlp = stand_in_nlp()
+    items = 0
+    for path in filtered(size_dir):
+        with contextlib.redirect_stderr(io.StringIO()):
+            texts = [msg["content"] for msg in extract_messages(path)]
+        preprocess_texts(texts, nlp, STOP_WORDS)
+        items += len(texts)
+    return items
+
+
+# Deterministic unit vectors from a hash of each text, standing in for the embedding model
+def stand_in_vectors(texts, dim=EMBEDDING_DIM):
+    vectors = np.empty((len(texts), dim), dtype=np.float32)
+    for i, text in enumerate(texts):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        vectors[i] = np.random.default_rng(seed).standard_normal(dim)
+    return vectors
+
+
+# load_messages.py without Chroma or the embedding model: merge, chunk (with a
+# whitespace token count), BM25 index and a quantized vector store
+def stage_rag_ingest(size_dir, size):
+    use_dir("RAG")
+    from bm25_index import BM25Index
+    from chunking import SessionChunker, merge_messages
+    from quantized_store import QuantizedVectorStore
+
+    chunker = SessionChunker(lambda text: len(text.split()))
+    bm25_index = BM25Index()
+    ids, texts, metadatas, seen = [], [], [], set()
+    for chunk in chunker.chunks(merge_messages(filtered(size_dir))):
+        if chunk.id in seen:
+            continue
+        seen.add(chunk.id)
+        metadata = {**chunk.metadata(), "chunk_id": chunk.id}
+        bm25_index.add(chunk.id, chunk.content, metadata, chunk.authors)
+        ids.append(chunk.id)
+        texts.append(chunk.content)
+        metadatas.append(metadata)
+    bm25_index.save(os.path.join(size_dir, "bm25.pkl"))
+    if ids:
+        QuantizedVectorStore.build(os.path.join(size_dir, "quantized_db"), ids, texts, metadatas,
+                                   stand_in_vectors(texts))
+    return filtered_count(size_dir)
+
+
+# run_llama.py data loading and cached labelling with the stub backend (no
+# Excel output), against a fresh label cache
+def stage_llama_load(size_dir, size):
+    os.environ["LLAMA_BACKEND"] = "stub"
+    use_dir("LLaMA")
+    from run_llama import label_messages, load_documents
+
+    with tempfile.TemporaryDirectory() as work_dir, contextlib.redirect_stderr(io.StringIO()), \
+            contextlib.redirect_stdout(io.StringIO()):
+        df = load_documents(os.path.join(size_dir, "filtered"), os.path.join(work_dir, "no_store"))
+        label_messages(df, os.path.join(work_dir, "labels.sqlite"))
+    return len(df)
+
+
+STAGE_FUNCTIONS = {name: globals()[f"stage_{name}"] for name in STAGES}
+
+
+# ----------------------------
+# Measurement, one spawned process per stage so peak memory is per stage
+# ----------------------------
+def run_stage(name, size_dir, size, results):
+    start = time.perf_counter()
+    result = {"stage": name, "size": size}
+    try:
+        items = STAGE_FUNCTIONS[name](size_dir, size)
+        result["items"] = items
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+    result["peak_rss_mib"] = max(peak_rss_mib(), peak_rss_mib(resource.RUSAGE_CHILDREN))
+    if "items" in result:
+        result["items_per_sec"] = result["items"] / result["seconds"] if result["seconds"] else 0.0
+    results.put(result)
+
+
+# A stage process that dies without reporting (e.g. killed for running out of
+# memory) is recorded as failed with its exit code instead of hanging the run
+def measure(name, size_dir, size):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run_stage, args=(name, size_dir, size, results))
+    start = time.perf_counter()
+    process.start()
+    while True:
+        try:
+            result = results.get(timeout=RESULT_POLL_SECONDS)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                # The result may have been queued just before the process exited
+                try:
+                    result = results.get(timeout=RESULT_POLL_SECONDS)
+                except queue.Empty:
+                    result = {"stage": name, "size": size, "error": f"exit {process.exitcode}",
+                              "seconds": time.perf_counter() - start, "peak_rss_mib": 0.0}
+                break
+    process.join()
+    return result
+
+
+# Every stage after filter reads the filtered exports
+def prerequisites(name):
+    return STAGES[:min(STAGES.index(name), 2)]
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {"commit": commit or None, "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "created": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+
+
+# (size, stage) pairs that got slower or bigger than in a previous results file
+def regressions(results, previous, ratio=REGRESSION_RATIO):
+    before = {(r["size"], r["stage"]): r for r in previous["results"] if "error" not in r}
+    found = []
+    for result in results:
+        old = before.get((result["size"], result["stage"]))
+        if old is None or "error" in result:
+            continue
+        for key in ("seconds", "peak_rss_mib"):
+            if old[key] > 0 and result[key] / old[key] > ratio:
+                found.append({"size": result["size"], "stage": result["stage"], "metric": key,
+                              "before": old[key], "after": result[key], "ratio": result[key] / old[key]})
+    return found
+
+
+def print_results(results):
+    print(f"\n{'size':>10} {'stage':<16}{'items':>10}{'sec':>10}{'items/s':>12}{'RSS MiB':>10}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['size']:>10} {r['stage']:<16}  failed: {r['error']}")
+        else:
+            print(f"{r['size']:>10} {r['stage']:<16}{r['items']:>10}{r['seconds']:>10.2f}"
+                  f"{r['items_per_sec']:>12.0f}{r['peak_rss_mib']:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time every pipeline stage on synthetic exports of several sizes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="total messages per run")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--data-dir", default=DATA_DIR, help="generated exports and stage outputs, one folder per size")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--compare", default=None, help="previous results JSON to check for regressions")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        size_dir = os.path.join(args.data_dir, str(size))
+        os.makedirs(size_dir, exist_ok=True)
+        # Stages left out of --stages still run (untimed) when a chosen stage needs their output
+        needed = {name for stage in args.stages for name in prerequisites(stage)}
+        for name in STAGES:
+            if name in args.stages:
+                result = measure(name, size_dir, size)
+                results.append(result)
+                status = result.get("error") or f"{result['seconds']:.2f}s"
+                print(f"{size:>10} {name:<16}{status}", flush=True)
+            elif name in needed and not (exports(size_dir) if name == "generate" else filtered(size_dir)):
+                measure(name, size_dir, size)
+
+    print_results(results)
+    report = {**environment(), "results": results}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report["regressions"] = regressions(results, json.load(f))
+        for r in report["regressions"]:
+            print(f"REGRESSION {r['size']} {r['stage']} {r['metric']}: {r['before']:.2f} -> {r['after']:.2f} "
+                  f"({r['ratio']:.2f}x)")
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    name = f"results_{report['created'][:19].replace(':', '')}_{(report['commit'] or 'nogit')[:8]}.json"
+    with open(os.path.join(args.results_dir, name), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {os.path.join(args.results_dir, name)}")
+    if report.get("regressions"):
+        sys.exit(1)
@@ -0,0 +1,340 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+INPUT_DIR = "discordout-2025-01"
+CACHE_DIR = "pipeline_cache"
+# Channel export used for the topic model (lda.py models one channel)
+LDA_CHANNEL = "general"
+_MESSAGE_COUNT = re.compile(rb'"messageCount"\s*:\s*(\d+)')
+
+
+# ----------------------------
+# Stages
+# ----------------------------
+# Each stage runs one of the existing scripts as a subprocess. "deps" are the
+# stages whose outputs it reads, "sources" the directories whose .py files go
+# into its cache key, and "params" which run options change its output.
+STAGES = {
+    "filter": {"script": "JSON_filter/filter.py", "deps": [], "sources": ["JSON_filter"], "params": []},
+    "message_store": {"script": "JSON_filter/message_store.py", "deps": ["filter"], "sources": ["JSON_filter"],
+                      "params": []},
+    "txt": {"script": "TXT/json_to_txt.py", "deps": ["filter"], "sources": ["TXT", "JSON_filter"], "params": []},
+    "lda": {"script": "LDA/lda.py", "deps": ["filter", "message_store"], "sources": ["LDA", "JSON_filter"],
+            "params": ["lda_channel"]},
+    "rag": {"script": "RAG/load_messages.py", "deps": ["filter"], "sources": ["RAG", "JSON_filter"], "params": []},
+    "llama": {"script": "LLaMA/run_llama.py", "deps": ["filter", "message_store"],
+              "sources": ["LLaMA", "JSON_filter"], "params": ["llama_backend"]},
+}
+
+
+# Arguments, working directory and extra environment for one stage. out is the
+# stage's (temporary) output directory, inputs the output directories of its deps.
+def stage_command(name, out, inputs, options):
+    filtered = os.path.join(inputs.get("filter", ""), "filtered")
+    if name == "filter":
+        # Exports without messages in range are routed to empty_files/ as they are filtered
+        return ["--input-dir", os.path.abspath(options.input_dir), "--output-dir", os.path.join(out, "filtered"),
+                "--empty-dir", os.path.join(out, "empty_files"), "--workers", str(options.workers)], out, {}
+    if name == "message_store":
+        return [filtered, os.path.join(out, "message_store")], out, {}
+    if name == "txt":
+        return [filtered, out], out, {}
+    if name == "lda":
+        return [lda_input(filtered, options.lda_channel), "--store-dir",
+                os.path.join(inputs["message_store"], "message_store")], out, {}
+    if name == "rag":
+        # Run from the shared directory so the embedding cache is reused across inputs
+        return ["--input-dir", filtered, "--database", os.path.join(out, "chroma_db"), "--no-plot"], \
+            shared_dir(options), {}
+    if name == "llama":
+        return [], out, {"LLAMA_INPUT_DIR": filtered,
+                         "LLAMA_STORE_DIR": os.path.join(inputs["message_store"], "message_store"),
+                         "LLAMA_OUTPUT": os.path.join(out, "LLaMA_emotion_sentiment_ALL.xlsx"),
+                         "LLAMA_CACHE": os.path.join(shared_dir(options), "llama_label_cache.sqlite"),
+                         "LLAMA_BACKEND": options.llama_backend}
+    raise ValueError(f"Unknown stage: {name}")
+
+
+# Messages in the stage's input, for items/sec
+def stage_items(name, inputs, options):
+    if name == "filter":
+        return count_messages(options.input_dir)
+    if name == "lda":
+        return count_messages(lda_input(os.path.join(inputs["filter"], "filtered"), options.lda_channel))
+    return count_messages(os.path.join(inputs["filter"], "filtered"))
+
+
+# The filtered export of the chosen channel, or the largest one
+def lda_input(filtered, channel):
+    paths = sorted(os.path.join(filtered, name) for name in os.listdir(filtered) if name.endswith(".json"))
+    matching = [path for path in paths if f" - {channel} [" in os.path.basename(path)]
+    if matching:
+        return matching[0]
+    if not paths:
+        raise FileNotFoundError(f"No filtered exports in {filtered}")
+    return max(paths, key=os.path.getsize)
+
+
+def shared_dir(options):
+    path = os.path.abspath(os.path.join(options.cache_dir, "shared"))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+# ----------------------------
+# Content-addressed cache keys
+# ----------------------------
+# Exports end with "messageCount", so counting needs only the last few KiB
+def count_messages(path):
+    paths = [path] if os.path.isfile(path) else \
+        [os.path.join(path, name) for name in os.listdir(path) if name.endswith(".json")]
+    total = 0
+    for file_path in paths:
+        with open(file_path, "rb") as f:
+            f.seek(max(0, os.path.getsize(file_path) - 4096))
+            match = _MESSAGE_COUNT.search(f.read())
+        total += int(match.group(1)) if match else 0
+    return total
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Hashes of raw input files, remembered by (size, mtime) so unchanged exports
+# are not read again on every run
+class HashMemo:
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def sha256(self, path):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        entry = self.entries.get(key)
+        if entry is None or entry[:2] != [stat.st_size, stat.st_mtime_ns]:
+            entry = [stat.st_size, stat.st_mtime_ns, file_sha256(path)]
+            self.entries[key] = entry
+        return entry[2]
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+
+
+def directory_digest(directory, memo):
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.endswith(".json") and os.path.isfile(path):
+            digest.update(f"{name}\0{memo.sha256(path)}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def sources_digest(directories):
+    digest = hashlib.sha256()
+    for directory in directories:
+        for name in sorted(os.listdir(os.path.join(ROOT, directory))):
+            if name.endswith(".py"):
+                digest.update(f"{directory}/{name}\0{file_sha256(os.path.join(ROOT, directory, name))}\n".encode())
+    return digest.hexdigest()
+
+
+# Key of a stage run: its code, the options that change its output and the keys
+# of its inputs (or the raw export hashes), so any upstream change invalidates it
+def stage_key(name, input_keys, options, memo):
+    stage = STAGES[name]
+    payload = {
+        "stage": name,
+        "sources": sources_digest(stage["sources"]),
+        "params": {param: getattr(options, param) for param in stage["params"]},
+        "inputs": input_keys if stage["deps"] else directory_digest(options.input_dir, memo),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+# ----------------------------
+# Running stages
+# ----------------------------
+# Run one stage into <cache>/<stage>/<key>.tmp and rename it into place when it
+# succeeds. Peak RSS comes from wait4, so it is the stage's own even when
+# several stages run at once.
+def execute(name, key, inputs, options):
+    out = os.path.abspath(os.path.join(options.cache_dir, name, key))
+    tmp = out + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    args, cwd, env = stage_command(name, tmp, inputs, options)
+    items = stage_items(name, inputs, options)
+    script = os.path.join(ROOT, STAGES[name]["script"])
+    profile = os.path.join(tmp, "profile.prof") if options.profile else None
+    command = [sys.executable] + (["-m", "cProfile", "-o", profile] if profile else []) + [script] + args
+
+    log_path = os.path.join(tmp, "stage.log")
+    start = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        process = subprocess.Popen(command, cwd=cwd, env={**os.environ, "MPLBACKEND": "Agg", **env},
+                                   stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    seconds = time.perf_counter() - start
+
+    metrics = {
+        "stage": name,
+        "key": key,
+        "status": "ran" if process.returncode == 0 else "failed",
+        "returncode": process.returncode,
+        "seconds": seconds,
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mib": usage.ru_maxrss / 1024,
+        "items": items,
+        "items_per_sec": items / seconds if seconds else 0.0,
+        "command": command,
+    }
+    if process.returncode:
+        metrics["log"] = log_path
+        return metrics
+
+    shutil.rmtree(out, ignore_errors=True)
+    os.rename(tmp, out)
+    metrics["output"] = out
+    metrics["log"] = os.path.join(out, "stage.log")
+    if profile:
+        metrics["profile"] = os.path.join(out, "profile.prof")
+    with open(os.path.join(out, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2)
+    with open(os.path.join(options.cache_dir, name, "latest"), "w", encoding="utf-8") as f:
+        f.write(key + "\n")
+    return metrics
+
+
+# The requested stages plus everything they depend on, in dependency order
+def plan(selected):
+    order = []
+
+    def visit(name):
+        for dep in STAGES[name]["deps"]:
+            visit(dep)
+        if name not in order:
+            order.append(name)
+    for name in selected:
+        visit(name)
+    return order
+
+
+# Run the stage graph: a stage starts as soon as its deps are done, up to
+# options.jobs at a time. Stages whose output for the same key is already in
+# the cache are skipped; stages after a failure are not run.
+def run_pipeline(options):
+    order = plan(options.stages)
+    memo = HashMemo(os.path.join(options.cache_dir, "file_hashes.json"))
+    keys, outputs, results = {}, {}, {}
+    running = {}
+    options.jobs = max(1, options.jobs)
+    with ThreadPoolExecutor(options.jobs) as pool:
+        while True:
+            for name in order:
+                if name in results or name in running.values():
+                    continue
+                deps = STAGES[name]["deps"]
+                if any(results.get(dep, {}).get("status") in ("failed", "skipped") for dep in deps):
+                    results[name] = {"stage": name, "status": "skipped"}
+                    continue
+                if not all(dep in outputs for dep in deps):
+                    continue
+                if name not in keys:
+                    keys[name] = stage_key(name, {dep: keys[dep] for dep in deps}, options, memo)
+                key = keys[name]
+                out = os.path.abspath(os.path.join(options.cache_dir, name, key))
+                if os.path.exists(os.path.join(out, "manifest.json")) and name not in options.force:
+                    with open(os.path.join(out, "manifest.json"), encoding="utf-8") as f:
+                        results[name] = {**json.load(f), "status": "cached"}
+                    outputs[name] = out
+                    print(f"{name:<14} cached ({key})", flush=True)
+                    continue
+                if options.dry_run:
+                    results[name] = {"stage": name, "key": key, "status": "would run"}
+                    outputs[name] = out
+                    print(f"{name:<14} would run ({key})", flush=True)
+                    continue
+                if len(running) >= options.jobs:
+                    continue
+                print(f"{name:<14} running ({key})", flush=True)
+                running[pool.submit(execute, name, key, {dep: outputs[dep] for dep in deps}, options)] = name
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"stage": name, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+                results[name] = result
+                if result["status"] == "ran":
+                    outputs[name] = result["output"]
+                print(f"{name:<14} {result['status']}" + (f" in {result['seconds']:.1f}s" if "seconds" in result
+                                                          else f": {result.get('error', '')}"), flush=True)
+    memo.save()
+    return [results[name] for name in order]
+
+
+def print_metrics(results):
+    print(f"\n{'stage':<14}{'status':>10}{'sec':>10}{'items':>10}{'items/s':>12}{'RSS MiB':>10}")
+    for r in results:
+        if "seconds" in r and r["status"] != "cached":
+            print(f"{r['stage']:<14}{r['status']:>10}{r['seconds']:>10.2f}{r['items']:>10}"
+                  f"{r['items_per_sec']:>12.0f}{r['peak_rss_mib']:>10.1f}"
+                  + (f"  see {r['log']}" if r["status"] == "failed" else ""))
+        else:
+            print(f"{r['stage']:<14}{r['status']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the study pipeline as a cached dependency graph of stages.")
+    parser.add_argument("--input-dir", default=INPUT_DIR, help="raw DiscordChatExporter exports")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES),
+                        help="stages to run; the stages they depend on are added")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="stage outputs, one folder per stage and key")
+    parser.add_argument("--jobs", type=int, default=2, help="stages run at the same time")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes for filter.py")
+    parser.add_argument("--force", nargs="*", default=[], choices=list(STAGES), help="rerun even when cached")
+    parser.add_argument("--lda-channel", default=LDA_CHANNEL)
+    parser.add_argument("--llama-backend", default=os.environ.get("LLAMA_BACKEND", "hf"))
+    parser.add_argument("--profile", action="store_true", help="write a cProfile dump for every stage run")
+    parser.add_argument("--dry-run", action="store_true", help="only show which stages are cached")
+    parser.add_argument("--metrics", default=None, help="metrics JSON (default: <cache-dir>/runs/<time>.json)")
+    options = parser.parse_args()
+
+    os.makedirs(options.cache_dir, exist_ok=True)
+    started = datetime.now(timezone.utc)
+    results = run_pipeline(options)
+    print_metrics(results)
+
+    metrics_path = options.metrics or os.path.join(options.cache_dir, "runs",
+                                                   f"{started.strftime('%Y%m%dT%H%M%S')}.json")
+    if os.path.dirname(metrics_path):
+        os.makedirs(os.path.dirname(metrics_path), exist_ok=True)
+    with open(metrics_path, "w", encoding="utf-8") as f:
+        json.dump({"started": started.isoformat(timespec="seconds"), "input_dir": options.input_dir,
+                   "stages": results}, f, indent=2)
+    print(f"Metrics written to {metrics_path}")
+    if any(r["status"] in ("failed", "skipped") for r in results):
+        sys.exit(1)